@@ -3,3 +3,5 @@ import os
 
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") # derived from DATABASE_URL if not set
+DB_POOL_STATS = os.getenv("DB_POOL_STATS", "false").lower() == "true" # report the pool usage of each request in headers
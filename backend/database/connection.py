@@ -1,8 +1,105 @@
-from sqlalchemy import create_engine, text
+import os
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
+
+from database import DATABASE_URL, ASYNC_DATABASE_URL
+
+ALEMBIC_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+BASELINE_REVISION = "0001" # the schema create_all produced before migrations were introduced
+ASYNC_DRIVERS = {"mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite"} # async driver of each database backend
+
+
+def get_async_url(url: str):
+    """
+    Get the URL of the async driver for a database URL, e.g. mysql://... -> mysql+aiomysql://...
+
+    Args:
+        url (str): The database URL.
+
+    Returns:
+        str: The database URL with the async driver of its backend.
+
+    Raises:
+        ValueError: If there is no known async driver for the backend.
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver known for {backend}, set ASYNC_DATABASE_URL")
+    return str(url.set(drivername=ASYNC_DRIVERS[backend]))
+
+
+class UnitOfWorkSession(Session):
+    """
+    The session of a request-scoped unit of work, see `DatabaseConnection.unit_of_work`.
+
+    The `*DB` classes commit after every change. Within a unit of work this only flushes
+    the changes, and the whole request is committed once at its end. Each `*DB` call runs in
+    a savepoint, so a call that fails, e.g. a name taken, only rolls back its own changes and
+    the caller may carry on. Until the first change,
+    the connection is returned to the pool between the calls (see `release_if_read_only`), so
+    a request waiting e.g. for the LLM after reading its chat does not hold one.
+    """
+
+    def commit(self):
+        if self.info.get("unit_of_work"):
+            self.flush()
+        else:
+            super().commit()
+
+    def release_if_read_only(self):
+        """
+        End the transaction if nothing was written in it, returning its connection to the pool.
+        """
+        if not self.info.get("written") and self.in_transaction():
+            self.rollback()
+
+
+@event.listens_for(UnitOfWorkSession, "after_flush")
+def _mark_flush_written(session, flush_context):
+    session.info["written"] = True
+
+
+@event.listens_for(UnitOfWorkSession, "do_orm_execute")
+def _mark_execute_written(orm_execute_state):
+    if not orm_execute_state.is_select: # bulk updates and deletes
+        orm_execute_state.session.info["written"] = True
+
+
+def on_commit(session: Session, fn):
+    """
+    Call a function once the outermost transaction of a session is committed, e.g. at the end of a
+    unit of work. The savepoints of the `*DB` calls are committed too, but don't count.
+
+    Args:
+        session (Session): The session, e.g. `db.sync_session` of a unit of work.
+        fn (callable): The function, called without arguments.
+    """
+    called = []
+    def after_commit(session):
+        if not called and not session.in_nested_transaction():
+            called.append(True)
+            fn()
+    event.listen(session, "after_commit", after_commit)
+
+
+def _enable_sqlite_savepoints(engine):
+    # pysqlite only begins transactions before DML, so a SAVEPOINT would start (and its RELEASE commit)
+    # the whole transaction. Let SQLAlchemy emit BEGIN itself, as documented for the driver. IMMEDIATE
+    # takes the write lock up front, waiting for it, since a read transaction can't wait to upgrade.
+    @event.listens_for(engine, "connect")
+    def _disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(connection):
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
 
-from database import DATABASE_URL
 
 class DatabaseConnection:
     """
@@ -18,14 +115,14 @@ class DatabaseConnection:
     
     def _initialize(self):
         """
-        Initializes the database connection by creating the engine, session factory, and base.
+        Initializes the database connection by creating the engines, session factories, and base.
         """
-        self.engine = create_engine(
-            DATABASE_URL,
-            pool_size=20,
-            max_overflow=10,
-            pool_timeout=30
-        ) # create the database engine
+        if make_url(DATABASE_URL).get_backend_name() == "sqlite": # e.g. for running locally without MySQL
+            engine_options = {"connect_args": {"check_same_thread": False}} # sessions are used across threads
+        else:
+            engine_options = {"pool_size": 20, "max_overflow": 10, "pool_timeout": 30}
+
+        self.engine = create_engine(DATABASE_URL, **engine_options) # create the database engine
 
         self.SessionLocal = sessionmaker(
             autocommit=False, autoflush=False, bind=self.engine
@@ -34,42 +131,210 @@ class DatabaseConnection:
         self.session_factory = scoped_session(self.SessionLocal) # create a thread-local scoped session
         self.Base = declarative_base() # create a base class for the models
 
+        # async engine for the request handlers, the SQLite driver doesn't take the thread option
+        async_engine_options = {} if "connect_args" in engine_options else engine_options
+        self.async_engine = create_async_engine(ASYNC_DATABASE_URL or get_async_url(DATABASE_URL), **async_engine_options)
+        self.AsyncSessionLocal = sessionmaker(
+            autoflush=False, bind=self.async_engine, class_=AsyncSession
+        ) # create an async session factory
+        self.UnitOfWorkLocal = sessionmaker(
+            autoflush=False, bind=self.async_engine, class_=AsyncSession, sync_session_class=UnitOfWorkSession
+        ) # create a factory of request-scoped sessions
+        self._bound_session = ContextVar("bound_session", default=None) # session of the running `run_async` call
+
+        # connection pool usage of the current request, see `track_pool_usage`
+        self._pool_usage = ContextVar("pool_usage", default=None)
+        for engine in [self.engine, self.async_engine.sync_engine]:
+            event.listen(engine, "checkout", lambda *args: self._count_pool_usage("checkouts"))
+            event.listen(engine, "checkin", lambda *args: self._count_pool_usage("checkins"))
+            if engine.dialect.name == "sqlite":
+                _enable_sqlite_savepoints(engine)
+
     def create_tables(self):
         """
         Creates the database tables based on the defined models.
         """
         self.Base.metadata.create_all(bind=self.engine)
+
+    def migrate(self):
+        """
+        Brings the database schema up to date by running the pending Alembic migrations.
+
+        A new database is created from the models and marked as up to date. A database created
+        by `create_tables` before migrations were introduced is marked as the baseline revision
+        and migrated from there.
+        """
+        from alembic import command
+        from alembic.config import Config
+
+        config = Config(ALEMBIC_CONFIG_PATH)
+        config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_CONFIG_PATH), "migrations"))
+        config.attributes["configure_logger"] = False # keep the application's logging configuration
+
+        tables = inspect(self.engine).get_table_names()
+        if "alembic_version" not in tables:
+            if "users" not in tables: # new database
+                self.create_tables()
+                command.stamp(config, "head")
+                return
+            command.stamp(config, BASELINE_REVISION)
+
+        command.upgrade(config, "head")
     
     def drop_tables(self):
         """
         Drops the database tables based on the defined models.
         """
         with self as connection:
+            connection.execute(text("DROP TABLE IF EXISTS jobs;"))
+            connection.execute(text("DROP TABLE IF EXISTS quizzes;"))
+            connection.execute(text("DROP TABLE IF EXISTS flashcard_sets;"))
             connection.execute(text("DROP TABLE IF EXISTS chats;"))
             connection.execute(text("DROP TABLE IF EXISTS courses;"))
             connection.execute(text("DROP TABLE IF EXISTS users;"))
             connection.execute(text("DROP TABLE IF EXISTS notifications;"))
+            connection.execute(text("DROP TABLE IF EXISTS blob_references;"))
+            connection.execute(text("DROP TABLE IF EXISTS blobs;"))
+            connection.execute(text("DROP TABLE IF EXISTS alembic_version;"))
+
+    @asynccontextmanager
+    async def unit_of_work(self):
+        """
+        Open a session whose changes are committed together when the block ends,
+        or rolled back together if it raises.
+
+        Usage:
+        ```
+        async with db_connection.unit_of_work() as db:
+            await ChatDB.delete_async(course_id=3, all=True, db=db)
+            await CourseDB.delete_async(course_id=3, db=db)
+        ```
+
+        Yields:
+            AsyncSession: The session, to be passed to the `*DB` classes as `db`.
+        """
+        async with self.UnitOfWorkLocal() as session:
+            session.sync_session.info["unit_of_work"] = True
+            try:
+                yield session
+            except BaseException:
+                await session.rollback()
+                raise
+
+            session.sync_session.info["unit_of_work"] = False
+            await session.commit()
+
+    @contextmanager
+    def track_pool_usage(self):
+        """
+        Count the connection pool checkouts and checkins made within the block, e.g. by a request.
+
+        Yields:
+            dict: The counts, {"checkouts": int, "checkins": int}, updated as the block runs.
+        """
+        usage = {"checkouts": 0, "checkins": 0}
+        token = self._pool_usage.set(usage)
+        try:
+            yield usage
+        finally:
+            self._pool_usage.reset(token)
+
+    def _count_pool_usage(self, name: str):
+        usage = self._pool_usage.get()
+        if usage is not None:
+            usage[name] += 1
+
+    async def run_async(self, fn, *args, db: AsyncSession = None, **kwargs):
+        """
+        Run a synchronous database function on an async session, without blocking the event loop.
+
+        The function's `with db_connection as db:` blocks use the session of the async call, so
+        the queries of the `*DB` classes are shared by their sync and async variants.
+
+        Usage:
+        ```
+        chat = await db_connection.run_async(ChatDB.fetch, chat_id=3)
+        ```
+
+        Args:
+            fn (callable): The function to run.
+            *args: The positional arguments of the function.
+            db (AsyncSession, optional): The session of a unit of work to run in. Defaults to a new session.
+            **kwargs: The keyword arguments of the function.
+
+        Returns:
+            The return value of the function.
+        """
+        def call(session):
+            token = self._bound_session.set(session)
+            try:
+                if not session.info.get("unit_of_work"):
+                    return fn(*args, **kwargs)
+                with session.begin_nested(): # a failing call only rolls back its own changes
+                    return fn(*args, **kwargs)
+            finally:
+                self._bound_session.reset(token)
+
+        if db is not None:
+            try:
+                return await db.run_sync(call)
+            finally:
+                await db.run_sync(lambda session: session.release_if_read_only())
+
+        async with self.AsyncSessionLocal() as session:
+            return await session.run_sync(call)
 
     def __enter__(self):
         """
         Enters a context manager and returns a session object.
         """
-        self.session = self.session_factory()
-        return self.session
+        session = self._bound_session.get()
+        if session is not None: # inside `run_async`, which closes the session
+            return session
+
+        return self.session_factory() # the session of the current thread, not stored on the shared instance
     
     def __exit__(self, exc_type, exc_val, exc_tb):
         """
         Exits the context manager and commits or rolls back the transaction.
         """
+        session = self._bound_session.get()
+        if session is not None:
+            if exc_type:
+                if not session.info.get("unit_of_work"): # o/w rolled back to the savepoint of `run_async`
+                    session.rollback() # rollback the transaction if an exception occurred
+            else:
+                session.commit() # commit the transaction if no exceptions occurred
+            return
+
+        session = self.session_factory()
         try:
             if exc_type:
-                self.session.rollback() # rollback the transaction if an exception occurred
+                session.rollback() # rollback the transaction if an exception occurred
             else:
-                self.session.commit() # commit the transaction if no exceptions occurred
+                session.commit() # commit the transaction if no exceptions occurred
         finally:
-            self.session.close() # close the session
+            session.close() # close the session
             self.session_factory.remove() # remove the session from the factory
 
 
 # Create a global singleton instance
-db_connection = DatabaseConnection()
\ No newline at end of file
+db_connection = DatabaseConnection()
+
+
+async def get_db():
+    """
+    FastAPI dependency providing the session of a unit of work spanning the whole request.
+
+    Usage:
+    ```
+    @router.delete("/{course_id}")
+    async def delete_course(course_id: int, db: AsyncSession = Depends(get_db)):
+        await CourseDB.delete_async(course_id=course_id, db=db)
+    ```
+
+    Yields:
+        AsyncSession: The session of the request.
+    """
+    async with db_connection.unit_of_work() as db:
+        yield db
\ No newline at end of file
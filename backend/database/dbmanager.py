@@ -1,13 +1,22 @@
+import json
+import os
+
 from abc import ABC, abstractmethod
-from sqlalchemy import and_
+from datetime import timedelta
+from sqlalchemy import and_, func, select
+from sqlalchemy.exc import IntegrityError
 
-from database.connection import db_connection
+from database.connection import db_connection, on_commit
 from middleware import authentication as auth
 
 from modules.user.model import User
 from modules.chat.model import Chat
 from modules.course.model import Course
 from modules.notification.model import Notification
+from modules.blob.model import Blob, BlobReference
+from modules.quiz.model import Quiz
+from modules.flashcard.model import FlashcardSet
+from modules.job.model import Job
 
 
 class DatabaseInterface(ABC):
@@ -85,6 +94,37 @@ class DatabaseInterface(ABC):
         """
         pass
 
+    # Async variants for the request handlers, running the same queries on an async session,
+    # or on the session of the request's unit of work if given as `db`
+
+    @classmethod
+    async def create_async(cls, *args, **kwargs):
+        """
+        Async variant of `create`.
+        """
+        return await db_connection.run_async(cls.create, *args, **kwargs)
+
+    @classmethod
+    async def fetch_async(cls, *args, **kwargs):
+        """
+        Async variant of `fetch`.
+        """
+        return await db_connection.run_async(cls.fetch, *args, **kwargs)
+
+    @classmethod
+    async def update_async(cls, *args, **kwargs):
+        """
+        Async variant of `update`.
+        """
+        return await db_connection.run_async(cls.update, *args, **kwargs)
+
+    @classmethod
+    async def delete_async(cls, *args, **kwargs):
+        """
+        Async variant of `delete`.
+        """
+        return await db_connection.run_async(cls.delete, *args, **kwargs)
+
 
 class UserDB(DatabaseInterface):
     """
@@ -92,7 +132,7 @@ class UserDB(DatabaseInterface):
     """
 
     @staticmethod
-    def create(name: str, nickname: str, email: str, password: str):
+    def create(name: str, nickname: str, email: str, password: str = None, hashed_password: str = None):
         """
         Create a new user with the provided credentials and save it in the database.
 
@@ -100,35 +140,33 @@ class UserDB(DatabaseInterface):
         - name (str): The name of the user.
         - nickname (str): The nickname of the user.
         - email (str): The email of the user.
-        - password (str): The password of the user.
+        - password (str, optional): The password of the user, hashed here if `hashed_password` is not given.
+        - hashed_password (str, optional): The password hashed with `auth.hash_password_async`, off the request path.
 
         Returns:
         - dict: A dictionary representation of the created user object.
         Raises:
         - ValueError: If a user with the same email or nickname already exists.
         """
-        # Check if a user with the same email or nickname already exists
-        user_by_email = UserDB.fetch(email=email)
-        user_by_nickname = UserDB.fetch(nickname=nickname)
-
-        if user_by_email or user_by_nickname:
-            raise ValueError("User with provided credentials already registered")
-
         # Create a new user object
         user = User(
             name=name,
             nickname=nickname,
             email=email,
-            hashed_password=auth.hash_password(password),
+            hashed_password=hashed_password or auth.hash_password(password),
         )
 
-        # save the user object in the database
-        with db_connection as db:
-            db.add(user)
-            db.commit()
-            db.refresh(user)
+        # save the user object in the database, the unique email and nickname reject registered users
+        try:
+            with db_connection as db:
+                db.add(user)
+                db.commit()
+                db.refresh(user)
 
-            return user.to_dict()
+                return user.to_dict()
+
+        except IntegrityError:
+            raise ValueError("User with provided credentials already registered")
 
     @staticmethod
     def fetch(**kwargs):
@@ -198,6 +236,7 @@ class UserDB(DatabaseInterface):
             - nickname (str): The new nickname for the user.
             - email (str): The new email address for the user.
             - password (str): The new password for the user.
+            - hashed_password (str): The new password hashed with `auth.hash_password_async`, instead of `password`.
 
         Returns:
         - dict: A dictionary representing the updated user details.
@@ -209,8 +248,9 @@ class UserDB(DatabaseInterface):
         nickname = kwargs.get("nickname", None)
         email = kwargs.get("email", None)
         password = kwargs.get("password", None)
+        hashed_password = kwargs.get("hashed_password", None)
         
-        if not any([name, nickname, email, password]):
+        if not any([name, nickname, email, password, hashed_password]):
             raise ValueError("No fields to update provided")
 
         with db_connection as db:
@@ -218,15 +258,22 @@ class UserDB(DatabaseInterface):
             if not user:
                 raise ValueError(f"User with ID {user_id} not found")
 
+            previous_email = user.email  # the user is cached by email
+
             if name:
                 user.name = name
             if nickname:
                 user.nickname = nickname
             if email:
                 user.email = email
-            if password:
+            if hashed_password:
+                user.hashed_password = hashed_password
+            elif password:
                 user.hashed_password = auth.hash_password(password)
 
+            # drop the cached user once the change is visible, i.e. at the end of the request's unit of work
+            emails = [previous_email, user.email]
+            on_commit(db, lambda: auth.invalidate_user(*emails))
             db.commit()
             db.refresh(user)
 
@@ -344,6 +391,76 @@ class ChatDB(DatabaseInterface):
                 result.to_dict() if result else None
             )  # return a single chat dict or None
 
+    @staticmethod
+    def fetch_owned(chat_id: int, user_id: int):
+        """
+        Fetches a chat together with the owner and name of its course in a single query.
+
+        Args:
+            chat_id (int): The ID of the chat.
+            user_id (int): The ID of the user who must own the chat's course.
+
+        Returns:
+            dict: A dictionary representing the chat, including the `course_name`, or None if the chat is not found.
+
+        Raises:
+            PermissionError: If the chat belongs to a course of another user.
+        """
+        with db_connection as db:
+            result = (
+                db.query(Chat, Course.user_id, Course.course_name)
+                .join(Course, Chat.course_id == Course.course_id)
+                .filter(Chat.chat_id == chat_id)
+                .first()
+            )  # the chat and its course in one round trip
+
+            if not result:
+                return None
+
+            chat, owner_id, course_name = result
+            if owner_id != user_id:
+                raise PermissionError(f"Chat with ID {chat_id} does not belong to user {user_id}")
+
+            chat = chat.to_dict()
+            chat["course_name"] = course_name
+            return chat
+
+    @staticmethod
+    async def fetch_owned_async(chat_id: int, user_id: int, db=None):
+        """
+        Async variant of `fetch_owned`.
+        """
+        return await db_connection.run_async(ChatDB.fetch_owned, chat_id=chat_id, user_id=user_id, db=db)
+
+    @staticmethod
+    def fetch_existing_ids(chat_ids: list):
+        """
+        Fetches which of the given chat IDs still exist, e.g. to find the files of deleted chats.
+
+        Args:
+            chat_ids (list): The IDs of the chats.
+
+        Returns:
+            set: The IDs of the existing chats.
+        """
+        if not chat_ids:
+            return set()
+
+        with db_connection as db:
+            return {chat_id for chat_id, in db.query(Chat.chat_id).filter(Chat.chat_id.in_(chat_ids))}
+
+    @staticmethod
+    def fetch_history_names():
+        """
+        Fetches the file names of the histories of all chats, without their directory and extension.
+
+        Returns:
+            set: The history file names, e.g. {"3b4c...e1"}.
+        """
+        with db_connection as db:
+            urls = db.query(Chat.history_url).filter(Chat.history_url.isnot(None))
+            return {os.path.splitext(os.path.basename(url))[0] for url, in urls}
+
     @staticmethod
     def update(chat_id: int, **kwargs):
         """
@@ -356,6 +473,8 @@ class ChatDB(DatabaseInterface):
                 - history_url (str): The new history URL for the chat.
                 - slides_fname (str): The new slides filename for the chat.
                 - slides_furl (str): The new slides file URL for the chat.
+                - slide_index (int): The new slide cursor of the chat.
+                - slide_count (int): The number of slides in the chat's deck, None to recount.
 
         Returns:
             dict: A dictionary representing the updated chat details.
@@ -368,6 +487,7 @@ class ChatDB(DatabaseInterface):
         slides_mode = kwargs.get("slides_mode", None)
         slides_fname = kwargs.get("slides_fname", None)  # get the new slides filename
         slides_furl = kwargs.get("slides_furl", None)  # get the new slides file URL
+        slide_index = kwargs.get("slide_index", None)  # get the new slide cursor
 
         with db_connection as db:
             chat = db.query(Chat).filter(Chat.chat_id == chat_id).first()
@@ -384,6 +504,10 @@ class ChatDB(DatabaseInterface):
                 chat.slides_furl = slides_furl
             if slides_mode is not None:
                 chat.slides_mode = slides_mode
+            if slide_index is not None:
+                chat.slide_index = slide_index
+            if "slide_count" in kwargs:  # None resets the count, e.g. when the slides change
+                chat.slide_count = kwargs["slide_count"]
 
             db.commit()
             db.refresh(chat)
@@ -419,14 +543,18 @@ class ChatDB(DatabaseInterface):
         with db_connection as db:
             query = db.query(Chat).filter(and_(*filters))
             result = query.all() if all else [query.first()]
+            result = [chat for chat in result if chat]
 
             if not result:
                 return []
 
-            ret = []
-            for chat in result:
-                ret.append(chat.to_dict())
-                db.delete(chat)
+            ret = [chat.to_dict() for chat in result]
+            chat_ids = [chat["chat_id"] for chat in ret]
+            # a single DELETE statement per table for all the chats, instead of one per chat;
+            # the files of their quizzes and flashcards are in the chats' folders
+            db.query(Quiz).filter(Quiz.chat_id.in_(chat_ids)).delete(synchronize_session="fetch")
+            db.query(FlashcardSet).filter(FlashcardSet.chat_id.in_(chat_ids)).delete(synchronize_session="fetch")
+            db.query(Chat).filter(Chat.chat_id.in_(chat_ids)).delete(synchronize_session="fetch")
             db.commit()
 
         return ret
@@ -647,6 +775,23 @@ class CourseDB(DatabaseInterface):
 
         return ret
 
+    @staticmethod
+    def fetch_existing_ids(course_ids: list):
+        """
+        Fetches which of the given course IDs still exist, e.g. to find the files of deleted courses.
+
+        Args:
+            course_ids (list): The IDs of the courses.
+
+        Returns:
+            set: The IDs of the existing courses.
+        """
+        if not course_ids:
+            return set()
+
+        with db_connection as db:
+            return {course_id for course_id, in db.query(Course.course_id).filter(Course.course_id.in_(course_ids))}
+
 
 class NotificationDB(DatabaseInterface):
     """
@@ -890,3 +1035,765 @@ class NotificationDB(DatabaseInterface):
             db.commit()
 
         return ret
+
+
+class BlobDB(DatabaseInterface):
+    """
+    Database interface for the Blob and BlobReference models.
+    """
+
+    @staticmethod
+    def create(blob_hash: str, blob_path: str, blob_size: int, owner: str):
+        """
+        Register a blob, if it is not registered yet, and add a reference to it for the given owner.
+
+        Args:
+            blob_hash (str): The SHA-256 hash of the blob's content.
+            blob_path (str): The path where the blob is stored.
+            blob_size (int): The size of the blob in bytes.
+            owner (str): The owner referencing the blob, e.g. chat_12.
+
+        Returns:
+            dict: A dictionary representation of the blob.
+        """
+        try:
+            with db_connection as db:
+                blob = db.query(Blob).filter(Blob.blob_hash == blob_hash).with_for_update().first()
+                if not blob:
+                    blob = Blob(blob_hash=blob_hash, blob_path=blob_path, blob_size=blob_size)
+                    db.add(blob)
+
+                reference = (
+                    db.query(BlobReference)
+                    .filter(BlobReference.blob_hash == blob_hash, BlobReference.owner == owner)
+                    .first()
+                )
+                if not reference:  # an owner references a blob at most once
+                    db.add(BlobReference(blob_hash=blob_hash, owner=owner))
+
+                db.commit()
+                db.refresh(blob)
+
+                return blob.to_dict()
+
+        except IntegrityError:  # the same content was registered concurrently, the row exists now
+            return BlobDB.create(blob_hash, blob_path, blob_size, owner)
+
+    @staticmethod
+    def fetch(**kwargs):
+        """
+        Fetches blobs from the database based on the provided query parameters.
+
+        Args:
+            blob_hash (str): The hash of the blob.
+            owner (str): The owner referencing the blobs.
+            all (bool, optional): If True, fetches all matching blobs. If False (default), fetches only the first matching blob.
+
+        Returns:
+            dict or list: A dictionary representing the fetched blob if `all` is False, or a list of dictionaries if `all` is True.
+                          None if no matching blob is found and `all` is False.
+
+        Raises:
+            ValueError: If no query parameters are provided.
+        """
+        blob_hash = kwargs.get("blob_hash", None)
+        owner = kwargs.get("owner", None)
+        all = kwargs.get("all", False)
+
+        if not any([blob_hash, owner]):
+            raise ValueError("No query parameters provided")
+
+        with db_connection as db:
+            query = db.query(Blob)
+            if blob_hash:
+                query = query.filter(Blob.blob_hash == blob_hash)
+            if owner:  # blobs referenced by the owner
+                query = query.join(BlobReference).filter(BlobReference.owner == owner)
+
+            result = query.all() if all else query.first()
+
+            if all:
+                return [blob.to_dict() for blob in result] if result else []
+
+            return result.to_dict() if result else None
+
+    @staticmethod
+    def fetch_owners(older_than: int = 0):
+        """
+        Fetches the owners referencing blobs, e.g. to find the references of deleted records.
+
+        Args:
+            older_than (int, optional): Only owners with a reference older than this many seconds,
+                                        by the clock of the database. Defaults to 0.
+
+        Returns:
+            set: The owners, e.g. {"chat_12", "course_3"}.
+        """
+        with db_connection as db:
+            query = db.query(BlobReference.owner).distinct()
+            if older_than:
+                now = db.query(func.now()).scalar() # same clock as the references' created_at
+                query = query.filter(BlobReference.created_at < now - timedelta(seconds=older_than))
+            return {owner for owner, in query}
+
+    @staticmethod
+    def update(**kwargs):
+        """
+        Blobs are immutable, their content defines their identity.
+        """
+        pass
+
+    @staticmethod
+    def delete(**kwargs):
+        """
+        Release the references of an owner and delete the blobs that are no longer referenced.
+
+        Args:
+        - **kwargs: Additional keyword arguments for specifying query parameters.
+            - owner (str): The owner whose references are released.
+            - owners (list, optional): Several owners whose references are all released, instead of `owner`.
+            - blob_hash (str, optional): Only release the reference to this blob. Default is all blobs of the owner.
+
+        Returns:
+        - list: A list of dictionaries representing the blobs that were deleted, whose files can be removed.
+
+        Raises:
+        - ValueError: If no owner is provided.
+        """
+        owner = kwargs.get("owner", None)
+        owners = kwargs.get("owners", [owner] if owner else [])
+        blob_hash = kwargs.get("blob_hash", None)
+
+        if not owners:
+            raise ValueError("No owner provided")
+
+        filters = [BlobReference.owner.in_(owners)]
+        if blob_hash:
+            filters.append(BlobReference.blob_hash == blob_hash)
+
+        with db_connection as db:
+            references = db.query(BlobReference).filter(and_(*filters)).all()
+            hashes = {reference.blob_hash for reference in references}
+            for reference in references:
+                db.delete(reference)
+            db.flush()
+
+            ret = []
+            blobs = db.query(Blob).filter(Blob.blob_hash.in_(hashes)).with_for_update().all() if hashes else []
+            for blob in blobs:
+                if not blob.references:  # last reference released
+                    ret.append(blob.to_dict())
+                    db.delete(blob)
+            db.commit()
+
+        return ret
+
+
+class QuizDB(DatabaseInterface):
+    """
+    Database interface for the Quiz model.
+    """
+
+    @staticmethod
+    def create(chat_id: int, course_id: int, quiz_name: str, quiz_path: str):
+        """
+        Record a new quiz in the database.
+
+        Args:
+            chat_id (int): The ID of the chat the quiz was generated from.
+            course_id (int): The ID of the chat's course.
+            quiz_name (str): The name of the quiz, unique within the course.
+            quiz_path (str): The path of the quiz's JSON file.
+
+        Returns:
+            dict: A dictionary representing the created quiz.
+
+        Raises:
+            ValueError: If the course already has a quiz with the same name.
+        """
+        quiz = Quiz(chat_id=chat_id, course_id=course_id, quiz_name=quiz_name, quiz_path=quiz_path)
+
+        try:
+            with db_connection as db:
+                db.add(quiz)
+                db.commit()
+                db.refresh(quiz)
+
+                return quiz.to_dict()
+
+        except IntegrityError:
+            raise ValueError(f'Quiz with name "{quiz_name}" already exists.')
+
+    @staticmethod
+    def fetch(**kwargs):
+        """
+        Fetches quizzes from the database based on the provided query parameters.
+
+        Args:
+            quiz_id (int): The ID of the quiz.
+            chat_id (int): The ID of the chat the quizzes were generated from.
+            course_id (int): The ID of the course of the quizzes.
+            quiz_name (str): The name of the quiz.
+            all (bool, optional): If True, fetches all matching quizzes, oldest first. If False (default), fetches only the first matching quiz.
+
+        Returns:
+            dict or list: A dictionary representing the fetched quiz if `all` is False, or a list of dictionaries if `all` is True.
+                          None if no matching quiz is found and `all` is False.
+
+        Raises:
+            ValueError: If no query parameters are provided.
+        """
+        quiz_id = kwargs.get("quiz_id", None)
+        chat_id = kwargs.get("chat_id", None)
+        course_id = kwargs.get("course_id", None)
+        quiz_name = kwargs.get("quiz_name", None)
+        all = kwargs.get("all", False)
+
+        if not any([quiz_id, chat_id, course_id, quiz_name]):
+            raise ValueError("No query parameters provided")
+
+        filters = []
+        if quiz_id:
+            filters.append(Quiz.quiz_id == quiz_id)
+        if chat_id:
+            filters.append(Quiz.chat_id == chat_id)
+        if course_id:
+            filters.append(Quiz.course_id == course_id)
+        if quiz_name:
+            filters.append(Quiz.quiz_name == quiz_name)
+
+        with db_connection as db:
+            query = db.query(Quiz).filter(and_(*filters))
+            if all:
+                return [quiz.to_dict() for quiz in query.order_by(Quiz.created_at, Quiz.quiz_id)]
+
+            result = query.first()
+            return result.to_dict() if result else None
+
+    @staticmethod
+    def update(quiz_id: int, **kwargs):
+        """
+        Update the quiz details in the database.
+
+        Args:
+            quiz_id (int): The ID of the quiz to update.
+            **kwargs: Keyword arguments for the fields to update. Possible keyword arguments include:
+                - quiz_name (str): The new name of the quiz.
+
+        Returns:
+            dict: A dictionary representing the updated quiz.
+
+        Raises:
+            ValueError: If the quiz is not found or the course already has a quiz with the new name.
+        """
+        quiz_name = kwargs.get("quiz_name", None)
+
+        try:
+            with db_connection as db:
+                quiz = db.query(Quiz).filter(Quiz.quiz_id == quiz_id).first()
+                if not quiz:
+                    raise ValueError(f"Quiz with ID {quiz_id} not found")
+
+                if quiz_name:
+                    quiz.quiz_name = quiz_name
+
+                db.commit()
+                db.refresh(quiz)
+
+                return quiz.to_dict()
+
+        except IntegrityError:
+            raise ValueError(f'Quiz with name "{quiz_name}" already exists.')
+
+    @staticmethod
+    def delete(**kwargs):
+        """
+        Deletes quizzes from the database. Their files are left to the caller.
+
+        Args:
+        - **kwargs: Additional keyword arguments for specifying query parameters.
+            - quiz_id (int): The ID of the quiz to be deleted.
+            - chat_id (int): The ID of the chat whose quizzes are deleted.
+            - course_id (int): The ID of the course whose quizzes are deleted.
+            - quiz_name (str): The name of the quiz to be deleted.
+
+        Returns:
+        - list: A list of dictionaries representing the deleted quizzes.
+
+        Raises:
+        - ValueError: If no query parameters are provided.
+        """
+        quiz_id = kwargs.get("quiz_id", None)
+        chat_id = kwargs.get("chat_id", None)
+        course_id = kwargs.get("course_id", None)
+        quiz_name = kwargs.get("quiz_name", None)
+
+        if not any([quiz_id, chat_id, course_id, quiz_name]):
+            raise ValueError("No query parameters provided")
+
+        filters = []
+        if quiz_id:
+            filters.append(Quiz.quiz_id == quiz_id)
+        if chat_id:
+            filters.append(Quiz.chat_id == chat_id)
+        if course_id:
+            filters.append(Quiz.course_id == course_id)
+        if quiz_name:
+            filters.append(Quiz.quiz_name == quiz_name)
+
+        with db_connection as db:
+            query = db.query(Quiz).filter(and_(*filters))
+            ret = [quiz.to_dict() for quiz in query]
+            if ret:
+                query.delete(synchronize_session="fetch")  # a single DELETE statement
+            db.commit()
+
+        return ret
+
+
+class FlashcardSetDB(DatabaseInterface):
+    """
+    Database interface for the FlashcardSet model.
+    """
+
+    @staticmethod
+    def create(chat_id: int, course_id: int, flashcard_set_name: str, flashcard_set_path: str):
+        """
+        Record a new flashcard set in the database.
+
+        Args:
+            chat_id (int): The ID of the chat the flashcards were generated from.
+            course_id (int): The ID of the chat's course.
+            flashcard_set_name (str): The name of the flashcard set, unique within the chat.
+            flashcard_set_path (str): The path of the flashcard set's JSON file.
+
+        Returns:
+            dict: A dictionary representing the created flashcard set.
+
+        Raises:
+            ValueError: If the chat already has a flashcard set with the same name.
+        """
+        flashcard_set = FlashcardSet(chat_id=chat_id, course_id=course_id, flashcard_set_name=flashcard_set_name,
+                                     flashcard_set_path=flashcard_set_path)
+
+        try:
+            with db_connection as db:
+                db.add(flashcard_set)
+                db.commit()
+                db.refresh(flashcard_set)
+
+                return flashcard_set.to_dict()
+
+        except IntegrityError:
+            raise ValueError(f'Flashcard set with name "{flashcard_set_name}" already exists.')
+
+    @staticmethod
+    def fetch(**kwargs):
+        """
+        Fetches flashcard sets from the database based on the provided query parameters.
+
+        Args:
+            flashcard_set_id (int): The ID of the flashcard set.
+            chat_id (int): The ID of the chat the flashcard sets were generated from.
+            course_id (int): The ID of the course of the flashcard sets.
+            flashcard_set_name (str): The name of the flashcard set.
+            all (bool, optional): If True, fetches all matching flashcard sets, oldest first. If False (default), fetches only the first matching set.
+
+        Returns:
+            dict or list: A dictionary representing the fetched flashcard set if `all` is False, or a list of dictionaries if `all` is True.
+                          None if no matching flashcard set is found and `all` is False.
+
+        Raises:
+            ValueError: If no query parameters are provided.
+        """
+        flashcard_set_id = kwargs.get("flashcard_set_id", None)
+        chat_id = kwargs.get("chat_id", None)
+        course_id = kwargs.get("course_id", None)
+        flashcard_set_name = kwargs.get("flashcard_set_name", None)
+        all = kwargs.get("all", False)
+
+        if not any([flashcard_set_id, chat_id, course_id, flashcard_set_name]):
+            raise ValueError("No query parameters provided")
+
+        filters = []
+        if flashcard_set_id:
+            filters.append(FlashcardSet.flashcard_set_id == flashcard_set_id)
+        if chat_id:
+            filters.append(FlashcardSet.chat_id == chat_id)
+        if course_id:
+            filters.append(FlashcardSet.course_id == course_id)
+        if flashcard_set_name:
+            filters.append(FlashcardSet.flashcard_set_name == flashcard_set_name)
+
+        with db_connection as db:
+            query = db.query(FlashcardSet).filter(and_(*filters))
+            if all:
+                return [flashcard_set.to_dict() for flashcard_set in
+                        query.order_by(FlashcardSet.created_at, FlashcardSet.flashcard_set_id)]
+
+            result = query.first()
+            return result.to_dict() if result else None
+
+    @staticmethod
+    def update(flashcard_set_id: int, **kwargs):
+        """
+        Update the flashcard set details in the database.
+
+        Args:
+            flashcard_set_id (int): The ID of the flashcard set to update.
+            **kwargs: Keyword arguments for the fields to update. Possible keyword arguments include:
+                - flashcard_set_name (str): The new name of the flashcard set.
+
+        Returns:
+            dict: A dictionary representing the updated flashcard set.
+
+        Raises:
+            ValueError: If the flashcard set is not found or the chat already has a flashcard set with the new name.
+        """
+        flashcard_set_name = kwargs.get("flashcard_set_name", None)
+
+        try:
+            with db_connection as db:
+                flashcard_set = db.query(FlashcardSet).filter(FlashcardSet.flashcard_set_id == flashcard_set_id).first()
+                if not flashcard_set:
+                    raise ValueError(f"Flashcard set with ID {flashcard_set_id} not found")
+
+                if flashcard_set_name:
+                    flashcard_set.flashcard_set_name = flashcard_set_name
+
+                db.commit()
+                db.refresh(flashcard_set)
+
+                return flashcard_set.to_dict()
+
+        except IntegrityError:
+            raise ValueError(f'Flashcard set with name "{flashcard_set_name}" already exists.')
+
+    @staticmethod
+    def delete(**kwargs):
+        """
+        Deletes flashcard sets from the database. Their files are left to the caller.
+
+        Args:
+        - **kwargs: Additional keyword arguments for specifying query parameters.
+            - flashcard_set_id (int): The ID of the flashcard set to be deleted.
+            - chat_id (int): The ID of the chat whose flashcard sets are deleted.
+            - course_id (int): The ID of the course whose flashcard sets are deleted.
+            - flashcard_set_name (str): The name of the flashcard set to be deleted.
+
+        Returns:
+        - list: A list of dictionaries representing the deleted flashcard sets.
+
+        Raises:
+        - ValueError: If no query parameters are provided.
+        """
+        flashcard_set_id = kwargs.get("flashcard_set_id", None)
+        chat_id = kwargs.get("chat_id", None)
+        course_id = kwargs.get("course_id", None)
+        flashcard_set_name = kwargs.get("flashcard_set_name", None)
+
+        if not any([flashcard_set_id, chat_id, course_id, flashcard_set_name]):
+            raise ValueError("No query parameters provided")
+
+        filters = []
+        if flashcard_set_id:
+            filters.append(FlashcardSet.flashcard_set_id == flashcard_set_id)
+        if chat_id:
+            filters.append(FlashcardSet.chat_id == chat_id)
+        if course_id:
+            filters.append(FlashcardSet.course_id == course_id)
+        if flashcard_set_name:
+            filters.append(FlashcardSet.flashcard_set_name == flashcard_set_name)
+
+        with db_connection as db:
+            query = db.query(FlashcardSet).filter(and_(*filters))
+            ret = [flashcard_set.to_dict() for flashcard_set in query]
+            if ret:
+                query.delete(synchronize_session="fetch")  # a single DELETE statement
+            db.commit()
+
+        return ret
+
+
+class JobDB(DatabaseInterface):
+    """
+    Database interface for the Job model.
+    """
+
+    @staticmethod
+    def create(user_id: int, job_type: str, job_payload: dict, max_pending: int = None, uncapped_types: list = ()):
+        """
+        Queue a new job in the database.
+
+        Args:
+            user_id (int): The ID of the user who submitted the job.
+            job_type (str): The type of the job, e.g. quiz.
+            job_payload (dict): The JSON serializable arguments of the job.
+            max_pending (int, optional): The maximum number of queued and running jobs of the user. Defaults to no limit.
+            uncapped_types (list, optional): The job types not counted against `max_pending`. Defaults to none.
+
+        Returns:
+            dict: A dictionary representing the created job.
+
+        Raises:
+            ValueError: If the user already has `max_pending` queued or running jobs.
+        """
+        with db_connection as db:
+            if max_pending is not None:
+                # the user's row is locked until the job is committed, so concurrent submissions are counted in turn
+                db.query(User.user_id).filter(User.user_id == user_id).with_for_update().first()
+                pending = (db.query(func.count(Job.job_id))
+                           .filter(Job.user_id == user_id, Job.job_status.in_(["queued", "running"]),
+                                   Job.job_type.notin_(uncapped_types))
+                           .scalar())
+                if pending >= max_pending: # raised before anything is written
+                    raise ValueError(f"Too many pending jobs, at most {max_pending} are allowed")
+
+            job = Job(user_id=user_id, job_type=job_type, job_payload=json.dumps(job_payload), job_status="queued")
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+
+            return job.to_dict()
+
+    @staticmethod
+    def fetch(**kwargs):
+        """
+        Fetches jobs from the database based on the provided query parameters.
+
+        Args:
+            job_id (int): The ID of the job.
+            user_id (int): The ID of the user who submitted the jobs.
+            job_status (str): The status of the jobs.
+            job_type (str, optional): Only the jobs of this type, e.g. quiz.
+            job_payload (dict, optional): Only the jobs with this payload, e.g. to find a job already queued.
+            all (bool, optional): If True, fetches all matching jobs, newest first. If False (default), fetches only the first matching job.
+            limit (int, optional): The maximum number of jobs fetched with `all`. Defaults to no limit.
+
+        Returns:
+            dict or list: A dictionary representing the fetched job if `all` is False, or a list of dictionaries if `all` is True.
+                          None if no matching job is found and `all` is False.
+
+        Raises:
+            ValueError: If no query parameters are provided.
+        """
+        job_id = kwargs.get("job_id", None)
+        user_id = kwargs.get("user_id", None)
+        job_status = kwargs.get("job_status", None)
+        all = kwargs.get("all", False)
+        job_type = kwargs.get("job_type", None)
+        job_payload = kwargs.get("job_payload", None)
+        limit = kwargs.get("limit", None)
+
+        if not any([job_id, user_id, job_status]):
+            raise ValueError("No query parameters provided")
+
+        filters = []
+        if job_id:
+            filters.append(Job.job_id == job_id)
+        if user_id:
+            filters.append(Job.user_id == user_id)
+        if job_status:
+            filters.append(Job.job_status == job_status)
+        if job_type:
+            filters.append(Job.job_type == job_type)
+        if job_payload is not None:
+            filters.append(Job.job_payload == json.dumps(job_payload)) # serialized as by `create`
+
+        with db_connection as db:
+            query = db.query(Job).filter(and_(*filters))
+            if all:
+                return [job.to_dict() for job in query.order_by(Job.created_at.desc(), Job.job_id.desc()).limit(limit)]
+
+            result = query.first()
+            return result.to_dict() if result else None
+
+    @staticmethod
+    def update(job_id: int, **kwargs):
+        """
+        Update the job details in the database, e.g. when a worker finishes it.
+
+        Args:
+            job_id (int): The ID of the job to update.
+            **kwargs: Keyword arguments for the fields to update. Possible keyword arguments include:
+                - job_status (str): The new status of the job. Finished jobs (succeeded or failed) get their finish time.
+                - job_result: The JSON serializable result of the job.
+                - job_error (str): The reason the job failed.
+
+        Returns:
+            dict: A dictionary representing the updated job.
+
+        Raises:
+            ValueError: If the job with the specified ID is not found in the database.
+        """
+        job_status = kwargs.get("job_status", None)
+
+        with db_connection as db:
+            job = db.query(Job).filter(Job.job_id == job_id).first()
+            if not job:
+                raise ValueError(f"Job with ID {job_id} not found")
+
+            if job_status:
+                job.job_status = job_status
+                if job_status in ["succeeded", "failed"]:
+                    job.finished_at = func.now()
+            if "job_result" in kwargs:
+                job.job_result = json.dumps(kwargs["job_result"])
+            if "job_error" in kwargs:
+                job.job_error = kwargs["job_error"][:255] if kwargs["job_error"] else None
+
+            db.commit()
+            db.refresh(job)
+
+            return job.to_dict()
+
+    @staticmethod
+    def delete(**kwargs):
+        """
+        Deletes jobs from the database.
+
+        Args:
+        - **kwargs: Additional keyword arguments for specifying query parameters.
+            - job_id (int): The ID of the job to be deleted.
+            - user_id (int): The ID of the user whose jobs are deleted.
+
+        Returns:
+        - int: The number of deleted jobs.
+
+        Raises:
+        - ValueError: If no query parameters are provided.
+        """
+        job_id = kwargs.get("job_id", None)
+        user_id = kwargs.get("user_id", None)
+
+        if not any([job_id, user_id]):
+            raise ValueError("No query parameters provided")
+
+        filters = []
+        if job_id:
+            filters.append(Job.job_id == job_id)
+        if user_id:
+            filters.append(Job.user_id == user_id)
+
+        with db_connection as db:
+            deleted = db.query(Job).filter(and_(*filters)).delete(synchronize_session=False)
+            db.commit()
+
+        return deleted
+
+    @staticmethod
+    def claim(max_running: int, user_max_running: int, scan: int = 50, uncapped_types: list = ()):
+        """
+        Take the oldest queued job whose user has fewer than `user_max_running` running jobs and mark it
+        running, unless `max_running` jobs are running already. The claim is a conditional update that
+        checks the limits too, so workers of several processes never run the same job nor exceed them.
+
+        Args:
+            max_running (int): The maximum number of running jobs of all users.
+            user_max_running (int): The maximum number of running jobs of a user.
+            scan (int, optional): The number of oldest queued jobs considered. Defaults to 50.
+            uncapped_types (list, optional): The job types neither subject to nor counted against `user_max_running`,
+                e.g. maintenance jobs submitted on behalf of a user. Defaults to none.
+
+        Returns:
+            dict: A dictionary representing the claimed job, or None if no job can be run now.
+        """
+        with db_connection as db:
+            if db.query(JobDB._count_running()).scalar() >= max_running:
+                return None
+            running = dict(db.query(Job.user_id, func.count(Job.job_id))
+                           .filter(Job.job_status == "running", Job.job_type.notin_(uncapped_types))
+                           .group_by(Job.user_id).all())
+
+            queued = (db.query(Job.job_id, Job.user_id, Job.job_type).filter(Job.job_status == "queued")
+                      .order_by(Job.created_at, Job.job_id).limit(scan).all())
+            for job_id, user_id, job_type in queued:
+                limits = [JobDB._count_running() < max_running]
+                if job_type not in uncapped_types:
+                    if running.get(user_id, 0) >= user_max_running:
+                        continue
+                    limits.append(JobDB._count_running(Job.user_id == user_id, Job.job_type.notin_(uncapped_types))
+                                  < user_max_running)
+
+                claimed = (db.query(Job)
+                           .filter(Job.job_id == job_id, Job.job_status == "queued", *limits)
+                           .update({Job.job_status: "running", Job.started_at: func.now(), Job.attempts: Job.attempts + 1},
+                                   synchronize_session=False))
+                db.commit()
+                if claimed: # not taken by another worker in the meantime, nor the limits reached
+                    return db.query(Job).filter(Job.job_id == job_id).first().to_dict()
+
+            return None
+
+    @staticmethod
+    def _count_running(*filters):
+        # counted in a derived table, MySQL can't select from the updated table in a subquery
+        running = select(Job.job_id).filter(Job.job_status == "running", *filters).subquery()
+        return select(func.count()).select_from(running).scalar_subquery()
+
+    @staticmethod
+    async def claim_async(max_running: int, user_max_running: int, uncapped_types: list = ()):
+        """
+        Async variant of `claim`.
+        """
+        return await db_connection.run_async(JobDB.claim, max_running, user_max_running, uncapped_types=uncapped_types)
+
+    @staticmethod
+    def requeue_stale(older_than: int, max_attempts: int):
+        """
+        Queue again the running jobs started more than `older_than` seconds ago, e.g. by a worker process
+        that stopped, or fail them if they have had `max_attempts` attempts.
+
+        Args:
+            older_than (int): The age of a stale job, in seconds by the clock of the database.
+            max_attempts (int): The maximum number of attempts of a job.
+
+        Returns:
+            int: The number of requeued or failed jobs.
+        """
+        with db_connection as db:
+            now = db.query(func.now()).scalar() # same clock as the jobs' started_at
+            stale = [Job.job_status == "running", Job.started_at < now - timedelta(seconds=older_than)]
+
+            failed = (db.query(Job).filter(*stale, Job.attempts >= max_attempts)
+                      .update({Job.job_status: "failed", Job.job_error: "Timed out", Job.finished_at: func.now()},
+                              synchronize_session=False))
+            requeued = db.query(Job).filter(*stale).update({Job.job_status: "queued"}, synchronize_session=False)
+            db.commit()
+
+        return failed + requeued
+
+    @staticmethod
+    async def requeue_stale_async(older_than: int, max_attempts: int):
+        """
+        Async variant of `requeue_stale`.
+        """
+        return await db_connection.run_async(JobDB.requeue_stale, older_than, max_attempts)
+
+    @staticmethod
+    def delete_finished(older_than: int):
+        """
+        Delete the jobs finished more than `older_than` seconds ago, along with their results.
+
+        Args:
+            older_than (int): The age of a deleted job, in seconds by the clock of the database.
+
+        Returns:
+            int: The number of deleted jobs.
+        """
+        with db_connection as db:
+            now = db.query(func.now()).scalar() # same clock as the jobs' finished_at
+            deleted = (db.query(Job)
+                       .filter(Job.job_status.in_(["succeeded", "failed"]),
+                               Job.finished_at < now - timedelta(seconds=older_than))
+                       .delete(synchronize_session=False))
+            db.commit()
+
+        return deleted
+
+    @staticmethod
+    async def delete_finished_async(older_than: int):
+        """
+        Async variant of `delete_finished`.
+        """
+        return await db_connection.run_async(JobDB.delete_finished, older_than)
@@ -0,0 +1,57 @@
+"""
+Check with EXPLAIN that the lookups indexed by migration 0004 use their indexes on the
+configured database (SQLite or MySQL), e.g. after changing a query or the schema.
+Exits with status 1 if a lookup doesn't use its index.
+
+Usage:
+```
+python explain_indexes.py
+```
+"""
+
+import sys
+
+from sqlalchemy import select, text
+
+from database.connection import db_connection
+from database.dbmanager import Chat, Notification # with the other models, for the tables they refer to
+from tools import init
+
+LOOKUPS = [ # (name, query as run by the *DB classes, index expected in the plan)
+    ("chats of a course", select(Chat).where(Chat.course_id == 1), "ix_chats_course_id"),
+    ("new notifications of a user",
+     select(Notification).where(Notification.notification_receiver_id == 1, Notification.notification_is_new == True)
+     .order_by(Notification.notification_date.desc()),
+     "ix_notifications_receiver_is_new_date"),
+]
+
+
+def explain(query):
+    """
+    Get the query plan of a query on the configured database.
+
+    Returns:
+        list: The rows of the plan, as strings.
+    """
+    engine = db_connection.engine
+    sql = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN" if engine.dialect.name == "sqlite" else "EXPLAIN"
+    with engine.connect() as connection:
+        return [" ".join(str(value) for value in row) for row in connection.execute(text(f"{prefix} {sql}"))]
+
+
+def main():
+    failed = False
+    for name, query, index in LOOKUPS:
+        plan = explain(query)
+        used = any(index in row for row in plan)
+        failed = failed or not used
+        print(f"{'OK' if used else 'NOT USING ' + index}: {name}")
+        for row in plan:
+            print(f"    {row}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    init(restart=False, debug_mode=False)
+    sys.exit(main())
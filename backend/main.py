@@ -1,18 +1,34 @@
 import os
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from modules.user.router import router as users_router
 from modules.course.router import router as course_router
 from modules.chat.router import router as chat_router
 from modules.notification.router import router as notification_router
+from modules.job.router import router as job_router
 from middleware.router import router as files_router
+from middleware import garbage, jobs
+import modules.chat.jobs, modules.course.jobs # register the job handlers
+from database import DB_POOL_STATS
+from database.connection import db_connection
 from tools import init
 from logger import logger
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # remove the files of deleted records in the background, see middleware/garbage.py
+    garbage.start()
+    # run the quiz, flashcard and study plan generation jobs, unless left to worker.py, see middleware/jobs.py
+    jobs.start()
+    yield
+    await jobs.stop()
+    await garbage.stop()
+
 # create the FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # re/create the database tables and directories
 # Debug mode will log additional information
@@ -27,12 +43,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Report the connection pool checkouts and checkins of each request, to spot requests holding or churning connections
+if DB_POOL_STATS:
+    @app.middleware("http")
+    async def pool_usage_headers(request: Request, call_next):
+        with db_connection.track_pool_usage() as usage:
+            response = await call_next(request)
+        response.headers["X-DB-Pool-Checkouts"] = str(usage["checkouts"])
+        response.headers["X-DB-Pool-Checkins"] = str(usage["checkins"])
+        return response
+
 # Mount the files directory to the "/files" route
 # This will allow the frontend to access the files in the "files" directory
 # Example: http://localhost:8000/files/myfile.png will directly serve the file "myfile.png" stored in the "files" directory
 app.mount("/files", StaticFiles(directory="files"), name="files")
 
-routers = [users_router, files_router, course_router, chat_router, notification_router]
+routers = [users_router, files_router, course_router, chat_router, notification_router, job_router]
 
 # Include the router in the app with the "/api" prefix for all routes
 for router in routers:
@@ -7,11 +7,20 @@ load_dotenv()
 
 # file uploads path
 FILES_DIR = os.getenv("FILES_DIR")
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 200 * 1024 * 1024)) # in bytes
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024)) # in bytes, uploads are copied in chunks of this size
 
 # authentication
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12")) # work factor of new password hashes, each +1 doubles the cost
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "4")) # passwords hashed or verified at the same time
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300")) # in seconds, bounded by the expiration of the token
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+
+# shared cache backend for multi-worker deployments, e.g. mypackage.caches:RedisCache, in-memory if not set
+CACHE_BACKEND = os.getenv("CACHE_BACKEND")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/users/login")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
\ No newline at end of file
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
\ No newline at end of file
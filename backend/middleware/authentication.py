@@ -1,12 +1,25 @@
+import asyncio
 import jwt
+import time
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi import HTTPException, status, Depends
 from pydantic import BaseModel
 from logger import logger
 from jwt.exceptions import InvalidTokenError
-from . import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, oauth2_scheme, pwd_context
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.connection import get_db
+from . import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, PASSWORD_WORKERS, USER_CACHE_TTL, USER_CACHE_MAX_SIZE, oauth2_scheme, pwd_context
+from .cache import create_cache
+
+# users of verified tokens by email (the token subject), so authenticating a request is a cache lookup
+user_cache = create_cache("users", USER_CACHE_MAX_SIZE)
+
+# bcrypt is slow by design and releases the GIL, so password work runs on a few dedicated threads;
+# a login burst queues up here instead of occupying the event loop or the request thread pool
+_password_pool = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="password")
 
 class Token(BaseModel):
     """
@@ -47,10 +60,40 @@ def hash_password(password):
     return pwd_context.hash(password)
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+async def verify_password_async(plain_password, hashed_password):
+    """
+    Verify a password like `verify_password`, on the password worker threads.
+
+    Args:
+        plain_password (str): The plain password to verify.
+        hashed_password (str): The hashed password to compare against.
+
+    Returns:
+        bool: True if the plain password matches the hashed password, False otherwise.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_password_pool, verify_password, plain_password, hashed_password)
+
+
+async def hash_password_async(password):
+    """
+    Hash a password like `hash_password`, on the password worker threads.
+
+    Args:
+        password (str): The password to be hashed.
+
+    Returns:
+        str: The hashed password.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_password_pool, hash_password, password)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     """
     Retrieves the current user based on the provided JWT token.
 
+    The user is cached until the token expires, at most USER_CACHE_TTL seconds, and
+    invalidated when it is updated. Every caller gets its own copy of the user dictionary.
+
     Args:
     - token (str): The JWT token used for authentication.
 
@@ -61,7 +104,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     - HTTPException: If the token is invalid or the user is not found.
     """
     
-    logger.info(f"Getting current user with token: {token}")
+    logger.debug("Getting current user from token")
 
     credentials_exception = HTTPException(
         detail="Could not validate credentials",
@@ -77,18 +120,35 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             raise credentials_exception # raise an exception if the email is not found in the payload
         
     except InvalidTokenError:
-        raise credentials_exception # raise an exception if the token is not genuine
+        raise credentials_exception # raise an exception if the token is not genuine (or has expired)
     
-    from database.dbmanager import UserDB
-    user = UserDB.fetch(email=email) # fetch the user from the database using the email
-
+    user = user_cache.get(email)
     if user is None:
-        raise credentials_exception # raise an exception if the user with the email is not found
+        from database.dbmanager import UserDB
+        user = await UserDB.fetch_async(email=email, db=db) # fetch the user from the database using the email
 
-    return user
+        if user is None:
+            raise credentials_exception # raise an exception if the user with the email is not found
+
+        expires_at = min(payload.get("exp", float("inf")), time.time() + USER_CACHE_TTL)
+        user_cache.set(email, dict(user), expires_at)
+
+    return dict(user) # handlers may modify the user, e.g. to build their response
+
+
+def invalidate_user(*emails):
+    """
+    Remove users from the user cache, e.g. after they are updated.
+
+    Args:
+        *emails (str): The emails of the users, None values are ignored.
+    """
+    for email in emails:
+        if email:
+            user_cache.delete(email)
 
 
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     """
     Authenticates the user and generates an access token.
 
@@ -101,7 +161,7 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     Raises:
         HTTPException: If the user credentials are invalid.
     """
-    user = _authenticate_user(form_data.password, email=form_data.username) # authenticate the user using the provided credentials
+    user = await _authenticate_user(form_data.password, email=form_data.username) # authenticate the user using the provided credentials
 
     if not user:
         raise HTTPException(
@@ -120,7 +180,7 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     return Token(access_token=access_token, token_type="bearer")
 
 
-def _authenticate_user(password, **kwargs):
+async def _authenticate_user(password, **kwargs):
     """
     Authenticates a user based on the provided password and user information.
 
@@ -144,10 +204,10 @@ def _authenticate_user(password, **kwargs):
     # import the UserDB class here to avoid circular imports
     from database.dbmanager import UserDB
 
-    user = UserDB.fetch(nickname=nickname, email=email, user_id=user_id) # fetch the user from the database
+    user = await UserDB.fetch_async(nickname=nickname, email=email, user_id=user_id) # fetch the user from the database
     
     # user not found or password does not match
-    if not user or not verify_password(password, user["hashed_password"]):
+    if not user or not await verify_password_async(password, user["hashed_password"]):
         return None
     
     return user
@@ -0,0 +1,134 @@
+"""
+Content-addressed file storage.
+
+Uploads are stored once per unique content under `FILES_DIR/blobs/<h[:2]>/<h>.<ext>`,
+where `h` is the SHA-256 hash of the content. Every use of a blob (the slides
+of a chat, the syllabus of a course, ...) is recorded as a reference of an
+owner in the database, and the blob is deleted when its last reference is
+released. Identical files uploaded by many users are stored, converted and
+rendered only once.
+
+Artifacts derived from a blob (converted PDF, rendered slides, rendering
+manifest) are stored next to it with the blob's hash as file name prefix, so
+they are shared and deleted together with the blob. Extracted text is kept in
+the extraction cache, keyed by the same hash.
+
+Usage:
+```
+path = blobstore.put(temporary_path, "pdf", owner="course_3")
+blobstore.release(path, owner="course_3")
+```
+"""
+
+import glob
+import os
+import shutil
+
+from logger import logger
+from middleware import FILES_DIR
+from tools import generate_hash, hash_file, splitext
+
+BLOBS_DIR = os.path.join(FILES_DIR, "blobs")
+TEMPORARY_DIR = os.path.join(BLOBS_DIR, "tmp") # uploads in progress, on the same file system as the blobs
+
+
+def get_blob_path(blob_hash: str, extension: str):
+    return os.path.join(BLOBS_DIR, blob_hash[:2], f"{blob_hash}.{extension}")
+
+
+def get_derived_path(blob_path: str, name: str):
+    return f"{splitext(blob_path)[0]}_{name}" # e.g. <hash>_text.txt
+
+
+def get_temporary_path(extension: str = "tmp"):
+    os.makedirs(TEMPORARY_DIR, exist_ok=True)
+    return os.path.join(TEMPORARY_DIR, f"{generate_hash("", strategy="uuid")}.{extension}") # keeps the format detectable
+
+
+def is_blob_path(path: str):
+    return os.path.abspath(path).startswith(os.path.abspath(BLOBS_DIR) + os.sep)
+
+
+def get_content_hash(path: str):
+    if is_blob_path(path):
+        return splitext(os.path.basename(path))[0] # named after its hash
+    return hash_file(path)
+
+
+def put(source_path: str, extension: str, owner: str, blob_hash: str = None):
+    """
+    Move a file into the blob store and add a reference to it for the given owner.
+
+    Args:
+        source_path (str): The path of the file to store, e.g. a temporary upload. The file is consumed.
+        extension (str): The file extension, e.g. pdf.
+        owner (str): The owner of the reference, e.g. chat_12.
+        blob_hash (str, optional): The SHA-256 hash of the file, if computed while writing it. Defaults to None.
+
+    Returns:
+        str: The path of the stored blob.
+    """
+    blob_hash = blob_hash or hash_file(source_path)
+    blob_path = get_blob_path(blob_hash, extension.lower())
+
+    # register the reference before the file is in place, so a concurrent release can't delete it
+    from database.dbmanager import BlobDB
+    blob = BlobDB.create(blob_hash=blob_hash, blob_path=blob_path, blob_size=os.path.getsize(source_path), owner=owner)
+
+    if os.path.exists(blob["blob_path"]):
+        os.remove(source_path) # already stored
+    else:
+        os.makedirs(os.path.dirname(blob["blob_path"]), exist_ok=True)
+        os.replace(source_path, blob["blob_path"])
+
+    return blob["blob_path"]
+
+
+def release(path: str, owner: str):
+    """
+    Release the owner's reference to a stored file and delete the blob if it is no longer referenced.
+    Files stored before the blob store existed are deleted directly.
+
+    Args:
+        path (str): The path of the file, None or empty for no file.
+        owner (str): The owner of the reference.
+    """
+    if not path:
+        return
+    if not is_blob_path(path): # stored by an older version, owned by a single user
+        if os.path.exists(path):
+            os.remove(path)
+        return
+
+    from database.dbmanager import BlobDB
+    _remove(BlobDB.delete(owner=owner, blob_hash=splitext(os.path.basename(path))[0]))
+
+
+def release_all(*owners: str):
+    """
+    Release all references of one or more owners and delete the blobs that are no longer referenced.
+
+    Args:
+        *owners (str): The owners of the references.
+    """
+    from database.dbmanager import BlobDB
+    _remove(BlobDB.delete(owners=list(owners)))
+
+
+def _remove(blobs: list):
+    """
+    Delete the files of unreferenced blobs along with their derived artifacts.
+    """
+    from database.dbmanager import BlobDB
+
+    for blob in blobs:
+        if BlobDB.fetch(blob_hash=blob["blob_hash"]): # uploaded again in the meantime
+            continue
+        for path in glob.glob(glob.escape(splitext(blob["blob_path"])[0]) + "*"): # the blob and its derived artifacts
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except OSError as e:
+                logger.error(f"Failed to delete blob file {path}: {str(e)}")
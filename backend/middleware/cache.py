@@ -0,0 +1,117 @@
+"""
+Key-value caches with a pluggable backend.
+
+By default a cache lives in the memory of the worker process, bounded in size
+and evicting expired entries first, then the least recently used ones. With
+several worker processes, set CACHE_BACKEND to a `CacheBackend` subclass
+backed by a shared store (e.g. Redis), given as `package.module:ClassName`, so
+an entry invalidated by one worker is invalidated for all of them.
+
+Usage:
+```
+users = create_cache("users", max_size=1000)
+users.set("alice@example.com", user, expires_at=time.time() + 60)
+users.get("alice@example.com")
+users.delete("alice@example.com")
+```
+"""
+
+import importlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from cachetools import TLRUCache
+
+from middleware import CACHE_BACKEND
+
+
+class CacheBackend(ABC):
+    """
+    Interface for the cache backends.
+
+    Attributes:
+        name (str): The name of the cache, to separate the keys of several caches in a shared store.
+        max_size (int): The maximum number of entries.
+    """
+
+    def __init__(self, name: str, max_size: int):
+        self.name = name
+        self.max_size = max_size
+
+    @abstractmethod
+    def get(self, key: str):
+        """
+        Get the value of a key.
+
+        Args:
+            key (str): The key.
+
+        Returns:
+            The cached value, or None if the key is not cached or has expired.
+        """
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value, expires_at: float):
+        """
+        Cache the value of a key until the given time.
+
+        Args:
+            key (str): The key.
+            value: The value to cache.
+            expires_at (float): The expiration time, in seconds since the epoch.
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        """
+        Remove a key from the cache, if cached.
+
+        Args:
+            key (str): The key.
+        """
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """
+    A cache in the memory of the process, evicting expired and then least recently used entries.
+    """
+
+    def __init__(self, name: str, max_size: int):
+        super().__init__(name, max_size)
+        self._entries = TLRUCache(maxsize=max_size, ttu=lambda key, entry, now: entry[1], timer=time.time)
+        self._lock = threading.Lock() # also used from the threads of sync handlers
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def set(self, key: str, value, expires_at: float):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def create_cache(name: str, max_size: int):
+    """
+    Create a cache with the configured backend, CACHE_BACKEND or the in-memory one.
+
+    Args:
+        name (str): The name of the cache.
+        max_size (int): The maximum number of entries.
+
+    Returns:
+        CacheBackend: The cache.
+    """
+    if not CACHE_BACKEND:
+        return MemoryCache(name, max_size)
+
+    module_name, class_name = CACHE_BACKEND.split(":")
+    backend = getattr(importlib.import_module(module_name), class_name)
+    return backend(name, max_size)
@@ -0,0 +1,139 @@
+"""
+PPTX to PDF conversion service.
+
+Conversions run on a small pool of LibreOffice workers. Each worker owns an
+isolated, persistent user profile directory, so concurrent conversions never
+collide on the shared default profile and only the first conversion of a
+worker pays for the profile bootstrap. Jobs wait for a free worker up to
+SOFFICE_TIMEOUT seconds and are killed if the conversion itself takes longer.
+
+Converted PDFs are cached by the SHA-256 hash of the presentation's content,
+so converting an already seen deck is a file copy.
+"""
+
+import os
+import platform
+import queue
+import shutil
+import signal
+import subprocess
+import tempfile
+
+from logger import logger
+from middleware import FILES_DIR
+from tools import generate_hash, hash_file, splitext
+
+SOFFICE_BINARY = os.getenv("SOFFICE_BINARY", "soffice")
+SOFFICE_WORKERS = int(os.getenv("SOFFICE_WORKERS", "2"))
+SOFFICE_TIMEOUT = int(os.getenv("SOFFICE_TIMEOUT", "120"))
+SOFFICE_PROFILES_DIR = os.getenv("SOFFICE_PROFILES_DIR", os.path.join(tempfile.gettempdir(), "learn-smart-soffice"))
+CONVERSIONS_DIR = os.path.join(FILES_DIR, "conversions")
+
+
+class ConversionPool:
+    """
+    A pool of LibreOffice conversion workers.
+
+    Usage:
+    ```
+    converter.convert("deck.pptx", "deck.pdf")
+    ```
+
+    Attributes:
+        workers (int): The number of conversions that can run at the same time.
+        timeout (int): The maximum time, in seconds, to wait for a worker and to run a conversion.
+    """
+
+    def __init__(self, workers: int = SOFFICE_WORKERS, timeout: int = SOFFICE_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._profiles = queue.Queue() # free workers, identified by their profile directory
+        for worker in range(workers):
+            profile_dir = os.path.join(SOFFICE_PROFILES_DIR, f"worker_{worker}")
+            os.makedirs(profile_dir, exist_ok=True)
+            self._profiles.put(profile_dir)
+
+    def convert(self, input_path: str, output_path: str):
+        """
+        Convert a presentation to PDF, reusing the cached result for already converted content.
+
+        Args:
+            input_path (str): The path to the presentation file.
+            output_path (str): The path of the PDF file to create.
+
+        Raises:
+            TimeoutError: If no worker became free or the conversion did not finish in time.
+            RuntimeError: If the conversion failed.
+        """
+        cached_path = os.path.join(CONVERSIONS_DIR, f"{hash_file(input_path)}.pdf")
+
+        if not os.path.exists(cached_path):
+            os.makedirs(CONVERSIONS_DIR, exist_ok=True)
+            try:
+                profile_dir = self._profiles.get(timeout=self.timeout) # wait for a free worker
+            except queue.Empty:
+                raise TimeoutError(f"No conversion worker became available in {self.timeout} seconds.")
+
+            try:
+                self._run(profile_dir, input_path, cached_path)
+            finally:
+                self._profiles.put(profile_dir)
+        else:
+            logger.info(f"Using cached conversion of {input_path}")
+
+        shutil.copyfile(cached_path, output_path)
+
+    def _run(self, profile_dir: str, input_path: str, cached_path: str):
+        """
+        Run a single conversion on the worker owning the given profile directory.
+        """
+        with tempfile.TemporaryDirectory() as output_dir:
+            produced_path = os.path.join(output_dir, os.path.basename(splitext(input_path)[0]) + ".pdf")
+
+            if platform.system() == "Windows":
+                _convert_with_powerpoint(os.path.abspath(input_path), produced_path)
+            else:
+                # in a new process group, so a timed out conversion can be killed with the soffice.bin it spawned
+                process = subprocess.Popen([SOFFICE_BINARY, f"-env:UserInstallation=file://{os.path.abspath(profile_dir)}",
+                                            "--headless", "--norestore", "--convert-to", "pdf", "--outdir", output_dir,
+                                            input_path],
+                                           stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+                try:
+                    _, stderr = process.communicate(timeout=self.timeout)
+                except subprocess.TimeoutExpired:
+                    _kill_process_group(process) # a surviving soffice.bin would keep the worker's profile locked
+                    raise TimeoutError(f"Converting {input_path} took longer than {self.timeout} seconds.")
+                if process.returncode:
+                    raise RuntimeError(f"Converting {input_path} failed: {stderr.decode(errors='replace')}")
+
+            if not os.path.exists(produced_path):
+                raise RuntimeError(f"Converting {input_path} produced no PDF file.")
+
+            temporary_path = f"{cached_path}.{generate_hash('', strategy='uuid')}.tmp"
+            shutil.move(produced_path, temporary_path) # the output directory may be on another file system
+            os.replace(temporary_path, cached_path) # concurrent readers never see a partial PDF
+
+
+def _kill_process_group(process: subprocess.Popen):
+    """
+    Kill a process started in a new session and every process of its group, then reap it.
+    """
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError: # the whole group exited in the meantime
+        pass
+    process.communicate()
+
+
+def _convert_with_powerpoint(input_path: str, output_path: str):
+    import comtypes.client
+    powerpoint = comtypes.client.CreateObject("Powerpoint.Application")
+    powerpoint.Visible = 1
+    deck = powerpoint.Presentations.Open(input_path)
+    deck.SaveAs(output_path, 32)
+    deck.Close()
+    powerpoint.Quit()
+
+
+# Create a global conversion pool
+converter = ConversionPool()
@@ -0,0 +1,59 @@
+"""
+Shared executor for CPU-bound work.
+
+Image resizing, page rasterization and text extraction run in a single
+process pool sized to the machine's cores (CPU_WORKERS), instead of inside
+request handlers, so one large upload can't freeze the event loop or starve
+the other requests served by the same worker. Pool workers are separate
+processes, so the submitted functions and their arguments must be picklable,
+i.e. module-level functions taking paths rather than open files.
+
+Usage:
+```
+await executor.run(render_page, pdf_path, page, output_path) # from async code
+executor.submit(render_page, pdf_path, page, output_path).result() # from sync code, e.g. a thread
+```
+"""
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", os.cpu_count() or 1))
+
+_pool = None # created on first use, so importing this module doesn't spawn processes
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=CPU_WORKERS)
+    return _pool
+
+
+def submit(fn, *args):
+    """
+    Submit a CPU-bound job to the shared process pool.
+
+    Args:
+        fn (callable): A module-level function.
+        *args: The picklable arguments of the function.
+
+    Returns:
+        concurrent.futures.Future: The future of the job's result.
+    """
+    return get_pool().submit(fn, *args)
+
+
+async def run(fn, *args):
+    """
+    Run a CPU-bound job in the shared process pool and wait for its result without blocking the event loop.
+
+    Args:
+        fn (callable): A module-level function.
+        *args: The picklable arguments of the function.
+
+    Returns:
+        The result of the function.
+    """
+    return await asyncio.get_running_loop().run_in_executor(get_pool(), fn, *args)
@@ -0,0 +1,213 @@
+"""
+Text extraction engine and shared extraction-result cache.
+
+The pages of a PDF (e.g. a book) are split into ranges of PDF_PAGES_PER_TASK
+pages that are extracted in parallel across the shared CPU process pool,
+and the page texts are yielded in page order as soon as their range is done,
+so callers never need the whole text as a single string.
+
+The results of all extractors (PDF pages, slides, paragraphs) are cached on
+disk by content hash and extractor version, one text part per JSON line, so
+extracting an already seen document is a sequential file read. The cache is
+bounded to EXTRACTION_CACHE_MAX_SIZE bytes and evicts the least recently used
+results first.
+"""
+
+import json
+import os
+import threading
+import pymupdf
+from collections import deque
+from docx import Document
+from pptx import Presentation
+
+from logger import logger
+from middleware import FILES_DIR, executor
+from tools import generate_hash
+
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "32"))
+EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", os.path.join(FILES_DIR, "extraction_cache"))
+EXTRACTION_CACHE_MAX_SIZE = int(os.getenv("EXTRACTION_CACHE_MAX_SIZE", 1024 * 1024 * 1024)) # in bytes
+
+
+def extract_pages(pdf_path: str, start: int, end: int):
+    """
+    Extract the text of the pages in the range [start, end) of a PDF file. Runs in a worker process.
+
+    Args:
+        pdf_path (str): The path to the PDF file.
+        start (int): The zero-based number of the first page.
+        end (int): The number after the last page.
+
+    Returns:
+        list: The text of each page.
+    """
+    with pymupdf.open(pdf_path) as doc:
+        return [doc[page].get_text() for page in range(start, end)]
+
+
+def extract_pdf_pages(pdf_path: str):
+    """
+    Yield the text of a PDF file page by page, extracting it in the shared process pool.
+
+    Args:
+        pdf_path (str): The path to the PDF file.
+
+    Yields:
+        str: The text of each page, in page order.
+    """
+    with pymupdf.open(pdf_path) as doc:
+        page_count = doc.page_count
+
+    starts = range(0, page_count, PDF_PAGES_PER_TASK)
+    ends = [min(start + PDF_PAGES_PER_TASK, page_count) for start in starts]
+    futures = deque(executor.submit(extract_pages, pdf_path, start, end) for start, end in zip(starts, ends))
+    try:
+        while futures: # results in page order, released once yielded
+            yield from futures.popleft().result()
+    finally:
+        for future in futures: # the caller stopped early or a range failed
+            future.cancel()
+
+
+def extract_slides(pptx_path: str):
+    """
+    Extract the text of each slide of a presentation. Runs in a worker process.
+
+    Args:
+        pptx_path (str): The path to the presentation file.
+
+    Returns:
+        list: The text of each slide.
+    """
+    presentation = Presentation(pptx_path)
+    return ["".join(shape.text_frame.text for shape in slide.shapes if shape.has_text_frame)
+            for slide in presentation.slides]
+
+
+def extract_paragraphs(docx_path: str):
+    """
+    Extract the text of each paragraph of a Word document. Runs in a worker process.
+
+    Args:
+        docx_path (str): The path to the Word file.
+
+    Returns:
+        list: The text of each paragraph.
+    """
+    return [para.text for para in Document(docx_path).paragraphs]
+
+
+class ExtractionCache:
+    """
+    Size-bounded on-disk LRU cache of extraction results.
+
+    Usage:
+    ```
+    for page in cache.iter(content_hash, "pdffile", 1, lambda: extract_pdf_pages(path)):
+        ...
+    ```
+
+    Recency is tracked with the modification time of the entries, which is updated on
+    every hit, because access times are often disabled on servers.
+
+    Attributes:
+        directory (str): The directory where the results are stored.
+        max_size (int): The maximum total size of the results in bytes.
+    """
+
+    def __init__(self, directory: str = EXTRACTION_CACHE_DIR, max_size: int = EXTRACTION_CACHE_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self._size = None # total size of the entries, scanned on the first write
+        self._lock = threading.Lock()
+
+    def _get_entry_path(self, content_hash: str, extractor: str, version: int):
+        return os.path.join(self.directory, f"{content_hash}_{extractor}_v{version}.jsonl")
+
+    def iter(self, content_hash: str, extractor: str, version: int, extract):
+        """
+        Yield the cached result of an extraction, running and caching the extraction on a miss.
+
+        Args:
+            content_hash (str): The SHA-256 hash of the extracted file's content.
+            extractor (str): The name of the extractor, e.g. pdffile.
+            version (int): The version of the extractor; results of other versions are not used.
+            extract (callable): Returns an iterable of the extracted text parts.
+
+        Yields:
+            str: The extracted text parts, in order.
+        """
+        entry_path = self._get_entry_path(content_hash, extractor, version)
+        try:
+            file = open(entry_path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            yield from self._fill(entry_path, extract)
+            return
+
+        with file:
+            os.utime(entry_path) # mark as recently used
+            for line in file:
+                yield json.loads(line)
+
+    def _fill(self, entry_path: str, extract):
+        """
+        Yield the parts of a running extraction while writing them to the cache.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_path = f"{entry_path}.{generate_hash('', strategy='uuid')}.tmp"
+        try:
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                for part in extract():
+                    file.write(json.dumps(part) + "\n")
+                    yield part
+            size = os.path.getsize(temporary_path)
+            os.replace(temporary_path, entry_path) # cache only complete extractions
+            self._added(size)
+        finally:
+            if os.path.exists(temporary_path): # the caller stopped early or the extraction failed
+                os.remove(temporary_path)
+
+    def _added(self, size: int):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries()) # includes the new entry
+            else:
+                self._size += size
+
+            if self._size > self.max_size:
+                self._evict()
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".jsonl"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError: # evicted by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        """
+        Delete the least recently used entries until the cache is 10% below its maximum size,
+        so that the following writes don't have to evict again.
+        """
+        entries = sorted(self._entries())
+        size = sum(entry_size for _, entry_size, _ in entries) # other processes share the directory
+        for _, entry_size, path in entries:
+            if size <= self.max_size * 0.9:
+                break
+            try:
+                os.remove(path)
+                size -= entry_size
+            except FileNotFoundError:
+                size -= entry_size
+            except OSError as e: # e.g. opened on Windows
+                logger.error(f"Failed to evict extraction result {path}: {str(e)}")
+        self._size = size
+
+
+# Create a global extraction cache
+cache = ExtractionCache()
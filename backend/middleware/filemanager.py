@@ -4,7 +4,8 @@ After migration to AWS S3, modify the save and delete methods in the FileManager
 classes to interact with the S3 bucket instead of the local file system.
 """
 
-from io import BytesIO
+import asyncio
+import hashlib
 import os
 import pymupdf
 from pptx import Presentation
@@ -12,7 +13,8 @@ from docx import Document
 from fastapi import UploadFile
 from abc import ABC, abstractmethod
 from PIL import Image
-from tools import splitext
+from middleware import blobstore, executor, extraction, MAX_UPLOAD_SIZE, UPLOAD_CHUNK_SIZE
+from tools import hash_file, splitext
 
 
 class BaseFile(ABC):
@@ -22,12 +24,17 @@ class BaseFile(ABC):
     Attributes:
         file (UploadFile): The file to be managed.
         path (str): The path where the file is saved.
+        hash (str): The SHA-256 hash of the saved content, computed while saving.
+        EXTRACTOR_VERSION (int): The version of the text extraction, bump it when the extracted text changes
+            so that cached results of the previous version are not used.
 
     Methods:
         save(path: str): Save the file to the specified path.
+        store(owner: str): Save the file in the content-addressed blob store.
         delete(): Delete the file.
         content(): Abstract method to get the content of the file.
         get(): Abstract method to get the file.
+        save_async(), store_async(), content_async(): Awaitable versions of the methods above for request handlers.
     """
 
     class ResourceWrapper:
@@ -64,20 +71,26 @@ class BaseFile(ABC):
         def __getattr__(self, attr):
             return getattr(self.resource, attr)
 
+    EXTRACTOR_VERSION = 1
+
     def __init__(self, file: UploadFile = None, path: str = None):
         self.file = file
         self.path = path
+        self.hash = None
 
     def save(self, path: str):
         """
         Save the file to the specified path.
 
+        The upload is copied in chunks of UPLOAD_CHUNK_SIZE bytes, hashing the content and
+        checking it against MAX_UPLOAD_SIZE on the way, so it is never held in memory as a whole.
+
         Args:
             path (str): The path where the file should be saved.
 
         Raises:
             OSError: If the file already exists in the specified path.
-            ValueError: If no file is provided to be saved.
+            ValueError: If no file is provided to be saved or the file is larger than MAX_UPLOAD_SIZE.
         """
         if self.path:
             return
@@ -89,10 +102,90 @@ class BaseFile(ABC):
         directory = os.path.dirname(path) # directory part of the path
         os.makedirs(directory, exist_ok=True)
         
-        with open(path, "wb") as file:
-            file.write(self.file.file.read())
+        sha256, size = hashlib.sha256(), 0
+        try:
+            with open(path, "wb") as file:
+                while chunk := self.file.file.read(UPLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > MAX_UPLOAD_SIZE:
+                        raise ValueError(f"File exceeds the maximum upload size of {MAX_UPLOAD_SIZE // (1024 * 1024)} MB.")
+                    sha256.update(chunk)
+                    file.write(chunk)
+        except Exception:
+            os.remove(path) # don't leave a partial file behind
+            raise
 
         self.path = path
+        self.hash = sha256.hexdigest()
+
+    def store(self, owner: str):
+        """
+        Save the file in the content-addressed blob store, referenced by the given owner.
+        A file with the same content is stored only once and shared by all its owners.
+
+        Args:
+            owner (str): The owner of the file, e.g. chat_12.
+
+        Raises:
+            ValueError: If no file is provided to be stored.
+        """
+        if self.path:
+            return
+        if not self.file:
+            raise ValueError("No file provided to be stored.")
+
+        extension = splitext(self.file.filename)[1]
+        temporary_path = blobstore.get_temporary_path(extension)
+        self.save(temporary_path) # subclasses may transform the file while saving, e.g. resize images
+        try:
+            self.path = blobstore.put(temporary_path, extension, owner, blob_hash=self.hash)
+        except Exception:
+            self.delete() # remove the temporary file
+            raise
+
+    async def save_async(self, *args, **kwargs):
+        """
+        Save the file without blocking the event loop. Takes the arguments of `save`.
+        """
+        return await asyncio.to_thread(self.save, *args, **kwargs)
+
+    async def store_async(self, owner: str):
+        """
+        Store the file in the blob store without blocking the event loop. Takes the arguments of `store`.
+        """
+        return await asyncio.to_thread(self.store, owner)
+
+    async def content_async(self):
+        """
+        Get the content of the file without blocking the event loop.
+        """
+        return await asyncio.to_thread(self.content)
+
+    def _extracted(self, extract):
+        """
+        Returns the text parts extracted from the file through the shared extraction cache,
+        keyed by the content hash and the extractor version. Files that are not saved are
+        extracted from the upload without caching.
+
+        Args:
+            extract (callable): Takes the path of the file or the upload stream and yields the text parts.
+
+        Returns:
+            Iterator[str]: The extracted text parts.
+        """
+        if not self.path:
+            return extract(self._upload())
+
+        content_hash = self.hash or blobstore.get_content_hash(self.path)
+        return extraction.cache.iter(content_hash, type(self).__name__.lower(), self.EXTRACTOR_VERSION,
+                                     lambda: extract(self.path))
+
+    def _upload(self):
+        """
+        Returns the uploaded file's stream, rewound to its beginning.
+        """
+        self.file.file.seek(0)
+        return self.file.file
 
     def delete(self):
         """
@@ -190,9 +283,7 @@ class ImageFile(BaseFile):
             size (tuple, optional): The desired size of the image. Defaults to (256, 256).
         """
         super().save(path)
-        with Image.open(self.path) as img: # resize to the given size
-            img.thumbnail(size)
-            img.save(self.path)
+        self.hash = executor.submit(resize_image, self.path, size).result() # CPU-bound, off the calling process
 
     def content(self):
         """
@@ -209,7 +300,7 @@ class ImageFile(BaseFile):
         if self.path:            
             return Image.open(self.path)
         
-        return Image.open(self.file.file)
+        return Image.open(self._upload())
     
     def get(self):
         """
@@ -239,6 +330,7 @@ class PresentationFile(BaseFile):
 
     Methods:
         content(): Extracts the text content from the presentation file.
+        slides(): Extracts the text content slide by slide.
         get(): Retrieves the presentation resource.
 
     """
@@ -265,18 +357,32 @@ class PresentationFile(BaseFile):
         if not self.path and not self.file:
             raise ValueError("No file provided.")
         
-        text = ""
+        return "".join(self.slides())
 
-        if self.path:
-            presentation = Presentation(self.path)
-        else:
-            presentation = Presentation(BytesIO(self.file.file.read()))
+    def slides(self):
+        """
+        Extracts the text content from the presentation file slide by slide.
+
+        Returns:
+            Iterator[str]: The text of each slide, in order.
+
+        Raises:
+            ValueError: If no file is provided.
+        """
+        if not self.path and not self.file:
+            raise ValueError("No file provided.")
+
+        return self._extracted(self._iter_slides)
+
+    @staticmethod
+    def _iter_slides(source):
+        if isinstance(source, str): # parse the saved file in the shared process pool
+            yield from executor.submit(extraction.extract_slides, source).result()
+            return
+
+        presentation = Presentation(source) # the spooled upload, without an extra copy
         for slide in presentation.slides:
-            for shape in slide.shapes:
-                if not shape.has_text_frame:
-                    continue
-                text += shape.text_frame.text
-        return text
+            yield "".join(shape.text_frame.text for shape in slide.shapes if shape.has_text_frame)
     
     def get(self):
         """
@@ -307,6 +413,7 @@ class PDFFile(BaseFile):
 
     Methods:
         content(): Returns the content of the PDF file as text.
+        pages(): Returns the text of the PDF file page by page.
         get(): Returns a resource wrapper for the PDF file.
 
     """
@@ -324,25 +431,44 @@ class PDFFile(BaseFile):
         Returns the content of the PDF file as text.
 
         Returns:
-            str: The content of the PDF file.
+            str: The content of the PDF file, pages separated by form feeds.
 
         Raises:
             ValueError: If no file is provided.
 
         """
-        if not self.path and not self.file:
-            raise ValueError("No file provided.")
-        
         # TODO: if file size is not too large and there aren't many pages, convert to images
         # TODO: we may also need OCR here, for scanned PDFs
         # TODO: Do testing with contents
-        if self.path:
-            with pymupdf.open(self.path) as doc:
-                return chr(12).join([page.get_text() for page in doc])
-        
-        # TODO: find a solution for large pdf files such as books
-        with pymupdf.open(stream=BytesIO(self.file.file.read()), filetype="pdf") as doc:
-            return chr(12).join([page.get_text() for page in doc])
+        return chr(12).join(self.pages())
+
+    def pages(self):
+        """
+        Returns the text of the PDF file page by page, without building the whole text at once.
+
+        Large saved PDFs are extracted in parallel and their page texts are cached,
+        so reading a stored book again doesn't parse it again.
+
+        Returns:
+            Iterator[str]: The text of each page, in page order.
+
+        Raises:
+            ValueError: If no file is provided.
+        """
+        if not self.path and not self.file:
+            raise ValueError("No file provided.")
+
+        return self._extracted(self._iter_pages)
+
+    @staticmethod
+    def _iter_pages(source):
+        if isinstance(source, str):
+            yield from extraction.extract_pdf_pages(source)
+            return
+
+        with pymupdf.open(stream=source.read(), filetype="pdf") as doc: # pymupdf needs bytes
+            for page in doc:
+                yield page.get_text()
 
     def get(self):
         """
@@ -398,12 +524,18 @@ class WordFile(BaseFile):
         if not self.path and not self.file:
             raise ValueError("No file provided.")
         
-        if self.path:
-            doc = Document(self.path)
-        else:
-            doc = Document(BytesIO(self.file.file.read()))
         # TODO: Do testing
-        return chr(12).join([para.text for para in doc.paragraphs])
+        return chr(12).join(self._extracted(self._iter_paragraphs))
+
+    @staticmethod
+    def _iter_paragraphs(source):
+        if isinstance(source, str): # parse the saved file in the shared process pool
+            yield from executor.submit(extraction.extract_paragraphs, source).result()
+            return
+
+        doc = Document(source) # the spooled upload, without an extra copy
+        for para in doc.paragraphs:
+            yield para.text
 
     def get(self):
         """
@@ -416,6 +548,23 @@ class WordFile(BaseFile):
         return self.ResourceWrapper(doc)
     
 
+def resize_image(path: str, size: tuple):
+    """
+    Shrink an image file in place to fit the given size. Runs in a worker process.
+
+    Args:
+        path (str): The path to the image file.
+        size (tuple): The maximum width and height.
+
+    Returns:
+        str: The SHA-256 hash of the resized image.
+    """
+    with Image.open(path) as img:
+        img.thumbnail(size)
+        img.save(path)
+    return hash_file(path)
+
+
 class FileFactory:
     """
     A factory class for creating different types of files based on their extensions.
@@ -0,0 +1,217 @@
+"""
+Background garbage collection of the files of deleted records.
+
+Deleting a course or a chat only deletes its rows, within the transaction of the
+request. Once the request is committed, its files (chat histories, chat and
+course folders, files of older versions) and its blob store references are
+queued here and removed in batches by a background task, off the request path.
+Failed removals are retried with an exponential backoff, up to GC_MAX_ATTEMPTS
+times.
+
+Work lost on the way, e.g. when the process stops with a non-empty queue, is
+picked up by the orphan sweep, which runs on startup and every GC_SWEEP_INTERVAL
+seconds. It removes the chat and course folders, chat histories and blob
+references whose record no longer exists and which are older than
+GC_SWEEP_GRACE seconds, so the files of a record still being created are left
+alone.
+
+Usage:
+```
+background_tasks.add_task(garbage.collect, paths=[chat_folder], owners=["chat_12"]) # after the request is committed
+background_tasks.add_task(garbage.collect, blobs=[(old_slides_path, "chat_12_slides")]) # a single reference
+```
+"""
+
+import asyncio
+import os
+import re
+import shutil
+import time
+
+from logger import logger
+from middleware import FILES_DIR, blobstore
+
+GC_BATCH_SIZE = int(os.getenv("GC_BATCH_SIZE", "100")) # items removed per worker run
+GC_MAX_ATTEMPTS = int(os.getenv("GC_MAX_ATTEMPTS", "5"))
+GC_RETRY_DELAY = float(os.getenv("GC_RETRY_DELAY", "5")) # in seconds, doubled after every failed attempt
+GC_SWEEP_INTERVAL = int(os.getenv("GC_SWEEP_INTERVAL", "3600")) # in seconds, 0 disables the periodic sweep
+GC_SWEEP_GRACE = int(os.getenv("GC_SWEEP_GRACE", "3600")) # in seconds, minimum age of an orphan
+
+_OWNER_PATTERN = re.compile(r"^(chat|course)_(\d+)(_slides)?$") # chat_12, chat_12_slides, course_3
+
+_queue = None # created by `start`, items are (kind, target, attempts) with kind "path", "owner" or "blob"
+_tasks = []
+
+
+async def collect(paths: list = (), owners: list = (), blobs: list = ()):
+    """
+    Queue files, blob store owners and blob store references for removal. Without a running
+    collector, e.g. in a script, they are removed right away.
+
+    Args:
+        paths (list, optional): The paths of files or folders to remove, missing ones are ignored.
+        owners (list, optional): The blob store owners whose references are released.
+        blobs (list, optional): The (path, owner) pairs of single references to release, e.g. of replaced slides.
+    """
+    items = ([("path", path, 0) for path in paths if path] + [("owner", owner, 0) for owner in owners if owner]
+             + [("blob", (path, owner), 0) for path, owner in blobs if path])
+    if _queue is None:
+        for item in await asyncio.to_thread(_collect_batch, items):
+            logger.error(f"Failed to collect {item[0]} {item[1]}, left for the orphan sweep")
+        return
+
+    for item in items:
+        _queue.put_nowait(item)
+
+
+def start():
+    """
+    Start the collector and the periodic orphan sweep on the running event loop.
+    """
+    global _queue
+    _queue = asyncio.Queue()
+    _tasks.append(asyncio.create_task(_run_collector()))
+    _tasks.append(asyncio.create_task(_run_sweeps()))
+
+
+async def stop():
+    """
+    Stop the collector, removing what is still queued first.
+    """
+    global _queue
+    for task in _tasks:
+        task.cancel()
+    _tasks.clear()
+
+    items, _queue = _drain(_queue, _queue.qsize() if _queue else 0), None
+    if items:
+        await asyncio.to_thread(_collect_batch, items) # best effort, the sweep catches the rest
+
+
+def sweep():
+    """
+    Remove the files and blob store references of deleted chats and courses, see the module docs.
+
+    Returns:
+        int: The number of removed orphans.
+    """
+    # imported here to avoid circular imports
+    from database.dbmanager import ChatDB, CourseDB, BlobDB
+    from modules.chat import CHATS_DIR
+    from modules.chat.history import get_history_name
+
+    cutoff = time.time() - GC_SWEEP_GRACE
+
+    # chat_<id> and course_<id> folders
+    folders = {"chat": {}, "course": {}}
+    for entry in _list_dir(FILES_DIR):
+        match = _OWNER_PATTERN.match(entry.name)
+        if match and not match.group(3) and entry.is_dir() and entry.stat().st_mtime < cutoff:
+            folders[match.group(1)][int(match.group(2))] = entry.path
+    existing = {"chat": ChatDB.fetch_existing_ids(list(folders["chat"])),
+                "course": CourseDB.fetch_existing_ids(list(folders["course"]))}
+    orphans = [path for kind in folders for record_id, path in folders[kind].items() if record_id not in existing[kind]]
+
+    # chat history files
+    histories = ChatDB.fetch_history_names()
+    for entry in _list_dir(CHATS_DIR):
+        name = get_history_name(entry.path)
+        if name and name not in histories and entry.is_file() and entry.stat().st_mtime < cutoff:
+            orphans.append(entry.path)
+
+    # blob store references, by the time they were made
+    owners = {}
+    for owner in BlobDB.fetch_owners(older_than=GC_SWEEP_GRACE):
+        match = _OWNER_PATTERN.match(owner)
+        if match:
+            owners.setdefault(match.group(1), {}).setdefault(int(match.group(2)), []).append(owner)
+    existing = {"chat": ChatDB.fetch_existing_ids(list(owners.get("chat", {}))),
+                "course": CourseDB.fetch_existing_ids(list(owners.get("course", {})))}
+    orphan_owners = [owner for kind in owners for record_id, names in owners[kind].items()
+                     if record_id not in existing[kind] for owner in names]
+
+    items = [("path", path, 0) for path in orphans] + [("owner", owner, 0) for owner in orphan_owners]
+    failed = _collect_batch(items)
+    if items:
+        logger.info(f"Orphan sweep removed {len(items) - len(failed)} of {len(items)} orphans")
+    return len(items) - len(failed)
+
+
+async def _run_collector():
+    while True:
+        items = [await _queue.get()]
+        items += _drain(_queue, GC_BATCH_SIZE - 1)
+
+        for kind, target, attempts in await asyncio.to_thread(_collect_batch, items):
+            if attempts + 1 >= GC_MAX_ATTEMPTS:
+                logger.error(f"Giving up collecting {kind} {target}, left for the orphan sweep")
+            else:
+                asyncio.get_running_loop().call_later(GC_RETRY_DELAY * 2 ** attempts, _queue.put_nowait,
+                                                      (kind, target, attempts + 1))
+
+
+async def _run_sweeps():
+    while True:
+        try:
+            await asyncio.to_thread(sweep)
+        except Exception as e:
+            logger.error(f"Orphan sweep failed: {str(e)}")
+
+        if not GC_SWEEP_INTERVAL:
+            return
+        await asyncio.sleep(GC_SWEEP_INTERVAL)
+
+
+def _drain(queue: asyncio.Queue, count: int):
+    items = []
+    while queue is not None and len(items) < count and not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+def _collect_batch(items: list):
+    """
+    Remove a batch of queued items, releasing the owners' blob references in a single call.
+
+    Returns:
+        list: The items that could not be removed.
+    """
+    failed = []
+    for item in items:
+        if item[0] != "path":
+            continue
+        path = item[1]
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"Failed to remove {path}: {str(e)}")
+            failed.append(item)
+
+    for item in items:
+        if item[0] != "blob":
+            continue
+        try:
+            blobstore.release(*item[1])
+        except Exception as e:
+            logger.warning(f"Failed to release {item[1][0]} of {item[1][1]}: {str(e)}")
+            failed.append(item)
+
+    owners = [item for item in items if item[0] == "owner"]
+    if owners:
+        try:
+            blobstore.release_all(*[owner for _, owner, _ in owners])
+        except Exception as e:
+            logger.warning(f"Failed to release the blobs of {len(owners)} owners: {str(e)}")
+            failed += owners
+
+    return failed
+
+
+def _list_dir(path: str):
+    if not path or not os.path.isdir(path):
+        return []
+    with os.scandir(path) as entries:
+        return list(entries)
@@ -0,0 +1,248 @@
+"""
+Background jobs, e.g. the generation of quizzes, flashcards and study plans.
+
+A request submits a job, which only inserts a row into the jobs table, and the
+job workers run it later. Workers claim the oldest queued job with a conditional
+update, so any number of worker tasks, in the web server and in separate
+`worker.py` processes, can share the table. At most JOB_MAX_RUNNING jobs run at
+once, at most JOB_USER_MAX_RUNNING of them for the same user, and a user can
+have at most JOB_USER_MAX_PENDING queued or running jobs. System jobs, e.g. the
+indexing of course materials, are submitted on behalf of a user but neither
+subject to nor counted against the user's limits.
+
+A job failing with a ValueError, e.g. the LLM returned invalid JSON, or taking
+longer than JOB_TIMEOUT seconds is queued again, up to JOB_MAX_ATTEMPTS attempts.
+Any other exception, e.g. `JobError`, fails it right away. Jobs left running by a
+stopped worker process are queued again after twice JOB_TIMEOUT. Finished jobs
+and their results are deleted JOB_RETENTION seconds after they finish.
+
+By default JOB_WORKERS workers run in the web server process. Set JOB_WORKERS=0
+to run them in separate processes with `worker.py`.
+
+Usage:
+```
+@jobs.handler("quiz")
+async def generate_quiz(job):
+    ...
+    return {"filename": quiz_name, "quiz": data} # the JSON result of the job
+
+job = await jobs.submit("quiz", user_id, {"chat_id": 12})
+job = await jobs.wait(job["job_id"], timeout=60)
+```
+"""
+
+import asyncio
+import os
+
+from logger import logger
+from database.connection import on_commit
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4")) # worker tasks of the web server, 0 leaves the jobs to worker.py
+JOB_MAX_RUNNING = int(os.getenv("JOB_MAX_RUNNING", "16")) # of all workers
+JOB_USER_MAX_RUNNING = int(os.getenv("JOB_USER_MAX_RUNNING", "2"))
+JOB_USER_MAX_PENDING = int(os.getenv("JOB_USER_MAX_PENDING", "10")) # queued or running
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_TIMEOUT = int(os.getenv("JOB_TIMEOUT", "300")) # in seconds, per attempt
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2")) # in seconds, for jobs submitted by other processes
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "604800")) # in seconds after they finish, 0 keeps the finished jobs
+
+FINISHED_STATUSES = ["succeeded", "failed"]
+
+_handlers = {} # job type -> async handler
+_system_types = set() # job types exempt from the user limits, see `handler`
+_finished = {} # job ID -> event set when the job finishes in this process, see `wait`
+_wakeup = None # created by `start`, set when a job is submitted or a running job finishes
+_tasks = []
+
+
+class JobError(Exception):
+    """
+    Raised by a job handler when the job can't succeed, so it is failed without further attempts.
+    """
+
+
+def handler(job_type: str, system: bool = False):
+    """
+    Register the handler of a job type. The handler is called with the job and returns its JSON
+    serializable result.
+
+    Args:
+        job_type (str): The type of the jobs, e.g. quiz.
+        system (bool, optional): Whether the jobs are exempt from the user limits, e.g. maintenance jobs
+            the user didn't ask for. Defaults to False.
+    """
+    def register(fn):
+        _handlers[job_type] = fn
+        if system:
+            _system_types.add(job_type)
+        return fn
+    return register
+
+
+async def submit(job_type: str, user_id: int, payload: dict, db=None):
+    """
+    Queue a job. Within a unit of work, the workers are notified once it is committed.
+
+    Args:
+        job_type (str): The type of the job, with a registered handler.
+        user_id (int): The ID of the user who submits the job.
+        payload (dict): The JSON serializable arguments of the job.
+        db (AsyncSession, optional): The session of the request's unit of work. Defaults to committing right away.
+
+    Returns:
+        dict: The queued job.
+
+    Raises:
+        ValueError: If the user has too many pending jobs, unless it is a system job.
+    """
+    from database.dbmanager import JobDB # imported here to avoid circular imports
+
+    job = await JobDB.create_async(user_id=user_id, job_type=job_type, job_payload=payload,
+                                   max_pending=None if job_type in _system_types else JOB_USER_MAX_PENDING,
+                                   uncapped_types=list(_system_types), db=db)
+    if db is None:
+        _notify()
+    else:
+        on_commit(db.sync_session, _notify)
+
+    return job
+
+
+async def wait(job_id: int, timeout: float = None):
+    """
+    Wait for a job to finish, e.g. to answer a request synchronously.
+
+    Args:
+        job_id (int): The ID of the job.
+        timeout (float, optional): The maximum time to wait, in seconds. Defaults to no limit.
+
+    Returns:
+        dict: The job, still queued or running if the timeout is reached. None if it doesn't exist.
+    """
+    from database.dbmanager import JobDB # imported here to avoid circular imports
+
+    deadline = None if timeout is None else asyncio.get_running_loop().time() + timeout
+    try:
+        while True:
+            job = await JobDB.fetch_async(job_id=job_id)
+            if job is None or job["job_status"] in FINISHED_STATUSES:
+                return job
+
+            remaining = JOB_POLL_INTERVAL if deadline is None else deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return job
+
+            finished = _finished.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(finished.wait(), min(remaining, JOB_POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                pass # run by another process, or still running
+    finally:
+        _finished.pop(job_id, None)
+
+
+async def run_next():
+    """
+    Claim the next job that can run and run it.
+
+    Returns:
+        dict: The job after its attempt, or None if no job could be claimed.
+    """
+    from database.dbmanager import JobDB # imported here to avoid circular imports
+
+    job = await JobDB.claim_async(JOB_MAX_RUNNING, JOB_USER_MAX_RUNNING, uncapped_types=list(_system_types))
+    if job is None:
+        return None
+
+    update = {"job_status": "succeeded", "job_error": None}
+    try:
+        if job["job_type"] not in _handlers:
+            raise JobError(f"Unknown job type {job['job_type']}")
+        update["job_result"] = await asyncio.wait_for(_handlers[job["job_type"]](job), JOB_TIMEOUT)
+    except (ValueError, asyncio.TimeoutError) as e: # e.g. invalid JSON from the LLM, worth another attempt
+        update = {"job_status": "queued" if job["attempts"] < JOB_MAX_ATTEMPTS else "failed",
+                  "job_error": str(e) or "Timed out"}
+        logger.warning(f"Attempt {job['attempts']} of job {job['job_id']} ({job['job_type']}) failed: {update['job_error']}")
+    except asyncio.CancelledError: # stopping, left to the next worker
+        await JobDB.update_async(job["job_id"], job_status="queued") # `stop` cancels once and waits for it
+        raise
+    except Exception as e:
+        update = {"job_status": "failed", "job_error": str(e)}
+        logger.error(f"Job {job['job_id']} ({job['job_type']}) failed: {str(e)}")
+
+    job = await JobDB.update_async(job["job_id"], **update)
+    _notify(job["job_id"] if job["job_status"] in FINISHED_STATUSES else None)
+    return job
+
+
+def start(workers: int = None):
+    """
+    Start the job workers on the running event loop.
+
+    Args:
+        workers (int, optional): The number of worker tasks. Defaults to JOB_WORKERS.
+    """
+    global _wakeup
+    workers = JOB_WORKERS if workers is None else workers
+    if not workers:
+        return
+
+    _wakeup = asyncio.Event()
+    _tasks.extend(asyncio.create_task(_run_worker()) for _ in range(workers))
+    _tasks.append(asyncio.create_task(_run_maintenance()))
+
+
+async def stop():
+    """
+    Stop the job workers, queueing their running jobs again.
+    """
+    global _wakeup
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    _wakeup = None
+
+
+def _notify(job_id: int = None):
+    if _wakeup is not None:
+        _wakeup.set()
+    if job_id is not None and job_id in _finished:
+        _finished[job_id].set()
+
+
+async def _run_worker():
+    while True:
+        _wakeup.clear()
+        try:
+            job = await run_next()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e: # e.g. the database is unavailable
+            logger.error(f"Job worker failed: {str(e)}")
+            job = None
+
+        if job is None: # nothing to run, or at the concurrency limits
+            try:
+                await asyncio.wait_for(_wakeup.wait(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def _run_maintenance():
+    from database.dbmanager import JobDB # imported here to avoid circular imports
+
+    while True:
+        try:
+            if await JobDB.requeue_stale_async(older_than=2 * JOB_TIMEOUT, max_attempts=JOB_MAX_ATTEMPTS):
+                _notify()
+        except Exception as e:
+            logger.error(f"Requeueing stale jobs failed: {str(e)}")
+
+        try:
+            if JOB_RETENTION:
+                await JobDB.delete_finished_async(older_than=JOB_RETENTION)
+        except Exception as e:
+            logger.error(f"Deleting finished jobs failed: {str(e)}")
+
+        await asyncio.sleep(JOB_TIMEOUT)
@@ -0,0 +1,184 @@
+"""
+Async gateway to the Gemini API.
+
+All routers talk to the LLM through this module instead of calling the
+synchronous google.generativeai methods directly, so a slow completion never
+blocks the event loop. The number of in-flight LLM calls is bounded by
+LLM_MAX_CONCURRENCY; extra callers wait for a free slot without holding up
+unrelated requests.
+
+Stateless generations from text only (study plans, flashcards of pasted
+content) are cached for LLM_CACHE_TTL seconds, keyed by the model version, the
+system prompt and the hash of the contents, so identical syllabi cost a single
+call. Identical generations requested at the same time share one call too.
+Only successful generations are cached: valid JSON whose `success` isn't false.
+The hit rate of the cache is logged every LLM_CACHE_STATS_INTERVAL lookups, see
+`generation_cache_stats`.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+import google.generativeai as genai
+
+from logger import logger
+from middleware.cache import create_cache
+from modules.chat import MODEL_VERSION, SYSTEM_PROMPT
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400")) # in seconds, 0 disables the generation cache
+LLM_CACHE_MAX_SIZE = int(os.getenv("LLM_CACHE_MAX_SIZE", "1000")) # cached generations, least recently used evicted first
+LLM_CACHE_STATS_INTERVAL = int(os.getenv("LLM_CACHE_STATS_INTERVAL", "100")) # lookups between hit rate log lines, 0 disables them
+
+_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY) # bounds the number of concurrent LLM calls
+
+generation_cache = create_cache("llm_generations", LLM_CACHE_MAX_SIZE)
+generation_cache_stats = {"hits": 0, "misses": 0} # of this process
+_pending_generations = {} # cache key -> event set once the generation in flight is finished
+
+
+def get_model(json_response: bool = False):
+    """
+    Create a generative model configured with the application's model version and system prompt.
+
+    Args:
+        json_response (bool, optional): Whether the model should respond with JSON. Defaults to False.
+
+    Returns:
+        genai.GenerativeModel: The configured model.
+    """
+    generation_config = {"response_mime_type": "application/json"} if json_response else None
+    return genai.GenerativeModel(MODEL_VERSION, system_instruction=SYSTEM_PROMPT,
+                                 generation_config=generation_config)
+
+
+async def send_message(history: list, content, json_response: bool = False):
+    """
+    Send a message in a chat session initialized with the given history.
+
+    Args:
+        history (list): The chat history so far.
+        content: The message content, e.g. a prompt or a list of a prompt and a file content.
+        json_response (bool, optional): Whether the model should respond with JSON. Defaults to False.
+
+    Returns:
+        tuple: The response text and the updated chat history.
+    """
+    chat = get_model(json_response).start_chat(history=history) # Initialize the chat model with the chat history so far
+
+    async with _semaphore:
+        response = await chat.send_message_async(content)
+
+    return response.text, chat.history
+
+
+async def generate_content(contents, json_response: bool = False, use_cache: bool = True):
+    """
+    Generate a single (stateless) completion for the given contents. Completions of text
+    contents are cached, see the module docs.
+
+    Args:
+        contents: The prompt contents, e.g. a list of a task prompt and a file content.
+        json_response (bool, optional): Whether the model should respond with JSON. Defaults to False.
+        use_cache (bool, optional): Whether a cached completion may be returned. If False, a new one
+                                    is generated and replaces the cached one. Defaults to True.
+
+    Returns:
+        str: The response text.
+    """
+    key = _get_cache_key(contents, json_response)
+    if key is None or not use_cache:
+        text = await _generate_content(contents, json_response)
+        if key is not None and _is_cacheable(text, json_response):
+            generation_cache.set(key, text, time.time() + LLM_CACHE_TTL)
+        return text
+
+    while key in _pending_generations: # the same generation is in flight, e.g. for an identical syllabus
+        await _pending_generations[key].wait()
+
+    text = generation_cache.get(key)
+    if text is not None:
+        _count_lookup(hit=True)
+        return text
+
+    _count_lookup(hit=False)
+    _pending_generations[key] = asyncio.Event()
+    try:
+        text = await _generate_content(contents, json_response)
+        if _is_cacheable(text, json_response):
+            generation_cache.set(key, text, time.time() + LLM_CACHE_TTL)
+        return text
+    finally:
+        _pending_generations.pop(key).set() # waiters generate it themselves if it failed
+
+
+async def _generate_content(contents, json_response: bool):
+    model = get_model(json_response)
+
+    async with _semaphore:
+        response = await model.generate_content_async(contents)
+
+    return response.text
+
+
+def _is_cacheable(text: str, json_response: bool):
+    if not json_response:
+        return True
+    try:
+        data = json.loads(text)
+    except ValueError: # invalid JSON is generated again by the next attempt instead
+        return False
+    # a refusal, e.g. {"success": false, "data": "..."}, is generated again by the next request instead
+    return not isinstance(data, dict) or bool(data.get("success", True))
+
+
+def _count_lookup(hit: bool):
+    generation_cache_stats["hits" if hit else "misses"] += 1
+    hits, misses = generation_cache_stats["hits"], generation_cache_stats["misses"]
+    if LLM_CACHE_STATS_INTERVAL and (hits + misses) % LLM_CACHE_STATS_INTERVAL == 0:
+        logger.debug(f"LLM generation cache: {hits} hits and {misses} misses in this process ({100 * hits / (hits + misses):.0f}% hit rate)")
+
+
+def _get_cache_key(contents, json_response: bool):
+    """
+    Hash the model version, the system prompt and the contents of a generation.
+
+    Returns:
+        str: The cache key, or None if the generation is not cached, e.g. it includes an image.
+    """
+    parts = [contents] if isinstance(contents, str) else contents
+    if not LLM_CACHE_TTL or not LLM_CACHE_MAX_SIZE or not all(isinstance(part, str) for part in parts):
+        return None
+
+    digest = hashlib.sha256()
+    for part in [MODEL_VERSION, SYSTEM_PROMPT, str(json_response), *parts]:
+        data = (part or "").encode()
+        digest.update(len(data).to_bytes(8, "big") + data) # length prefixed, so parts can't run into each other
+    return digest.hexdigest()
+
+
+async def stream_message(history: list, content, on_complete=None):
+    """
+    Send a message in a chat session and yield the response text as it arrives.
+
+    Args:
+        history (list): The chat history so far.
+        content: The message content, e.g. a prompt or a list of a prompt and a file content.
+        on_complete (callable, optional): Called with the updated chat history once the
+            whole response has been received. Defaults to None.
+
+    Yields:
+        str: The response text chunks.
+    """
+    chat = get_model().start_chat(history=history) # Initialize the chat model with the chat history so far
+
+    async with _semaphore:
+        response = await chat.send_message_async(content, stream=True)
+        async for chunk in response:
+            if chunk.parts: # the last chunk may carry only the finish reason
+                yield chunk.text
+
+    if on_complete:
+        on_complete(chat.history)
@@ -0,0 +1,269 @@
+"""
+Local BM25 retrieval index over the text of documents.
+
+The text of the indexed documents is split into overlapping chunks of
+RETRIEVAL_CHUNK_WORDS words, and the chunks are scored against a query with
+Okapi BM25. An index is a directory of NumPy arrays (postings in term order,
+chunk lengths, inverse document frequencies, chunk text offsets) that are
+memory-mapped when searched, so a large index (e.g. of a 600-page book) is
+paged in on demand instead of being loaded into every worker process, and
+scoring a query is a few vectorized operations per query term.
+
+An index is rebuilt as a whole into a new directory that replaces the old one,
+so searches never see a partially written index.
+
+Usage:
+```
+build_index("files/course_3/index", [("Syllabus, page 1", page_text), ...], fingerprint="...")
+index = RetrievalIndex.open("files/course_3/index")
+for chunk in index.search("what is a monad", k=5):
+    ...
+```
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from tools import generate_hash
+
+RETRIEVAL_CHUNK_WORDS = int(os.getenv("RETRIEVAL_CHUNK_WORDS", "200"))
+RETRIEVAL_CHUNK_OVERLAP = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP", "40")) # in words, shared by consecutive chunks
+RETRIEVAL_MAX_OPEN_INDEXES = int(os.getenv("RETRIEVAL_MAX_OPEN_INDEXES", "64")) # per process, least recently used closed first
+
+INDEX_VERSION = 1 # bump it when the format or the tokenization changes, older indexes are rebuilt
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+_ARRAYS = ["offsets", "chunk_ids", "frequencies", "idf", "lengths", "text_offsets"]
+
+
+def tokenize(text: str):
+    """
+    Split a text into lowercase terms.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        list: The terms, in order.
+    """
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def chunk_text(text: str, words: int = None, overlap: int = None):
+    """
+    Split a text into chunks of `words` whitespace separated words, consecutive chunks sharing `overlap` words.
+
+    Args:
+        text (str): The text, e.g. a page.
+        words (int, optional): The number of words per chunk. Defaults to RETRIEVAL_CHUNK_WORDS.
+        overlap (int, optional): The number of words shared by consecutive chunks. Defaults to RETRIEVAL_CHUNK_OVERLAP.
+
+    Returns:
+        list: The chunks.
+    """
+    words = words or RETRIEVAL_CHUNK_WORDS
+    overlap = min(RETRIEVAL_CHUNK_OVERLAP if overlap is None else overlap, words - 1)
+
+    tokens = text.split()
+    step = words - overlap
+    return [" ".join(tokens[start:start + words]) for start in range(0, max(len(tokens) - overlap, 1), step)
+            if tokens[start:start + words]]
+
+
+def read_fingerprint(directory: str):
+    """
+    Get the fingerprint of the documents an index was built from.
+
+    Args:
+        directory (str): The directory of the index.
+
+    Returns:
+        str: The fingerprint given to `build_index`, None if there is no index of the current version.
+    """
+    try:
+        with open(os.path.join(directory, "manifest.json"), "r") as file:
+            manifest = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+    return manifest["fingerprint"] if manifest.get("version") == INDEX_VERSION else None
+
+
+def build_index(directory: str, parts, fingerprint: str):
+    """
+    Build the index of the given text parts, replacing the index in the directory, if any.
+
+    Args:
+        directory (str): The directory of the index.
+        parts (Iterable[tuple]): The parts of the documents as (label, text) pairs, e.g. ("Syllabus, page 2", text).
+            The label is prefixed to the chunks of the part.
+        fingerprint (str): Identifies the indexed documents, to tell whether the index is up to date.
+
+    Returns:
+        int: The number of chunks.
+    """
+    texts, chunk_terms = [], []
+    for label, text in parts:
+        for chunk in chunk_text(text):
+            texts.append(f"[{label}] {chunk}")
+            chunk_terms.append(Counter(tokenize(chunk)))
+
+    # postings (term, chunk, frequency) sorted by term, i.e. a term's postings are a contiguous slice
+    vocabulary = {}
+    posting_terms, posting_chunks, posting_frequencies = [], [], []
+    for chunk_id, counts in enumerate(chunk_terms):
+        for term, frequency in counts.items():
+            posting_terms.append(vocabulary.setdefault(term, len(vocabulary)))
+            posting_chunks.append(chunk_id)
+            posting_frequencies.append(frequency)
+
+    posting_terms = np.asarray(posting_terms, dtype=np.int64)
+    order = np.argsort(posting_terms, kind="stable")
+    document_frequencies = np.bincount(posting_terms, minlength=len(vocabulary))
+    chunk_count = len(texts)
+
+    encoded = [text.encode("utf-8") for text in texts]
+    arrays = {
+        "offsets": np.concatenate([[0], np.cumsum(document_frequencies)]).astype(np.int64),
+        "chunk_ids": np.asarray(posting_chunks, dtype=np.int32)[order],
+        "frequencies": np.asarray(posting_frequencies, dtype=np.float32)[order],
+        "idf": np.log1p((chunk_count - document_frequencies + 0.5) / (document_frequencies + 0.5)).astype(np.float32),
+        "lengths": np.asarray([sum(counts.values()) for counts in chunk_terms], dtype=np.float32),
+        "text_offsets": np.concatenate([[0], np.cumsum([len(text) for text in encoded], dtype=np.int64)]).astype(np.int64),
+    }
+
+    temporary_directory = f"{directory}.{generate_hash('', strategy='uuid')}.tmp"
+    os.makedirs(temporary_directory)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(temporary_directory, f"{name}.npy"), array)
+        with open(os.path.join(temporary_directory, "chunks.bin"), "wb") as file:
+            file.write(b"".join(encoded))
+        with open(os.path.join(temporary_directory, "terms.json"), "w") as file:
+            json.dump(vocabulary, file)
+        with open(os.path.join(temporary_directory, "manifest.json"), "w") as file: # written last, marks a complete index
+            json.dump({"version": INDEX_VERSION, "fingerprint": fingerprint, "chunk_count": chunk_count,
+                       "average_length": float(arrays["lengths"].mean()) if chunk_count else 0.0}, file)
+        _replace_directory(temporary_directory, directory)
+    finally:
+        if os.path.exists(temporary_directory):
+            shutil.rmtree(temporary_directory, ignore_errors=True)
+
+    return chunk_count
+
+
+class RetrievalIndex:
+    """
+    A built index, memory-mapped. Open it with `RetrievalIndex.open`, which reuses the open indexes.
+
+    Attributes:
+        directory (str): The directory of the index.
+        manifest (dict): The version, fingerprint, chunk count and average chunk length of the index.
+    """
+
+    _open_indexes = OrderedDict() # directory -> (manifest modification time, index), least recently used first
+    _lock = threading.Lock()
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json"), "r") as file:
+            self.manifest = json.load(file)
+        with open(os.path.join(directory, "terms.json"), "r") as file:
+            self.terms = json.load(file)
+        if not self.manifest["chunk_count"]: # empty arrays can't be mapped, nothing to search anyway
+            return
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r"))
+        self.texts = np.memmap(os.path.join(directory, "chunks.bin"), dtype=np.uint8, mode="r")
+
+    @classmethod
+    def open(cls, directory: str):
+        """
+        Open the index in a directory, reusing it if it was opened before and not rebuilt since.
+
+        Args:
+            directory (str): The directory of the index.
+
+        Returns:
+            RetrievalIndex: The index, None if there is no index of the current version.
+        """
+        try:
+            modified_at = os.stat(os.path.join(directory, "manifest.json")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        with cls._lock:
+            cached = cls._open_indexes.get(directory)
+            if cached and cached[0] == modified_at:
+                cls._open_indexes.move_to_end(directory)
+                return cached[1]
+
+        try:
+            index = cls(directory)
+        except FileNotFoundError: # replaced in the meantime
+            return None
+        if index.manifest.get("version") != INDEX_VERSION:
+            return None
+
+        with cls._lock:
+            cls._open_indexes[directory] = (modified_at, index)
+            cls._open_indexes.move_to_end(directory)
+            while len(cls._open_indexes) > RETRIEVAL_MAX_OPEN_INDEXES: # unmapped once no search uses them
+                cls._open_indexes.popitem(last=False)
+        return index
+
+    def search(self, query: str, k: int = 5):
+        """
+        Find the chunks most relevant to a query.
+
+        Args:
+            query (str): The query, e.g. a question of a student.
+            k (int, optional): The maximum number of chunks. Defaults to 5.
+
+        Returns:
+            list: The texts of the chunks matching at least one term of the query, best first.
+        """
+        term_ids = {self.terms[term] for term in tokenize(query) if term in self.terms}
+        if not term_ids or not self.manifest["chunk_count"]:
+            return []
+
+        scores = np.zeros(self.manifest["chunk_count"], dtype=np.float32)
+        for term_id in term_ids: # only the postings of the query terms are paged in
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            chunk_ids, frequencies = self.chunk_ids[start:end], self.frequencies[start:end]
+            normalization = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[chunk_ids] / self.manifest["average_length"])
+            scores[chunk_ids] += self.idf[term_id] * frequencies * (BM25_K1 + 1) / (frequencies + normalization)
+
+        matched = np.flatnonzero(scores)
+        best = matched[np.argsort(-scores[matched], kind="stable")[:k]]
+        return [bytes(self.texts[self.text_offsets[i]:self.text_offsets[i + 1]]).decode("utf-8") for i in best]
+
+
+def _replace_directory(source: str, target: str, attempts: int = 5):
+    """
+    Move a directory in place of another one, with as short a gap as the file system allows.
+    Builds of other processes may replace the target concurrently, the last one wins.
+    """
+    for attempt in range(attempts):
+        previous = f"{target}.{generate_hash('', strategy='uuid')}.old"
+        try:
+            os.replace(target, previous) # open memory maps of the previous index stay valid
+        except FileNotFoundError: # no index yet, or moved aside by a concurrent build
+            previous = None
+
+        try:
+            os.replace(source, target)
+            return
+        except OSError: # a concurrent build put its index in place in the meantime, move it aside too
+            if attempt == attempts - 1:
+                raise
+        finally:
+            if previous:
+                shutil.rmtree(previous, ignore_errors=True)
@@ -1,11 +1,7 @@
-import os
-
 from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
 from middleware import authentication as auth
 from middleware.filemanager import FileFactory
 from modules.user.model import User
-from middleware import FILES_DIR
-from tools import generate_hash, splitext
 
 router = APIRouter(prefix="/files", tags=["Files"])
 
@@ -27,18 +23,10 @@ def upload_file(file: UploadFile = File(...), current_user: User = Depends(auth.
     TODO: This endpoint is not likely to be used. To be replaced (e.g. upload syllabus and send API call to LLM).
     """
     filename = file.filename
-    name, extension = splitext(filename) # split name and extension, e.g. myfile.pdf -> (myfile, pdf)
 
     try:
         file = FileFactory()(file=file)
-
-        # Generate a unique filename, while preserving the original filename for retrieval
-        hashed_fname = f"{generate_hash(name, strategy="uuid")}_{name}.{extension}" # e.g. <hashed_name>_<actual_name>.pdf
-
-        os.makedirs(f"{FILES_DIR}/user_{current_user['user_id']}", exist_ok=True) # create a directory for the user's files, e.g. syllabus
-        path = os.path.join(FILES_DIR, f"user_{current_user['user_id']}", hashed_fname) # construct the file path
-
-        file.save(path) # save the file in file system
+        file.store(f"user_{current_user['user_id']}") # save the file in the blob store, shared with identical uploads
 
         return {"status": "File uploaded successfully.", "filename": filename}
     
@@ -0,0 +1,42 @@
+"""
+Alembic environment, migrating the application's database with its own engine and models.
+"""
+
+from logging.config import fileConfig
+from alembic import context
+
+from database import DATABASE_URL
+from database.connection import db_connection
+import database.dbmanager # noqa: F401, registers all models on the metadata
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = db_connection.Base.metadata
+
+
+def run_migrations_offline():
+    """
+    Emit the migrations as SQL script instead of running them, e.g. `alembic upgrade head --sql`.
+    """
+    context.configure(url=DATABASE_URL, target_metadata=target_metadata, literal_binds=True,
+                      dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """
+    Run the migrations against the database.
+    """
+    with db_connection.engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,83 @@
+"""Baseline schema, as created by create_all before migrations were introduced
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 10:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(50), nullable=False),
+        sa.Column("nickname", sa.String(50), nullable=False),
+        sa.Column("email", sa.String(100), nullable=False),
+        sa.Column("hashed_password", sa.String(100), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("user_icon_url", sa.String(100), nullable=True),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    op.create_index("ix_users_user_id", "users", ["user_id"])
+    op.create_index("ix_users_nickname", "users", ["nickname"], unique=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "courses",
+        sa.Column("course_id", sa.Integer(), nullable=False),
+        sa.Column("course_name", sa.String(255), nullable=False),
+        sa.Column("course_code", sa.String(16)),
+        sa.Column("course_description", sa.String(1024), nullable=True),
+        sa.Column("course_syllabus_url", sa.String(255), nullable=True),
+        sa.Column("course_study_plan_url", sa.String(255), nullable=True),
+        sa.Column("course_icon_url", sa.String(255), nullable=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id")),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint("course_id"),
+        sa.UniqueConstraint("user_id", "course_code", name="user_course_unique"),
+    )
+    op.create_index("ix_courses_course_id", "courses", ["course_id"])
+
+    op.create_table(
+        "chats",
+        sa.Column("chat_id", sa.Integer(), nullable=False),
+        sa.Column("chat_title", sa.String(150), nullable=False),
+        sa.Column("course_id", sa.Integer(), sa.ForeignKey("courses.course_id"), nullable=False),
+        sa.Column("history_url", sa.String(255)),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("slides_mode", sa.Boolean()),
+        sa.Column("slides_fname", sa.String(255), nullable=True),
+        sa.Column("slides_furl", sa.String(255), nullable=True),
+        sa.PrimaryKeyConstraint("chat_id"),
+    )
+    op.create_index("ix_chats_chat_id", "chats", ["chat_id"])
+
+    op.create_table(
+        "notifications",
+        sa.Column("notification_id", sa.Integer(), nullable=False),
+        sa.Column("notification_title", sa.String(255)),
+        sa.Column("notification_content", sa.String(255)),
+        sa.Column("notification_date", sa.DateTime()),
+        sa.Column("notification_is_new", sa.Boolean()),
+        sa.Column("notification_sender_id", sa.Integer()),
+        sa.Column("notification_receiver_id", sa.Integer()),
+        sa.PrimaryKeyConstraint("notification_id"),
+    )
+    op.create_index("ix_notifications_notification_id", "notifications", ["notification_id"])
+    op.create_index("ix_notifications_notification_title", "notifications", ["notification_title"])
+
+
+def downgrade():
+    op.drop_table("notifications")
+    op.drop_table("chats")
+    op.drop_table("courses")
+    op.drop_table("users")
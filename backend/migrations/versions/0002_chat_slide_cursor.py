@@ -0,0 +1,30 @@
+"""Slide cursor of chats, replacing the pickled slide generators
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # databases created by create_all after the columns were added already have them
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("chats")}
+
+    if "slide_index" not in columns:
+        op.add_column("chats", sa.Column("slide_index", sa.Integer(), nullable=False, server_default="-1"))
+    if "slide_count" not in columns:
+        op.add_column("chats", sa.Column("slide_count", sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("chats", "slide_count")
+    op.drop_column("chats", "slide_index")
@@ -0,0 +1,49 @@
+"""Content-addressed blob store and its per-owner references
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 10:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # databases created by create_all after the tables were added already have them
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    if "blobs" not in tables:
+        op.create_table(
+            "blobs",
+            sa.Column("blob_hash", sa.String(64), nullable=False),
+            sa.Column("blob_path", sa.String(255), nullable=False),
+            sa.Column("blob_size", sa.BigInteger(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.PrimaryKeyConstraint("blob_hash"),
+        )
+
+    if "blob_references" not in tables:
+        op.create_table(
+            "blob_references",
+            sa.Column("reference_id", sa.Integer(), nullable=False),
+            sa.Column("blob_hash", sa.String(64), sa.ForeignKey("blobs.blob_hash"), nullable=False),
+            sa.Column("owner", sa.String(64), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.PrimaryKeyConstraint("reference_id"),
+            sa.UniqueConstraint("blob_hash", "owner", name="blob_owner_unique"),
+        )
+        op.create_index("ix_blob_references_reference_id", "blob_references", ["reference_id"])
+        op.create_index("ix_blob_references_blob_hash", "blob_references", ["blob_hash"])
+        op.create_index("ix_blob_references_owner", "blob_references", ["owner"])
+
+
+def downgrade():
+    op.drop_table("blob_references")
+    op.drop_table("blobs")
@@ -0,0 +1,25 @@
+"""Indexes for the chats of a course and the notifications of a user
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 10:00:00
+"""
+
+from alembic import op
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_chats_course_id", "chats", ["course_id"])
+    op.create_index("ix_notifications_receiver_is_new_date", "notifications",
+                    ["notification_receiver_id", "notification_is_new", "notification_date"])
+
+
+def downgrade():
+    op.drop_index("ix_notifications_receiver_is_new_date", table_name="notifications")
+    op.drop_index("ix_chats_course_id", table_name="chats")
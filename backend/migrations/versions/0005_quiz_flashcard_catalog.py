@@ -0,0 +1,97 @@
+"""Catalog of the quizzes and flashcard sets, backfilled from the chat folders
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 10:00:00
+"""
+
+import os
+import re
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+from middleware import FILES_DIR
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    quizzes = op.create_table(
+        "quizzes",
+        sa.Column("quiz_id", sa.Integer(), nullable=False),
+        sa.Column("chat_id", sa.Integer(), sa.ForeignKey("chats.chat_id"), nullable=False),
+        sa.Column("course_id", sa.Integer(), sa.ForeignKey("courses.course_id"), nullable=False),
+        sa.Column("quiz_name", sa.String(255), nullable=False),
+        sa.Column("quiz_path", sa.String(255), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint("quiz_id"),
+        sa.UniqueConstraint("course_id", "quiz_name", name="quiz_course_name_unique"),
+    )
+    op.create_index("ix_quizzes_quiz_id", "quizzes", ["quiz_id"])
+    op.create_index("ix_quizzes_chat_id", "quizzes", ["chat_id"])
+    op.create_index("ix_quizzes_course_id", "quizzes", ["course_id"])
+
+    flashcard_sets = op.create_table(
+        "flashcard_sets",
+        sa.Column("flashcard_set_id", sa.Integer(), nullable=False),
+        sa.Column("chat_id", sa.Integer(), sa.ForeignKey("chats.chat_id"), nullable=False),
+        sa.Column("course_id", sa.Integer(), sa.ForeignKey("courses.course_id"), nullable=False),
+        sa.Column("flashcard_set_name", sa.String(255), nullable=False),
+        sa.Column("flashcard_set_path", sa.String(255), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint("flashcard_set_id"),
+        sa.UniqueConstraint("chat_id", "flashcard_set_name", name="flashcard_set_chat_name_unique"),
+    )
+    op.create_index("ix_flashcard_sets_flashcard_set_id", "flashcard_sets", ["flashcard_set_id"])
+    op.create_index("ix_flashcard_sets_chat_id", "flashcard_sets", ["chat_id"])
+    op.create_index("ix_flashcard_sets_course_id", "flashcard_sets", ["course_id"])
+
+    # record the quizzes and flashcards generated so far, stored as <name>.json in the chat folders
+    chat_courses = dict(op.get_bind().execute(sa.text("SELECT chat_id, course_id FROM chats")).fetchall())
+    quiz_rows, flashcard_set_rows = [], []
+    quiz_names = set() # (course_id, name), quiz names used to be unique per course only by convention
+
+    for folder in sorted(os.listdir(FILES_DIR)) if FILES_DIR and os.path.isdir(FILES_DIR) else []:
+        match = re.fullmatch(r"chat_(\d+)", folder)
+        if not match or int(match.group(1)) not in chat_courses:
+            continue # not a chat folder, or the folder of a deleted chat, left to the orphan sweep
+        chat_id = int(match.group(1))
+        course_id = chat_courses[chat_id]
+
+        for path, name in _list_json_files(os.path.join(FILES_DIR, folder, "quiz")):
+            if (course_id, name) in quiz_names:
+                name = f"{name} (chat {chat_id})"
+            quiz_names.add((course_id, name))
+            quiz_rows.append({"chat_id": chat_id, "course_id": course_id, "quiz_name": name, "quiz_path": path,
+                              "created_at": _modified_at(path)})
+
+        for path, name in _list_json_files(os.path.join(FILES_DIR, folder, "flashcards")):
+            flashcard_set_rows.append({"chat_id": chat_id, "course_id": course_id, "flashcard_set_name": name,
+                                       "flashcard_set_path": path, "created_at": _modified_at(path)})
+
+    if quiz_rows:
+        op.bulk_insert(quizzes, quiz_rows)
+    if flashcard_set_rows:
+        op.bulk_insert(flashcard_sets, flashcard_set_rows)
+
+
+def downgrade():
+    op.drop_table("flashcard_sets")
+    op.drop_table("quizzes")
+
+
+def _list_json_files(folder: str):
+    if not os.path.isdir(folder):
+        return []
+    return [(os.path.join(folder, file_name), file_name[:-len(".json")])
+            for file_name in sorted(os.listdir(folder)) if file_name.endswith(".json")]
+
+
+def _modified_at(path: str):
+    return datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc)
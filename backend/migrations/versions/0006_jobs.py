@@ -0,0 +1,40 @@
+"""Jobs table of the background job queue
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 12:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "jobs",
+        sa.Column("job_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id"), nullable=False),
+        sa.Column("job_type", sa.String(32), nullable=False),
+        sa.Column("job_status", sa.String(16), nullable=False),
+        sa.Column("job_payload", sa.Text(), nullable=False),
+        sa.Column("job_result", sa.Text(), nullable=True),
+        sa.Column("job_error", sa.String(255), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("job_id"),
+    )
+    op.create_index("ix_jobs_job_id", "jobs", ["job_id"])
+    op.create_index("ix_jobs_status_created_at", "jobs", ["job_status", "created_at"])
+    op.create_index("ix_jobs_user_id_status", "jobs", ["user_id", "job_status"])
+
+
+def downgrade():
+    op.drop_table("jobs")
@@ -0,0 +1,69 @@
+from sqlalchemy import Column, Integer, BigInteger, ForeignKey, DateTime, String, func, UniqueConstraint
+from sqlalchemy.orm import relationship
+
+from database.connection import db_connection
+
+Base = db_connection.Base
+
+class Blob(Base):
+    """
+    Represents a stored file, identified by the SHA-256 hash of its content.
+    """
+
+    __tablename__ = 'blobs'
+
+    blob_hash = Column(String(64), primary_key=True) # SHA-256 hex digest of the content
+    blob_path = Column(String(255), nullable=False) # e.g. ./files/blobs/ff/<ffb1e29cc1...>.pdf
+    blob_size = Column(BigInteger, nullable=False) # size in bytes
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    references = relationship("BlobReference", back_populates="blob", cascade="all, delete-orphan")
+
+    def to_dict(self):
+        """
+        Converts the Blob object to a dictionary.
+
+        Returns:
+            dict: A dictionary representation of the Blob object.
+        """
+
+        return {
+            "blob_hash": self.blob_hash,
+            "blob_path": self.blob_path,
+            "blob_size": self.blob_size,
+            "created_at": self.created_at
+        }
+
+
+class BlobReference(Base):
+    """
+    Represents the use of a blob by an owner, e.g. the slides of a chat or the syllabus of a course.
+    A blob is deleted once its last reference is released.
+    """
+
+    __tablename__ = 'blob_references'
+
+    reference_id = Column(Integer, primary_key=True, index=True)
+    blob_hash = Column(String(64), ForeignKey('blobs.blob_hash'), nullable=False, index=True)
+    owner = Column(String(64), nullable=False, index=True) # e.g. chat_12, chat_12_slides, course_3, user_5
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    blob = relationship("Blob", back_populates="references") # many-to-one relationship with Blob
+
+    # An owner references a blob at most once
+    __table_args__ = (UniqueConstraint('blob_hash', 'owner', name='blob_owner_unique'),)
+
+    def to_dict(self):
+        """
+        Converts the BlobReference object to a dictionary.
+
+        Returns:
+            dict: A dictionary representation of the BlobReference object.
+        """
+
+        return {
+            "reference_id": self.reference_id,
+            "blob_hash": self.blob_hash,
+            "owner": self.owner,
+            "created_at": self.created_at
+        }
@@ -0,0 +1,204 @@
+"""
+Context of the chat turns sent to the LLM.
+
+The whole history of a chat is kept in its append-only store, but a new turn is
+only generated against a window of it, chosen by CHAT_CONTEXT_POLICY:
+
+- `full`: the whole history, as before.
+- `last_turns`: the last CHAT_CONTEXT_TURNS messages.
+- `token_budget` (default): the newest messages fitting in CHAT_CONTEXT_TOKENS
+  estimated tokens.
+- `summary`: a rolling summary of the older messages followed by the newest
+  ones, within the token budget. After a turn, the messages that fell more
+  than CHAT_CONTEXT_TURNS messages behind are folded into the summary in the
+  background, once at least CHAT_CONTEXT_TURNS of them have accumulated.
+
+Windows always start with a user message, so the roles keep alternating.
+The new turns are appended to the full history, whatever the window.
+
+Usage:
+```
+chat_history = ChatHistory(chat["history_url"])
+context = get_context(chat_history)
+response_text, updated_context = await llm.send_message(context, content)
+chat_history.append(updated_context[len(context):])
+schedule_summary(chat_history)
+```
+"""
+
+import asyncio
+import os
+import google.ai.generativelanguage as glm
+
+from logger import logger
+from middleware import llm
+from modules.chat.history import ChatHistory, ChatSummary
+
+CONTEXT_POLICIES = ["full", "last_turns", "token_budget", "summary"]
+
+CHAT_CONTEXT_POLICY = os.getenv("CHAT_CONTEXT_POLICY", "token_budget")
+CHAT_CONTEXT_TURNS = int(os.getenv("CHAT_CONTEXT_TURNS", "20")) # in messages, a turn is a user and a model message
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "32000")) # estimated, see `estimate_tokens`
+CHAT_SUMMARY_PROMPT = os.getenv("CHAT_SUMMARY_PROMPT", (
+    "You are given the summary of the beginning of a tutoring conversation, possibly empty, and the messages that "
+    "followed it. Write an updated summary of the whole conversation for the tutor to continue it: the topics and "
+    "slides covered, what the student asked, understood or struggled with, and any open questions. Be concise and "
+    "keep the facts, do not address the student."))
+
+if CHAT_CONTEXT_POLICY not in CONTEXT_POLICIES:
+    raise ValueError(f"Invalid CHAT_CONTEXT_POLICY {CHAT_CONTEXT_POLICY}, expected one of {', '.join(CONTEXT_POLICIES)}")
+
+_CHARACTERS_PER_TOKEN = 4 # rough average of English text
+_MEDIA_TOKENS = 258 # an image, e.g. a rendered slide
+_READ_BLOCK_SIZE = 32 # messages read at once from the end of the history
+
+_summarizing = {} # history URL -> task refreshing its summary, referenced until it finishes
+
+
+def estimate_tokens(content: glm.Content):
+    """
+    Estimate the number of prompt tokens of a message, without calling the API.
+
+    Args:
+        content (glm.Content): The message.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return sum(len(part.text) // _CHARACTERS_PER_TOKEN + 1 if part.text else _MEDIA_TOKENS
+               for part in content._pb.parts)
+
+
+def get_context(chat_history: ChatHistory, policy: str = None):
+    """
+    Get the messages to generate the next turn of a chat against.
+
+    Args:
+        chat_history (ChatHistory): The chat history store.
+        policy (str, optional): The context policy, one of CONTEXT_POLICIES. Defaults to CHAT_CONTEXT_POLICY.
+
+    Returns:
+        list: The messages, as `Content` objects.
+    """
+    policy = policy or CHAT_CONTEXT_POLICY
+    if policy == "full":
+        return chat_history.read()
+    if policy == "last_turns":
+        return _from_user_message(chat_history.read(len(chat_history) - CHAT_CONTEXT_TURNS))
+    if policy == "token_budget":
+        return _read_within_budget(chat_history, 0)
+
+    summary = ChatSummary(chat_history.legacy_path).read()
+    messages = _read_within_budget(chat_history, summary["end"])
+    if not summary["text"]:
+        return messages
+
+    return [glm.Content(role="user", parts=[glm.Part(text=f"Summary of our conversation so far:\n{summary['text']}")]),
+            glm.Content(role="model", parts=[glm.Part(text="Understood, I will continue from there.")])] + messages
+
+
+def with_excerpts(context: list, excerpts: list):
+    """
+    Add excerpts of the course materials to the context of a message, as a turn preceding it.
+    The turn is not part of the chat history, so `_save_history` only stores the turns after it.
+
+    Args:
+        context (list): The messages, as returned by `get_context`.
+        excerpts (list): The texts of the excerpts, e.g. found by `search_course_materials`.
+
+    Returns:
+        list: The messages followed by the excerpts, or the messages if there are no excerpts.
+    """
+    if not excerpts:
+        return context
+
+    text = "\n\n".join(excerpts)
+    return context + [glm.Content(role="user", parts=[glm.Part(text=f"Relevant excerpts of the course materials:\n{text}")]),
+                      glm.Content(role="model", parts=[glm.Part(text="Understood, I will use them where relevant.")])]
+
+
+def schedule_summary(chat_history: ChatHistory):
+    """
+    Refresh the summary of a chat in the background if enough messages fell out of the window, with the
+    summary policy. Does nothing with the other policies or if a refresh of the chat is in progress.
+
+    Args:
+        chat_history (ChatHistory): The chat history store.
+    """
+    if CHAT_CONTEXT_POLICY != "summary" or chat_history.legacy_path in _summarizing:
+        return
+
+    task = asyncio.create_task(refresh_summary(chat_history))
+    _summarizing[chat_history.legacy_path] = task
+    task.add_done_callback(lambda task: _finish_summary(chat_history.legacy_path, task))
+
+
+def _finish_summary(legacy_path: str, task: asyncio.Task):
+    _summarizing.pop(legacy_path, None)
+    if not task.cancelled() and task.exception():
+        logger.warning(f"Summarizing chat history {legacy_path} failed: {str(task.exception())}")
+
+
+async def refresh_summary(chat_history: ChatHistory):
+    """
+    Fold the messages more than CHAT_CONTEXT_TURNS messages behind into the summary of the chat,
+    once at least CHAT_CONTEXT_TURNS of them are not summarized yet.
+
+    Args:
+        chat_history (ChatHistory): The chat history store.
+
+    Returns:
+        bool: Whether the summary was refreshed.
+    """
+    summary_store = ChatSummary(chat_history.legacy_path)
+    summary = summary_store.read()
+
+    # summarize up to the user message starting the verbatim tail, so the tail starts with a user message
+    tail_start = len(chat_history) - CHAT_CONTEXT_TURNS
+    tail = chat_history.read(tail_start)
+    end = tail_start + len(tail) - len(_from_user_message(tail))
+    if end - summary["end"] < CHAT_CONTEXT_TURNS:
+        return False
+
+    transcript = "\n\n".join(_to_text(content) for content in chat_history.read(summary["end"], end))
+    try:
+        text = await llm.generate_content([CHAT_SUMMARY_PROMPT, f"Summary:\n{summary['text']}",
+                                           f"Messages:\n{transcript}"], use_cache=False)
+    except Exception as e: # the older messages stay in the window until the next attempt
+        logger.warning(f"Summarizing chat history {chat_history.legacy_path} failed: {str(e)}")
+        return False
+
+    summary_store.write(end, text)
+    return True
+
+
+def _read_within_budget(chat_history: ChatHistory, start: int):
+    """
+    Read the newest messages after `start` whose estimated tokens fit in CHAT_CONTEXT_TOKENS,
+    reading the history backwards in blocks.
+    """
+    messages, tokens = [], 0 # newest first
+    end = len(chat_history)
+    while end > start:
+        block_start = max(end - _READ_BLOCK_SIZE, start)
+        for content in reversed(chat_history.read(block_start, end)):
+            tokens += estimate_tokens(content)
+            if tokens > CHAT_CONTEXT_TOKENS:
+                return _from_user_message(messages[::-1])
+            messages.append(content)
+        end = block_start
+
+    return _from_user_message(messages[::-1])
+
+
+def _from_user_message(messages: list):
+    # drop the leading model messages, a chat history must start with a user message
+    for index, content in enumerate(messages):
+        if content.role == "user":
+            return messages[index:]
+    return []
+
+
+def _to_text(content: glm.Content):
+    parts = [part.text if part.text else "[image]" for part in content._pb.parts]
+    return f"{content.role}: {' '.join(parts)}"
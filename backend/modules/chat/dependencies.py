@@ -0,0 +1,56 @@
+from fastapi import Depends, HTTPException
+
+from middleware import authentication as auth
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.connection import get_db
+from database.dbmanager import ChatDB
+
+
+async def get_owned_chat(chat_id: int, current_user: dict = Depends(auth.get_current_user),
+                         db: AsyncSession = Depends(get_db)):
+    """
+    Fetch the chat of the request path and check that the current user owns its course.
+
+    Usage:
+    ```
+    @router.get("/{chat_id}")
+    async def get_chat(chat: dict = Depends(get_owned_chat)):
+        ...
+    ```
+
+    Args:
+        chat_id (int): The ID of the chat, taken from the path.
+        current_user (dict, optional): The current user's information. Defaults to Depends(auth.get_current_user).
+
+    Returns:
+        dict: The chat, including the name of its course.
+
+    Raises:
+        HTTPException: If the chat is not found or the user is not authorized to access it.
+    """
+    try:
+        chat = await ChatDB.fetch_owned_async(chat_id=chat_id, user_id=current_user["user_id"], db=db)
+    except PermissionError:
+        raise HTTPException(status_code=403, detail="Forbidden.")
+
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found.")
+    return chat
+
+
+def get_slides_chat(chat: dict = Depends(get_owned_chat)):
+    """
+    Fetch the chat of the request path like `get_owned_chat` and check that it has slides.
+
+    Args:
+        chat (dict, optional): The chat. Defaults to Depends(get_owned_chat).
+
+    Returns:
+        dict: The chat.
+
+    Raises:
+        HTTPException: If the chat is not found, the user is not authorized or the chat has no slides uploaded.
+    """
+    if not chat["slides_furl"]:
+        raise HTTPException(status_code=404, detail="This chat has no slides uploaded.")
+    return chat
@@ -0,0 +1,385 @@
+"""
+Append-only chat history store.
+
+Each chat turn is stored as a length-prefixed record holding the serialized
+protobuf `Content` message in a `.log` file next to the chat's history URL.
+A fixed-width `.idx` file keeps the byte offset of every record, so any range
+of messages (e.g. the tail) can be read without decoding the whole history
+and a new turn costs a single append instead of rewriting the file.
+
+Per-message metadata (skipped prompts, attached media) is kept in an
+append-only JSON-lines file, read backwards so the latest page of a chat only
+touches the tail of the file. The rolling summary of the older messages, used
+by the summary context policy (see context.py), is a small JSON file rewritten
+as a whole.
+
+Legacy histories, written as a single jsonpickle document at the history URL,
+and legacy metadata JSON arrays are migrated on first access or in bulk with
+`migrate_legacy_histories`.
+"""
+
+import json
+import os
+import struct
+import threading
+import jsonpickle
+import google.ai.generativelanguage as glm
+
+from logger import logger
+from tools import splitext
+
+_LENGTH = struct.Struct(">I") # record length prefix
+_OFFSET = struct.Struct(">Q") # record offset in the index file
+
+# files of a history next to its URL (the legacy jsonpickle file), from the longest suffix
+HISTORY_SUFFIXES = ["_metadata.jsonl", "_metadata.json", "_summary.json", ".log", ".idx"]
+
+_locks = {} # per-history append locks
+_locks_guard = threading.Lock()
+
+
+def _get_lock(path: str):
+    with _locks_guard:
+        return _locks.setdefault(path, threading.RLock())
+
+
+def get_history_paths(history_url: str):
+    """
+    Get the paths of all files of a chat history: the records, the index, the metadata and their legacy formats.
+
+    Args:
+        history_url (str): The history URL of the chat.
+
+    Returns:
+        list: The file paths, which may not exist.
+    """
+    base_name = splitext(history_url)[0]
+    return [history_url] + [f"{base_name}{suffix}" for suffix in HISTORY_SUFFIXES]
+
+
+def get_history_name(path: str):
+    """
+    Get the name of the chat history a file in the chats directory belongs to, i.e. its history URL's
+    file name without extension.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        str: The history name, None if the file is not part of a history.
+    """
+    file_name = os.path.basename(path)
+    for suffix in HISTORY_SUFFIXES + [".txt"]:
+        if file_name.endswith(suffix):
+            return file_name[:-len(suffix)]
+    return None
+
+
+class ChatHistory:
+    """
+    Append-only history of a single chat.
+
+    Usage:
+    ```
+    history = ChatHistory(chat["history_url"])
+    contents = history.read()            # whole history
+    contents = history.read(len(history) - 10) # last 10 messages
+    history.append(new_contents)
+    ```
+
+    Attributes:
+        legacy_path (str): The path of the legacy jsonpickle history file.
+        log_path (str): The path of the records file.
+        index_path (str): The path of the offsets index file.
+    """
+
+    def __init__(self, history_url: str):
+        base_name = splitext(history_url)[0]
+        self.legacy_path = history_url
+        self.log_path = f"{base_name}.log"
+        self.index_path = f"{base_name}.idx"
+
+        if os.path.exists(self.legacy_path):
+            self._migrate()
+
+    def __len__(self):
+        """
+        Returns the number of messages in the history.
+        """
+        if not os.path.exists(self.index_path):
+            return 0
+        return os.path.getsize(self.index_path) // _OFFSET.size
+
+    def read(self, start: int = 0, end: int = None):
+        """
+        Read the messages in the range [start, end).
+
+        Args:
+            start (int, optional): The index of the first message. Defaults to 0.
+            end (int, optional): The index after the last message. Defaults to the history length.
+
+        Returns:
+            list: The messages as `Content` objects.
+        """
+        length = len(self)
+        end = length if end is None else min(end, length)
+        start = max(start, 0)
+        if start >= end:
+            return []
+
+        with open(self.index_path, "rb") as index:
+            index.seek(start * _OFFSET.size)
+            offsets = [_OFFSET.unpack(index.read(_OFFSET.size))[0] for _ in range(end - start)]
+
+        contents = []
+        with open(self.log_path, "rb") as log:
+            for offset in offsets:
+                log.seek(offset) # records of an interrupted append may sit between two offsets
+                size = _LENGTH.unpack(log.read(_LENGTH.size))[0]
+                contents.append(glm.Content.deserialize(log.read(size)))
+
+        return contents
+
+    def append(self, contents: list):
+        """
+        Append messages to the history.
+
+        The records are written before their offsets, so an interrupted append never
+        leaves the index pointing at a partial record.
+
+        Args:
+            contents (list): The messages to append, as `Content` objects or dictionaries.
+        """
+        if not contents:
+            return
+
+        with _get_lock(self.log_path):
+            with open(self.log_path, "ab") as log:
+                offset = log.seek(0, os.SEEK_END)
+                records, offsets = [], []
+                for content in contents:
+                    data = glm.Content.serialize(content if isinstance(content, glm.Content) else glm.Content(content))
+                    records.append(_LENGTH.pack(len(data)) + data)
+                    offsets.append(_OFFSET.pack(offset))
+                    offset += _LENGTH.size + len(data)
+
+                log.write(b"".join(records))
+                log.flush()
+                os.fsync(log.fileno())
+
+            with open(self.index_path, "ab") as index:
+                index.write(b"".join(offsets))
+
+    def delete(self):
+        """
+        Delete the history files, including a not yet migrated legacy file.
+        """
+        for path in [self.log_path, self.index_path, self.legacy_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _migrate(self):
+        """
+        Convert the legacy jsonpickle history file into the append-only format.
+        """
+        with _get_lock(self.log_path):
+            if not os.path.exists(self.legacy_path): # migrated by a concurrent request
+                return
+
+            with open(self.legacy_path, "r") as file:
+                chat_content = file.read()
+            contents = jsonpickle.decode(chat_content) if chat_content else []
+
+            for path in [self.log_path, self.index_path]: # leftovers of an interrupted migration
+                if os.path.exists(path):
+                    os.remove(path)
+
+            self.append(contents)
+            os.remove(self.legacy_path)
+
+        logger.info(f"Migrated chat history {self.legacy_path} ({len(contents)} messages)")
+
+
+class ChatMetadata:
+    """
+    Append-only metadata of the messages of a single chat.
+
+    Each line of the metadata file is a JSON object with a `message_id` key and
+    additional keys such as `skip` or `media_url`. Entries are appended in
+    increasing `message_id` order; for duplicate IDs the latest entry wins.
+
+    Attributes:
+        legacy_path (str): The path of the legacy JSON array metadata file.
+        path (str): The path of the JSON-lines metadata file.
+    """
+
+    _BLOCK_SIZE = 64 * 1024
+
+    def __init__(self, history_url: str):
+        base_name = splitext(history_url)[0]
+        self.legacy_path = f"{base_name}_metadata.json"
+        self.path = f"{base_name}_metadata.jsonl"
+
+        if os.path.exists(self.legacy_path):
+            self._migrate()
+
+    def read(self, start: int = 0, end: int = None):
+        """
+        Read the metadata of the messages in the range [start, end).
+
+        The file is read backwards and reading stops at the first entry before `start`,
+        so fetching the latest messages does not scan the whole file.
+
+        Args:
+            start (int, optional): The ID of the first message. Defaults to 0.
+            end (int, optional): The ID after the last message. Defaults to no upper bound.
+
+        Returns:
+            dict: The metadata entries keyed by message ID.
+        """
+        metadata = {}
+        for item in self._reversed_entries():
+            message_id = item["message_id"]
+            if message_id < start:
+                break
+            if (end is None or message_id < end) and message_id not in metadata:
+                metadata[message_id] = item
+        return metadata
+
+    def append(self, entries: list):
+        """
+        Append metadata entries.
+
+        Args:
+            entries (list): The entries to append, each a dictionary with a `message_id` key.
+        """
+        if not entries:
+            return
+
+        with _get_lock(self.path):
+            with open(self.path, "a") as file:
+                file.write("".join(json.dumps(entry) + "\n" for entry in entries))
+
+    def delete(self):
+        """
+        Delete the metadata files, including a not yet migrated legacy file.
+        """
+        for path in [self.path, self.legacy_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _reversed_entries(self):
+        """
+        Yield the metadata entries from the last one to the first one.
+        """
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "rb") as file:
+            position = file.seek(0, os.SEEK_END)
+            remainder = b""
+            while position > 0:
+                size = min(self._BLOCK_SIZE, position)
+                position -= size
+                file.seek(position)
+                lines = (file.read(size) + remainder).split(b"\n")
+                remainder = lines.pop(0) # may be the tail of a line in the previous block
+                for line in reversed(lines):
+                    if line.strip():
+                        yield json.loads(line)
+            if remainder.strip():
+                yield json.loads(remainder)
+
+    def _migrate(self):
+        """
+        Convert the legacy JSON array metadata file into the JSON-lines format.
+        """
+        with _get_lock(self.path):
+            if not os.path.exists(self.legacy_path): # migrated by a concurrent request
+                return
+
+            with open(self.legacy_path, "r") as file:
+                entries = json.load(file)
+
+            if os.path.exists(self.path): # leftover of an interrupted migration
+                os.remove(self.path)
+
+            self.append(sorted(entries, key=lambda entry: entry["message_id"]))
+            os.remove(self.legacy_path)
+
+
+class ChatSummary:
+    """
+    Summary of the first messages of a single chat, refreshed as the chat grows.
+
+    Attributes:
+        path (str): The path of the summary file.
+    """
+
+    def __init__(self, history_url: str):
+        self.path = f"{splitext(history_url)[0]}_summary.json"
+
+    def read(self):
+        """
+        Read the summary.
+
+        Returns:
+            dict: {"end": int, "text": str}, the summary of the messages before `end`. {"end": 0, "text": ""} if
+                  nothing was summarized yet.
+        """
+        if not os.path.exists(self.path):
+            return {"end": 0, "text": ""}
+        with open(self.path, "r") as file:
+            return json.load(file)
+
+    def write(self, end: int, text: str):
+        """
+        Replace the summary.
+
+        Args:
+            end (int): The index after the last summarized message.
+            text (str): The summary of the messages before `end`.
+        """
+        temporary_path = f"{self.path}.tmp"
+        with _get_lock(self.path):
+            with open(temporary_path, "w") as file:
+                json.dump({"end": end, "text": text}, file)
+            os.replace(temporary_path, self.path) # readers never see a partial summary
+
+
+def migrate_legacy_histories(chats_dir: str):
+    """
+    Migrate all legacy jsonpickle chat histories and their metadata in the given directory.
+
+    Args:
+        chats_dir (str): The directory where the chat history files are stored.
+
+    Returns:
+        int: The number of migrated history and metadata files.
+    """
+    if not os.path.exists(chats_dir):
+        return 0
+
+    migrated = 0
+    for filename in os.listdir(chats_dir):
+        if filename.endswith("_metadata.json"): # metadata of a chat whose history may be migrated already
+            history_url = os.path.join(chats_dir, filename[:-len("_metadata.json")] + ".txt")
+        elif splitext(filename)[1] == "txt":
+            history_url = os.path.join(chats_dir, filename)
+        else:
+            continue
+
+        try:
+            ChatHistory(history_url)
+            ChatMetadata(history_url)
+            migrated += 1
+        except Exception as e:
+            logger.error(f"Failed to migrate chat history {filename}: {str(e)}")
+
+    return migrated
+
+
+if __name__ == "__main__":
+    from modules.chat import CHATS_DIR
+
+    print(f"Migrated {migrate_legacy_histories(CHATS_DIR)} chat histories.")
@@ -0,0 +1,149 @@
+"""
+Job handlers generating the quizzes and flashcard sets of a chat, see middleware/jobs.py.
+"""
+
+import json
+import os
+
+from middleware import llm, jobs
+from middleware.jobs import JobError
+from database.dbmanager import ChatDB, QuizDB, FlashcardSetDB
+from tools import generate_hash
+from modules.chat.util import get_quizzes_folder_path, get_flashcards_folder_path, validate_llm_quiz_response
+from modules.chat.history import ChatHistory
+from . import FLASHCARD_PROMPT, QUIZZES_PROMPT
+
+
+@jobs.handler("quiz")
+async def generate_quiz(job: dict):
+    """
+    Generate a quiz from the history of a chat.
+
+    Args:
+        job (dict): The job, with the payload {"chat_id": int}.
+
+    Returns:
+        dict: The name of the quiz and its questions.
+
+    Raises:
+        JobError: If the chat has no messages or the LLM refuses to generate the quiz.
+        ValueError: If the generated quiz is invalid, so it is generated again.
+    """
+    chat = await _fetch_chat(job["job_payload"]["chat_id"])
+    history = ChatHistory(chat["history_url"]).read() # Read the chat history from the append-only store
+    if not history:
+        raise JobError("No messages found in the chat history to generate quiz.")
+
+    response_text, _ = await llm.send_message(history, QUIZZES_PROMPT, json_response=True)
+    response_dict = json.loads(response_text)
+    if not response_dict.get("success"):
+        raise JobError("Failed to generate quiz.")
+
+    data = response_dict.get("data")
+    if not validate_llm_quiz_response(data):
+        raise ValueError("The generated quiz is invalid.")
+
+    quiz_file_path = _write_generated_file(get_quizzes_folder_path(chat["chat_id"]), data)
+    quiz_name = await _create_named(lambda name: QuizDB.create_async(chat_id=chat["chat_id"], course_id=chat["course_id"],
+                                                                     quiz_name=name, quiz_path=quiz_file_path),
+                                    quiz_file_path)
+    return {"filename": quiz_name, "quiz": data}
+
+
+@jobs.handler("flashcards")
+async def generate_flashcards(job: dict):
+    """
+    Generate a flashcard set from the history of a chat.
+
+    Args:
+        job (dict): The job, with the payload {"chat_id": int}.
+
+    Returns:
+        dict: The topics of the flashcards and their explanations.
+
+    Raises:
+        JobError: If the chat has no messages or the LLM refuses to generate the flashcards.
+        ValueError: If the generated flashcards are invalid, so they are generated again.
+    """
+    chat = await _fetch_chat(job["job_payload"]["chat_id"])
+    history = ChatHistory(chat["history_url"]).read() # Read the chat history from the append-only store
+    if not history:
+        raise JobError("No messages found in the chat history to generate any flashcard.")
+
+    response_text, _ = await llm.send_message(history, FLASHCARD_PROMPT, json_response=True)
+    response_dict = json.loads(response_text)
+    if not response_dict.get("success"):
+        raise JobError("Failed to generate flashcards.")
+
+    try:
+        data = response_dict["data"]
+        flashcards = [item["topic"] for item in data]
+        explanations = [item["explanation"] for item in data]
+    except (KeyError, TypeError):
+        raise ValueError("The generated flashcards are invalid.")
+
+    combined_data = {
+        "flashcards": flashcards,
+        "explanations": explanations
+    }
+
+    flashcards_file_path = _write_generated_file(get_flashcards_folder_path(chat["chat_id"]), combined_data)
+    await _create_named(lambda name: FlashcardSetDB.create_async(chat_id=chat["chat_id"], course_id=chat["course_id"],
+                                                                 flashcard_set_name=name,
+                                                                 flashcard_set_path=flashcards_file_path),
+                        flashcards_file_path)
+
+    return {"combined_data": combined_data}
+
+
+async def _fetch_chat(chat_id: int):
+    chat = await ChatDB.fetch_async(chat_id=chat_id)
+    if not chat:
+        raise JobError("Chat not found.") # deleted since the job was submitted
+    return chat
+
+
+def _write_generated_file(folder: str, data):
+    """
+    Write a generated quiz or flashcard set to a new JSON file. The file has a unique name, so renaming
+    the quiz or flashcard set only changes its catalog entry.
+
+    Args:
+        folder (str): The folder of the file, e.g. the quiz folder of the chat.
+        data: The JSON serializable content.
+
+    Returns:
+        str: The path of the file.
+    """
+    os.makedirs(folder, exist_ok=True)
+    file_path = os.path.join(folder, f"{generate_hash('', strategy='uuid')}.json")
+    with open(file_path, "w") as file:
+        json.dump(data, file, indent=4)
+    return file_path
+
+
+async def _create_named(create, file_path: str):
+    """
+    Record a generated quiz or flashcard set, named after its creation time. If another one was
+    generated within the same second, a counter is appended to the name.
+
+    Args:
+        create (callable): Creates the catalog entry with the given name, raising ValueError if the name is taken.
+        file_path (str): The path of the generated file, removed if it can't be recorded.
+
+    Returns:
+        str: The name of the entry.
+    """
+    name = generate_hash("", strategy="timestamp", human_readable=True)
+    try:
+        for attempt in range(1, 10):
+            candidate = name if attempt == 1 else f"{name} ({attempt})"
+            try:
+                await create(candidate)
+                return candidate
+            except ValueError: # the name is taken
+                continue
+        raise JobError("Too many items generated at the same time, please try again.")
+    except BaseException:
+        os.remove(file_path) # not recorded, nothing refers to it
+        raise
@@ -13,14 +13,14 @@ class Chat(Base):
     __tablename__ = 'chats'
     chat_id = Column(Integer, primary_key=True, index=True)
     chat_title = Column(String(150), nullable=False)
-    course_id = Column(Integer, ForeignKey('courses.course_id'), nullable=False)
+    course_id = Column(Integer, ForeignKey('courses.course_id'), nullable=False, index=True) # chats of a course are listed on every course page
     history_url = Column(String(255))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     slides_mode = Column(Boolean, default=False)
     slides_fname = Column(String(255), nullable=True) # slides' original file name, e.g. Lecture_1.pptx
     slides_furl = Column(String(255), nullable=True) # slides file URL, e.g. ./.../<ffb1e29cc1...>.pptx
-
-    # quiz relationships, quiz URLs, might be added here
+    slide_index = Column(Integer, default=-1, nullable=False) # slide cursor, index of the last presented slide (-1: none yet)
+    slide_count = Column(Integer, nullable=True) # number of slides in the deck, counted on first access
 
     course = relationship("Course", back_populates="chats") # many-to-one relationship with Course
 
@@ -40,5 +40,7 @@ class Chat(Base):
             "slides_mode": self.slides_mode,
             "slides_fname": self.slides_fname,
             "slides_furl": self.slides_furl,
+            "slide_index": self.slide_index,
+            "slide_count": self.slide_count,
             "created_at": self.created_at
         }
\ No newline at end of file
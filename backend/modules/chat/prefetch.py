@@ -0,0 +1,113 @@
+"""
+Speculative slide explanations.
+
+When a student walks through a deck with prefetching enabled, the explanation
+of the next slide is requested in the background right after the current one
+is returned, against the history the student will have when clicking "next".
+The pending result is kept per chat and only used if the slide and the
+history length still match, so a free-form message sent in between (which
+discards the prefetch) never gets answered with a stale explanation.
+
+Prefetches live in the memory of the serving process; with several worker
+processes a request served by another worker simply explains the slide itself.
+"""
+
+import asyncio
+import os
+from collections import OrderedDict
+from PIL import Image
+
+from logger import logger
+from middleware import llm
+from modules.chat.slides import get_slide
+from . import EXPLAIN_SLIDE_PROMPT
+
+SLIDES_PREFETCH_MAX_ENTRIES = int(os.getenv("SLIDES_PREFETCH_MAX_ENTRIES", "256"))
+
+_prefetches = OrderedDict() # chat ID -> (slide index, history length, task), oldest first
+
+
+async def explain_slide(slides_furl: str, slide_index: int, history: list):
+    """
+    Render a slide and generate its explanation in a chat session initialized with the given history.
+
+    Args:
+        slides_furl (str): The path to the slides file.
+        slide_index (int): The zero-based index of the slide.
+        history (list): The chat history before the slide is presented.
+
+    Returns:
+        tuple: The slide image URL, the explanation text and the new chat turns.
+    """
+    content_url = await asyncio.to_thread(get_slide, slides_furl, slide_index) # rendered slide, O(1) manifest lookup
+
+    with Image.open(content_url) as content:
+        response_text, updated_history = await llm.send_message(history, [EXPLAIN_SLIDE_PROMPT, content])
+
+    return content_url, response_text, updated_history[len(history):]
+
+
+def _log_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        logger.warning(f"Prefetching a slide explanation failed: {str(task.exception())}")
+
+
+def schedule_prefetch(chat_id: int, slides_furl: str, slide_index: int, history: list, history_length: int = None):
+    """
+    Start generating the explanation of a slide in the background, replacing any pending prefetch of the chat.
+
+    Args:
+        chat_id (int): The ID of the chat.
+        slides_furl (str): The path to the slides file.
+        slide_index (int): The zero-based index of the slide to prefetch.
+        history (list): The chat history the slide will be presented after, or its context window (see context.py).
+        history_length (int, optional): The length of the whole chat history at that point. Defaults to the length of `history`.
+    """
+    discard_prefetch(chat_id)
+
+    task = asyncio.create_task(explain_slide(slides_furl, slide_index, history))
+    task.add_done_callback(_log_failure)
+    _prefetches[chat_id] = (slide_index, len(history) if history_length is None else history_length, task)
+
+    while len(_prefetches) > SLIDES_PREFETCH_MAX_ENTRIES: # drop the prefetches of idle chats
+        _, (_, _, stale_task) = _prefetches.popitem(last=False)
+        stale_task.cancel()
+
+
+async def take_prefetch(chat_id: int, slide_index: int, history_length: int):
+    """
+    Take the prefetched explanation of a slide, waiting for it if it is still being generated.
+
+    Args:
+        chat_id (int): The ID of the chat.
+        slide_index (int): The zero-based index of the slide to present.
+        history_length (int): The current length of the chat history.
+
+    Returns:
+        tuple: The result of `explain_slide`, or None if there is no usable prefetch.
+    """
+    entry = _prefetches.pop(chat_id, None)
+    if entry is None:
+        return None
+
+    prefetched_index, prefetched_length, task = entry
+    if prefetched_index != slide_index or prefetched_length != history_length: # another slide, or the chat moved on
+        task.cancel()
+        return None
+
+    try:
+        return await task
+    except Exception: # already logged, the caller explains the slide itself
+        return None
+
+
+def discard_prefetch(chat_id: int):
+    """
+    Cancel and drop the pending prefetch of a chat, if any.
+
+    Args:
+        chat_id (int): The ID of the chat.
+    """
+    entry = _prefetches.pop(chat_id, None)
+    if entry is not None:
+        entry[2].cancel()
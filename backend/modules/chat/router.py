@@ -1,30 +1,40 @@
-from fastapi import APIRouter, Depends, Form, HTTPException, UploadFile, File
-import google.generativeai as genai
-import shutil, os
-import json, jsonpickle
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, Form, HTTPException, Query, Response, UploadFile, File
+from fastapi.responses import StreamingResponse
+import asyncio
+import os
+import json
 from logger import logger
 from middleware.filemanager import FileFactory
 from middleware import authentication as auth
-from modules.user.model import User
-from database.dbmanager import ChatDB, CourseDB
-from tools import generate_hash, splitext
+from middleware import llm, garbage, jobs
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.connection import get_db
+from database.dbmanager import ChatDB, CourseDB, FlashcardSetDB
+from tools import splitext
 from modules.chat.util import *
+from modules.chat.history import ChatHistory, ChatMetadata
+from modules.chat.slides import render_slides, read_manifest, get_page_count
+from modules.chat.prefetch import explain_slide, schedule_prefetch, take_prefetch, discard_prefetch
+from modules.chat.context import get_context, with_excerpts, schedule_summary
+from modules.course.materials import search_course_materials, schedule_course_index
+from modules.chat.dependencies import get_owned_chat, get_slides_chat
 from modules.chat import CHATS_DIR
-from middleware import FILES_DIR
 from pydantic import BaseModel
-from . import SYSTEM_PROMPT, MODEL_VERSION, EXPLAIN_SLIDE_PROMPT, FLASHCARD_PROMPT, QUIZZES_PROMPT
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
 @router.post("/create")
-async def create_chat(course_id: int, chat_title: str, slides: UploadFile = File(None),
-                      current_user: dict = Depends(auth.get_current_user)):
+async def create_chat(course_id: int, chat_title: str, background_tasks: BackgroundTasks,
+                      slides: UploadFile = File(None), current_user: dict = Depends(auth.get_current_user),
+                      db: AsyncSession = Depends(get_db)):
     """
-    Create a new chat for a course.
+    Create a new chat for a course. Uploaded slides are rendered in the background.
 
     Args:
         course_id (int): The ID of the course.
         chat_title (str): The title of the chat.
+        background_tasks (BackgroundTasks): The background tasks to schedule the slides rendering on.
         slides (UploadFile, optional): The slides file for the chat. Defaults to None.
         current_user (dict, optional): The current user. Defaults to Depends(auth.get_current_user).
 
@@ -37,13 +47,13 @@ async def create_chat(course_id: int, chat_title: str, slides: UploadFile = File
 
     """
     
-    course = CourseDB.fetch(course_id=course_id)
+    course = await CourseDB.fetch_async(course_id=course_id, db=db)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found.")
     if course["user_id"] != current_user["user_id"]:
         raise HTTPException(status_code=403, detail="Forbidden.")
     
-    chat = ChatDB.create(course_id=course_id, chat_title=chat_title, slides_mode=bool(slides))
+    chat = await ChatDB.create_async(course_id=course_id, chat_title=chat_title, slides_mode=bool(slides), db=db)
     history_fname, _ = prepare_chat_file_names(current_user["user_id"], course_id, chat["chat_id"])
     history_url = os.path.join(CHATS_DIR, history_fname) # chat history file path
 
@@ -51,52 +61,54 @@ async def create_chat(course_id: int, chat_title: str, slides: UploadFile = File
     if slides: # then it means we're creating a chat in slides mode
         slides_fname = slides.filename
         name, extension = splitext(slides_fname) # split name and extension, e.g. myfile.pdf -> (myfile, pdf)
-        if extension not in ["pptx", "pdf"]:
-            ChatDB.delete(chat["chat_id"])
+        if extension not in ["pptx", "pdf"]: # the chat is rolled back with the request
             raise HTTPException(status_code=400, detail=f"Invalid file extension: {extension}")
         
-        storage_dir = get_chat_folder_path(chat["chat_id"]) # construct the storage directory
-        os.makedirs(storage_dir, exist_ok=True) # create a directory to store the chat's files
-        slides_furl = os.path.join(storage_dir, f"{generate_hash(name, strategy="uuid")}.{extension}") # construct the file path
-        
         try:
             file = FileFactory()(file=slides)
-            file.save(slides_furl) # save the file in file system
-            generator = slide_generator(slides_furl) # create a generator object to yield slides one by one
-            dumped_generator = jsonpickle.encode(generator) # dump the generator object into a string
-
-            dumped_generator_path = get_generator_path(slides_furl) # path of the jsonpickle dumped generator object
-            with open(dumped_generator_path, "w") as file:
-                file.write(dumped_generator)
+            await file.store_async(get_slides_owner(chat["chat_id"])) # save the file in the blob store, shared with identical decks
+            slides_furl = file.path
+            background_tasks.add_task(render_slides, slides_furl) # rasterize all pages after the response is sent
 
-        # Rollback changes
+        # Rollback changes, the chat is rolled back with the request
         except ValueError as e: # If the file extension is invalid (file manager can't handle it)
-            ChatDB.delete(chat_id=chat["chat_id"])
             raise HTTPException(status_code=400, detail=str(e))
-        except Exception as e: # Unsupported platform in slide_generator call
-            ChatDB.delete(chat_id=chat["chat_id"])
-            shutil.rmtree(storage_dir) # "rm -rf chat_<chat_id>", remove the directory and its contents
+        except Exception as e: # Failed to save the slides
+            await garbage.collect(owners=[get_slides_owner(chat["chat_id"])])
             raise HTTPException(status_code=500, detail=str(e))
 
-    ChatDB.update(chat["chat_id"], history_url=history_url, slides_fname=slides_fname,
-                  slides_furl=slides_furl) # Update the chat in the database
+    await ChatDB.update_async(chat["chat_id"], history_url=history_url, slides_fname=slides_fname,
+                  slides_furl=slides_furl, db=db) # Update the chat in the database
     
+    if slides_furl:
+        await schedule_course_index(course_id, current_user["user_id"], db=db) # the slides are part of the course's index
+
     chat["slides_furl"] = slides_furl
     chat["slides_fname"] = slides_fname
     return {"chat": chat, "message": "Chat created successfully."}
 
 
 @router.get("/{chat_id}")
-async def get_chat(chat_id: int, current_user: dict = Depends(auth.get_current_user)):
+async def get_chat(chat_id: int, before_message_id: Optional[int] = Query(None, ge=0),
+                   limit: Optional[int] = Query(None, ge=1),
+                   chat: dict = Depends(get_owned_chat),
+                   current_user: dict = Depends(auth.get_current_user)):
     """
     Retrieve a chat by its ID and return the chat details along with its history.
 
+    The history can be paginated from the newest message backwards: `limit` caps the number of
+    history entries read, and `before_message_id` (the `next_before_message_id` of the previous
+    page) continues with older messages. Without `limit`, the whole history is returned.
+
     Args:
         chat_id (int): The ID of the chat to retrieve.
+        before_message_id (int, optional): Only return messages with a smaller ID. Defaults to None.
+        limit (int, optional): The maximum number of history entries to read. Defaults to None.
+        chat (dict, optional): The chat, owned by the current user. Defaults to Depends(get_owned_chat).
         current_user (dict, optional): The current user's information. Defaults to Depends(auth.get_current_user).
 
     Returns:
-        dict: A dictionary containing the chat details and its history.
+        dict: A dictionary containing the chat details, its history and the pagination cursor.
 
     Raises:
         HTTPException: If the chat is not found or the user is not authorized to access the chat.
@@ -104,48 +116,21 @@ async def get_chat(chat_id: int, current_user: dict = Depends(auth.get_current_u
     
     logger.info(f"Fetching chat with ID: {chat_id}")
     
-    # Fetch the chat by its ID
-    chat = ChatDB.fetch(chat_id=chat_id)
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found.")
-    
-    logger.info(f"Chat found: {chat}")
-    
-    # Fetch the course associated with the chat and check if the user is authorized to access it
-    course = CourseDB.fetch(course_id=chat["course_id"])
-    if course["user_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Forbidden.")
-    
-    logger.info(f"Course found: {course}")
-    
-    # Get the chat history file name and metadata file name for the current user, course, and chat
-    hist_file_name, metadata_file_name = prepare_chat_file_names(current_user["user_id"], 
-                                                  course["course_id"], chat["chat_id"])
-
-    # Construct the chat history file path and metadata file path
-    # chat history file path
-    chat_history_path = os.path.join(CHATS_DIR, hist_file_name) 
-    # chat metadata file path
-    metadata_path = os.path.join(CHATS_DIR, metadata_file_name)
-    
-    logger.info(f"Chat history file path: {chat_history_path}")
-    logger.info(f"Chat metadata file path: {metadata_path}")
-
-    metadata = {} # initialize metadata to an empty dictionary
-    if os.path.exists(metadata_path):
-        with open(metadata_path, "r") as file:
-            metadata = {item['message_id']: item for item in json.load(file)}
-
-    chat_content = None # set chat_content to None if no chat history yet
-    if os.path.exists(chat_history_path):
-        with open(chat_history_path, "r") as file:
-            chat_content = file.read() # Read the chat history from the file
-    
-    history = jsonpickle.decode(chat_content) if chat_content else [] # Decode the chat content from JSON
+    # Get the chat history file name for the current user, course, and chat
+    hist_file_name, _ = prepare_chat_file_names(current_user["user_id"], chat["course_id"], chat["chat_id"])
+    chat_history_path = os.path.join(CHATS_DIR, hist_file_name) # chat history file path
+    chat_history = ChatHistory(chat_history_path)
+
+    # Compute the range of history entries to read, [start, end)
+    end = len(chat_history) if before_message_id is None else min(before_message_id, len(chat_history))
+    start = max(end - limit, 0) if limit else 0
+
+    metadata = ChatMetadata(chat_history_path).read(start, end) # metadata of the messages in the range
+    history = chat_history.read(start, end) # Read only the requested range from the append-only store
 
     # parse the chat history and create a new dictionary with 'message' and 'role' keys
     messages = []
-    for idx, content in enumerate(history):
+    for idx, content in enumerate(history, start=start):
         if idx in metadata and metadata[idx].get('skip', False): # metadata says skip this message
             continue
 
@@ -159,20 +144,23 @@ async def get_chat(chat_id: int, current_user: dict = Depends(auth.get_current_u
             if not messages or chat_dict["message_id"] != messages[-1]["message_id"]: # to remove duplicates, if any
                 messages.append(chat_dict)
 
-    logger.info(f"Chat history: {messages}")
+    logger.info(f"Returning {len(messages)} messages of chat {chat_id} in range [{start}, {end})")
 
-    chat["course_name"] = course["course_name"] # Add the course name to response
     chat["history"] = messages # Add the chat history to response
+    chat["next_before_message_id"] = start if start > 0 else None # cursor for the previous page, if any
     return chat
 
 @router.delete("/{chat_id}")
-async def delete_chat(chat_id: int, current_user: dict = Depends(auth.get_current_user)):
+async def delete_chat(chat_id: int, background_tasks: BackgroundTasks, chat: dict = Depends(get_owned_chat),
+                      current_user: dict = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
     """
-    Delete a chat by its ID.
+    Delete a chat by its ID. Its files are removed in the background once the deletion is committed.
 
     Args:
         chat_id (int): The ID of the chat to delete.
-        current_user (dict, optional): The current user's information. Defaults to Depends(auth.get_current_user).
+        background_tasks (BackgroundTasks): The background tasks to hand the files to the garbage collector on.
+        chat (dict, optional): The chat, owned by the current user. Defaults to Depends(get_owned_chat).
+        current_user (dict, optional): The current user. Defaults to Depends(auth.get_current_user).
 
     Returns:
         dict: A message indicating the chat was successfully deleted.
@@ -180,43 +168,27 @@ async def delete_chat(chat_id: int, current_user: dict = Depends(auth.get_curren
     Raises:
         HTTPException: If the chat is not found or the user is not authorized to delete the chat.
     """
-    
-    chat = ChatDB.fetch(chat_id=chat_id)
-    
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found.")
-    
-    course = CourseDB.fetch(course_id=chat["course_id"])
-    
-    if course["user_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Forbidden.")
-    
-    history_fname, metadata_fname = prepare_chat_file_names(current_user["user_id"], course["course_id"], chat_id)
-    history_path = os.path.join(CHATS_DIR, history_fname)
-    metadata_path = os.path.join(CHATS_DIR, metadata_fname)
-
-    if os.path.exists(history_path):
-        os.remove(history_path)
-    if os.path.exists(metadata_path):
-        os.remove(metadata_path)
-    if chat["slides_furl"] and os.path.exists(chat["slides_furl"]):
-        shutil.rmtree(get_chat_folder_path(chat_id))
-    if chat["slides_mode"] and chat["slides_furl"] and os.path.exists(get_generator_path(chat["slides_furl"])):
-        os.remove(get_generator_path(chat["slides_furl"]))
-
-    ChatDB.delete(chat_id=chat_id)
+
+    await ChatDB.delete_async(chat_id=chat_id, db=db)
+    if chat["slides_furl"]:
+        await schedule_course_index(chat["course_id"], current_user["user_id"], db=db) # drop the slides from the index
+
+    discard_prefetch(chat_id)
+    paths, owners = get_chat_files(chat) # histories, quizzes, flashcards, slides and attachments
+    background_tasks.add_task(garbage.collect, paths=paths, owners=owners) # runs only if the request succeeds
     return {"message": "Chat deleted successfully."}    
 
 
 @router.put("/{chat_id}")
-def update_chat(chat_id: int, chat_title: str, current_user: dict = Depends(auth.get_current_user)):
+async def update_chat(chat_id: int, chat_title: str, chat: dict = Depends(get_owned_chat),
+                      db: AsyncSession = Depends(get_db)):
     """
     Update a chat's title by its ID.
 
     Args:
         chat_id (int): The ID of the chat to update.
         chat_title (str): The new title for the chat.
-        current_user (dict, optional): The current user's information. Defaults to Depends(auth.get_current_user).
+        chat (dict, optional): The chat, owned by the current user. Defaults to Depends(get_owned_chat).
 
     Returns:
         dict: A dictionary containing the updated chat details.
@@ -225,27 +197,82 @@ def update_chat(chat_id: int, chat_title: str, current_user: dict = Depends(auth
         HTTPException: If the chat is not found or the user is not authorized to update the chat.
     """
     
-    chat = ChatDB.fetch(chat_id=chat_id)
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found.")
-    
-    course = CourseDB.fetch(course_id=chat["course_id"])
-    if course["user_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Forbidden.")
-    
-    ChatDB.update(chat_id=chat_id, chat_title=chat_title)
+    await ChatDB.update_async(chat_id=chat_id, chat_title=chat_title, db=db)
     chat["chat_title"] = chat_title
     return chat   
     
 
+async def _present_slide(chat: dict, slide_index: int, db: AsyncSession, prefetch_next: bool = False):
+    """
+    Show the slide at the given index: append it to the chat, generate its explanation and
+    move the chat's slide cursor to it.
+
+    Args:
+        chat (dict): The chat, with a slides file.
+        slide_index (int): The zero-based index of the slide to present.
+        db (AsyncSession): The session of the request.
+        prefetch_next (bool, optional): Whether to start explaining the following slide in the background. Defaults to False.
+
+    Returns:
+        dict: The explanation, the slide image URL and the updated cursor, or {"details": "no slides"}
+              if the deck has no slide at the given index.
+    """
+    slides_furl = chat["slides_furl"] # get the slides file URL
+    slide_count = chat["slide_count"]
+    if slide_count is None: # first access, count the pages of the deck once, stored with the cursor below
+        slide_count = await asyncio.to_thread(get_page_count, slides_furl)
+
+    if slide_index < 0 or slide_index >= slide_count:
+        discard_prefetch(chat["chat_id"])
+        if slide_index >= slide_count: # the student went past the last slide
+            await ChatDB.update_async(chat_id=chat["chat_id"], slides_mode=False, slide_count=slide_count, db=db)
+        elif chat["slide_count"] is None:
+            await ChatDB.update_async(chat_id=chat["chat_id"], slide_count=slide_count, db=db)
+        return {"details": "no slides"}
+
+    history_url = chat["history_url"] # Get the chat history file path
+    chat_history = ChatHistory(history_url)
+    history_length = len(chat_history)
+
+    # use the explanation prefetched after the previous slide if it was generated against this very history
+    explanation = await take_prefetch(chat["chat_id"], slide_index, history_length)
+    if explanation is None:
+        explanation = await explain_slide(slides_furl, slide_index, get_context(chat_history)) # the window of the history
+    content_url, response_text, new_turns = explanation
+
+    data1 = {"message_id": history_length, "skip": True} # Skip the EXPLAIN_SLIDE_PROMPT message, we don't want to show it in the chat
+    data2 = {"message_id": history_length + 1, "media_url": content_url} # (len+1) for we want to draw it like the slide is uploaded by the LLM
+
+    ChatMetadata(history_url).append([data1, data2]) # Append the entries to the chat metadata
+    chat_history.append(new_turns) # Append the new turn to the chat history
+    schedule_summary(chat_history)
+
+    # move the slide cursor, written only after the LLM call so the request holds no connection while waiting for it
+    await ChatDB.update_async(chat_id=chat["chat_id"], slide_index=slide_index, slides_mode=True,
+                              slide_count=slide_count, db=db)
+
+    if prefetch_next and slide_index + 1 < slide_count:
+        schedule_prefetch(chat["chat_id"], slides_furl, slide_index + 1, get_context(chat_history),
+                          history_length=history_length + len(new_turns))
+
+    return {"text": response_text, "media_url": content_url, "slide_index": slide_index,
+            "slide_count": slide_count, "details": "success"} # return the response in dictionary format
+
+
 @router.get("/{chat_id}/next_slide")
-def get_next_slide(chat_id: int, current_user: dict = Depends(auth.get_current_user)):
+async def get_next_slide(chat_id: int, prefetch: bool = Query(False),
+                         chat: dict = Depends(get_slides_chat), db: AsyncSession = Depends(get_db)):
     """
     Get the next slide content for a given chat.
 
+    With `prefetch` enabled, the explanation of the slide after it is generated in the background,
+    so the following "next" click is answered without waiting for the LLM. The prefetched explanation
+    is dropped if a message is sent in between.
+
     Args:
         chat_id (int): The ID of the chat.
-        current_user (User, optional): The current user. Defaults to Depends(auth.get_current_user).
+        prefetch (bool, optional): Whether to prefetch the explanation of the following slide. Defaults to False.
+        chat (dict, optional): The chat, owned by the current user. Defaults to Depends(get_slides_chat).
 
     Returns:
         dict: The response containing the next slide content.
@@ -253,107 +280,103 @@ def get_next_slide(chat_id: int, current_user: dict = Depends(auth.get_current_u
     Raises:
         HTTPException: If the user is not authorized or if the chat has no slides uploaded.
     """
-    chat = ChatDB.fetch(chat_id=chat_id)
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found.")
+    return await _present_slide(chat, chat["slide_index"] + 1, db, prefetch_next=prefetch)
 
-    course = CourseDB.fetch(course_id=chat["course_id"])
-    if course["user_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Forbidden.")
 
-    slides_furl = chat["slides_furl"] # get the slides file URL
-    if not slides_furl:
-        raise HTTPException(status_code=404, detail="This chat has no slides uploaded.")
+@router.get("/{chat_id}/previous_slide")
+async def get_previous_slide(chat_id: int, chat: dict = Depends(get_slides_chat),
+                             db: AsyncSession = Depends(get_db)):
+    """
+    Get the previous slide content for a given chat.
 
-    dumped_generator_path = get_generator_path(slides_furl) # path of the jsonpickle dumped generator object
+    Args:
+        chat_id (int): The ID of the chat.
+        chat (dict, optional): The chat, owned by the current user. Defaults to Depends(get_slides_chat).
 
-    with open(dumped_generator_path, "r") as file:
-        generator = jsonpickle.decode(file.read()) # read the dumped generator object from the file
+    Returns:
+        dict: The response containing the previous slide content, or {"details": "no slides"} on the first slide.
 
-    try:
-        content_url, content = next(generator) # get the next slide content
-        history_url = chat["history_url"] # Get the chat history file path
-        metadata_path = get_chat_metadata_path(history_url) # chat metadata file path
+    Raises:
+        HTTPException: If the user is not authorized or if the chat has no slides uploaded.
+    """
+    return await _present_slide(chat, chat["slide_index"] - 1, db)
 
-        chat_content = None # If the file doesn't exist (i.e. it's the very first message), set chat_content to None
-        if os.path.exists(history_url):
-            with open(history_url, "r") as file:
-                chat_content = file.read() # Read the chat history from the file
 
-        history = jsonpickle.decode(chat_content) if chat_content else [] # Decode the chat content from JSON
+@router.get("/{chat_id}/slides/status")
+async def get_slides_status(chat_id: int, chat: dict = Depends(get_slides_chat)):
+    """
+    Get the rendering progress of a chat's slides.
 
-        data1 = {"message_id": len(history), "skip": True} # Skip the EXPLAIN_SLIDE_PROMPT message, we don't want to show it in the chat
-        data2 = {"message_id": len(history) + 1, "media_url": content_url} # (len+1) for we want to draw it like the slide is uploaded by the LLM
+    Args:
+        chat_id (int): The ID of the chat.
+        chat (dict, optional): The chat, owned by the current user. Defaults to Depends(get_slides_chat).
 
-        if os.path.exists(metadata_path):
-            with open(metadata_path, "r") as file:
-                try:
-                    data = json.load(file)
-                    data.extend([data1, data2])
-                except Exception as e:
-                    raise HTTPException(status_code=500, detail=f"Internal server error occured: {str(e)}")
-        else:
-            data = [data1, data2]
+    Returns:
+        dict: The rendering status ("converting", "rendering", "done" or "failed"), the page count
+              and the number of rendered pages.
 
-        # Write the updated content back to the file
-        with open(metadata_path, "w") as file:
-            json.dump(data, file, indent=4)
+    Raises:
+        HTTPException: If the chat is not found, the user is not authorized or the chat has no slides.
+    """
 
-        chat_model = genai.GenerativeModel(MODEL_VERSION, system_instruction=SYSTEM_PROMPT).start_chat(history=history) # Initialize the chat model with the chat history so far
-        response = chat_model.send_message([EXPLAIN_SLIDE_PROMPT, content])
+    manifest = read_manifest(chat["slides_furl"])
+    if not manifest: # uploaded before pre-rendering, pages are rendered on demand
+        return {"status": "on_demand", "page_count": None, "rendered": None, "error": None}
 
-        with open(history_url, "w") as file:
-            file.write(jsonpickle.encode(chat_model.history)) # Encode back the updated chat history
+    return {"status": manifest["status"], "page_count": manifest["page_count"],
+            "rendered": manifest["rendered"], "error": manifest.get("error")}
 
-        with open(dumped_generator_path, "w") as file:
-            file.write(jsonpickle.encode(generator)) # dump back the generator object to a string
 
-        return {"text": response.text, "media_url": content_url, "details": "success"} # return the response in dictionary format
+@router.get("/{chat_id}/slides/{slide_index}")
+async def get_slide_at(chat_id: int, slide_index: int, prefetch: bool = Query(False),
+                       chat: dict = Depends(get_slides_chat), db: AsyncSession = Depends(get_db)):
+    """
+    Jump to the slide at the given index in a chat.
 
-    except StopIteration:
-        chat_update_data = {
-            "slides_mode" : False
-        }
-        ChatDB.update(chat_id=chat_id, **chat_update_data)
-        return {"details": "no slides"}
+    Args:
+        chat_id (int): The ID of the chat.
+        slide_index (int): The zero-based index of the slide.
+        prefetch (bool, optional): Whether to prefetch the explanation of the following slide. Defaults to False.
+        chat (dict, optional): The chat, owned by the current user. Defaults to Depends(get_slides_chat).
 
+    Returns:
+        dict: The response containing the slide content, or {"details": "no slides"} if there is no such slide.
 
-@router.post("/{chat_id}/send_message")
-async def send_message(chat_id: int, text: str = Form(...), file: UploadFile = File(None),
-                       current_user: dict = Depends(auth.get_current_user)):
+    Raises:
+        HTTPException: If the user is not authorized or if the chat has no slides uploaded.
     """
-    Send a message in a chat and generate a response.
+    return await _present_slide(chat, slide_index, db, prefetch_next=prefetch)
+
+
+async def _prepare_message(chat: dict, user_id: int, text: str, file: UploadFile):
+    """
+    Save the attached file (if any), load the chat history and find the excerpts of the course
+    materials relevant to the message.
 
     Args:
-        message (MessageCreationRequest): The message to be sent.
-        current_user (dict): The current user's information.
+        chat (dict): The chat, owned by the current user.
+        user_id (int): The ID of the current user.
+        text (str): The message text.
+        file (UploadFile): The file attached to the message, if any.
 
     Returns:
-        dict: The generated response in dictionary format.
+        tuple: The chat history store, the context sent to the LLM (the window of the history, see context.py,
+               followed by the excerpts) and the message content to be sent to the LLM.
+
+    Raises:
+        HTTPException: If the file is invalid.
     """
-    chat = ChatDB.fetch(chat_id=chat_id) # Fetch the chat by its ID
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found.")
-    
-    course = CourseDB.fetch(course_id=chat["course_id"]) # Fetch the course associated with the chat
-    if course["user_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Forbidden.")
+    chat_id = chat["chat_id"]
+    discard_prefetch(chat_id) # a free-form message invalidates the prefetched slide explanation
 
     file_content, prompt = None, text
     if file: # if file is uploaded to be sent to the LLM
-        print("file uploaded: ", file.filename)
-        filename = file.filename
-        name, extension = splitext(filename) # split name and extension, e.g. myfile.pdf -> (myfile, pdf)
-
+        logger.debug(f"File uploaded to chat {chat_id}: {file.filename}")
         try:
             file = FileFactory()(file=file)
-            
-            hashed_fname = f"{generate_hash(name, strategy="timestamp")}.{extension}" # e.g. <hashed_name>_<actual_name>.pdf
-            os.makedirs(f"{FILES_DIR}/chat_{chat_id}", exist_ok=True) # create a directory for the chat's files
-            path = os.path.join(FILES_DIR, f"chat_{chat_id}", hashed_fname) # construct the file path
-
-            file.save(path) # save the file in file system
-            file_content = file.content() # get the file from the file system
+            await file.store_async(get_attachments_owner(chat_id)) # save the file in the blob store, shared with identical uploads
+            path = file.path
+            file_content = await file.content_async() # extracted on the shared pools, not on the event loop
 
             # TODO: assuming the file is an image for now
             # o/w, we'll get TypeError: Could not create `Blob`, expected `Blob`, `dict` or an `Image` type(`PIL.Image.Image` or `IPython.display.Image`)
@@ -362,56 +385,107 @@ async def send_message(chat_id: int, text: str = Form(...), file: UploadFile = F
             raise HTTPException(status_code=400, detail=str(e))
 
     history_url = chat["history_url"] # Get the chat history file path
-    chat_content = None # If the file doesn't exist (i.e. it's the very first message), set chat_content to None
-    if os.path.exists(history_url): # if the history file exists
-        with open(history_url, "r") as file:
-            chat_content = file.read() # Read the chat history from the file
-
-    history = jsonpickle.decode(chat_content) if chat_content else [] # Decode the chat content from JSON
-    chat = genai.GenerativeModel(MODEL_VERSION, system_instruction=SYSTEM_PROMPT).start_chat(history=history) # Initialize the chat model with the chat history so far
-
-    # TODO: streaming response
-    if file_content:
-        metadata = get_chat_metadata_path(history_url) # chat metadata file path
-        new_data = {"message_id": len(history), "media_url": path}
-    
-        if os.path.exists(metadata):
-            with open(metadata, "r") as file:
-                try:
-                    data = json.load(file)
-                    data.append(new_data)
-                except Exception as e:
-                    file.delete() # delete the file from the file system
-                    raise HTTPException(status_code=500, detail=f"Internal server error occured: {str(e)}")
-        else:
-            data = [new_data]
+    chat_history = ChatHistory(history_url)
+    context = get_context(chat_history) # Read the window of the history sent to the LLM
+    excerpts = await search_course_materials(chat["course_id"], user_id, text) # see modules/course/materials.py
+    context = with_excerpts(context, excerpts) # not stored, the history only gets the turns after the context
+
+    if not file_content:
+        return chat_history, context, prompt
+
+    new_data = {"message_id": len(chat_history), "media_url": path}
+    ChatMetadata(history_url).append([new_data]) # Append the attachment entry to the chat metadata
+
+    return chat_history, context, [prompt, file_content]
+
+
+def _save_history(chat_history: ChatHistory, context: list, updated_context: list):
+    """
+    Append the turns added in this request to the chat history store.
+
+    Args:
+        chat_history (ChatHistory): The chat history store.
+        context (list): The messages sent to the LLM.
+        updated_context (list): The messages of the LLM chat session after the request.
+    """
+    chat_history.append(updated_context[len(context):])
+    schedule_summary(chat_history) # with the summary context policy
+
+
+@router.post("/{chat_id}/send_message")
+async def send_message(chat_id: int, text: str = Form(...), file: UploadFile = File(None),
+                       chat: dict = Depends(get_owned_chat), current_user: dict = Depends(auth.get_current_user)):
+    """
+    Send a message in a chat and generate a response.
 
-        # Write the updated content back to the file
-        with open(metadata, "w") as file:
-            json.dump(data, file, indent=4)
+    Args:
+        message (MessageCreationRequest): The message to be sent.
+        chat (dict, optional): The chat, owned by the current user. Defaults to Depends(get_owned_chat).
+        current_user (dict, optional): The current user. Defaults to Depends(auth.get_current_user).
 
-        response = chat.send_message([prompt, file_content])
-    else:
-        response = chat.send_message(prompt)
+    Returns:
+        dict: The generated response in dictionary format.
+    """
+    chat_history, context, content = await _prepare_message(chat, current_user["user_id"], text, file)
 
-    history = jsonpickle.encode(chat.history, True) # Encode back the updated chat history to JSON
-    with open(history_url, "w") as file: # Save the updated chat history to the chat file
-        file.write(history)
+    response_text, updated_context = await llm.send_message(context, content)
+    _save_history(chat_history, context, updated_context)
 
-    return {"text": response.text, "role": "model"}
+    return {"text": response_text, "role": "model"}
+
+
+@router.post("/{chat_id}/send_message/stream")
+async def send_message_stream(chat_id: int, text: str = Form(...), file: UploadFile = File(None),
+                              chat: dict = Depends(get_owned_chat),
+                              current_user: dict = Depends(auth.get_current_user)):
+    """
+    Send a message in a chat and stream the generated response as Server-Sent Events.
+
+    Each text chunk is sent as a `data:` event holding a JSON object {"text": <chunk>, "role": "model"},
+    and the stream is closed with a `done` event. The chat history is saved once the stream ends.
+
+    Args:
+        chat_id (int): The ID of the chat.
+        text (str): The message text.
+        file (UploadFile, optional): The file attached to the message. Defaults to None.
+        chat (dict, optional): The chat, owned by the current user. Defaults to Depends(get_owned_chat).
+        current_user (dict, optional): The current user. Defaults to Depends(auth.get_current_user).
+
+    Returns:
+        StreamingResponse: The event stream of the generated response.
+    """
+    chat_history, context, content = await _prepare_message(chat, current_user["user_id"], text, file)
+
+    async def event_stream():
+        try:
+            async for chunk in llm.stream_message(context, content,
+                                                  on_complete=lambda updated_context: _save_history(chat_history, context, updated_context)):
+                yield f"data: {json.dumps({"text": chunk, "role": "model"})}\n\n"
+        except Exception as e:
+            logger.error(f"Streaming response for chat {chat_id} failed: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({"detail": str(e)})}\n\n"
+            return
+
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @router.put("/{chat_id}/update_slides")
-async def update_chat_slides(chat_id: int, slides: UploadFile = File(...),
-                             current_user: dict = Depends(auth.get_current_user)):
+async def update_chat_slides(chat_id: int, background_tasks: BackgroundTasks, slides: UploadFile = File(...),
+                             chat: dict = Depends(get_owned_chat), current_user: dict = Depends(auth.get_current_user),
+                             db: AsyncSession = Depends(get_db)):
     """
-    Update the slides for a chat by its ID.
+    Update the slides for a chat by its ID. The new slides are rendered in the background.
 
     Args:
-        slides_mode:
         chat_id (int): The ID of the chat to update.
+        background_tasks (BackgroundTasks): The background tasks to schedule the slides rendering and the release
+            of the old slides on.
         slides (UploadFile): The new slides file to upload.
-        current_user (dict, optional): The current user's information. Defaults to Depends(auth.get_current_user).
+        chat (dict, optional): The chat, owned by the current user. Defaults to Depends(get_owned_chat).
+        current_user (dict, optional): The current user. Defaults to Depends(auth.get_current_user).
 
     Returns:
         dict: A dictionary containing the updated chat details.
@@ -419,222 +493,184 @@ async def update_chat_slides(chat_id: int, slides: UploadFile = File(...),
     Raises:
         HTTPException: If the chat is not found or the user is not authorized to update the chat.
     """
-    # Fetch the chat by its ID
-    chat = ChatDB.fetch(chat_id=chat_id)
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found.")
-
-    # Fetch the course associated with the chat and check if the user is authorized to access it
-    course = CourseDB.fetch(course_id=chat["course_id"])
-    if course["user_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Forbidden.")
-
     # Validate the file extension
     slides_fname = slides.filename
     name, extension = splitext(slides_fname)
     if extension not in ["pptx", "pdf"]:
         raise HTTPException(status_code=400, detail=f"Invalid file extension: {extension}")
 
-    # Construct the storage directory and slides file URL
-    storage_dir = get_chat_folder_path(chat_id)
-    os.makedirs(storage_dir, exist_ok=True)
-    slides_furl = os.path.join(storage_dir, f"{generate_hash(name, strategy='uuid')}.{extension}")
-
     try:
-        # Save the new slides file to the server
-        with open(slides_furl, "wb") as buffer:
-            shutil.copyfileobj(slides.file, buffer)
+        # Save the new slides file in the blob store
+        file = FileFactory()(file=slides)
+        await file.store_async(get_slides_owner(chat_id))
+        slides_furl = file.path
 
-        # Update the chat record with the new slides file information
+        # Update the chat record with the new slides file information and rewind the slide cursor
         chat_update_data = {
             "slides_fname": slides_fname,
             "slides_furl": slides_furl,
             "slides_mode": True,
+            "slide_index": -1,
+            "slide_count": None,
         }
-        ChatDB.update(chat_id, **chat_update_data)
+        await ChatDB.update_async(chat_id, **chat_update_data, db=db)
+        discard_prefetch(chat_id) # the prefetched explanation belongs to the old deck
+        await schedule_course_index(chat["course_id"], current_user["user_id"], db=db) # index the new deck
 
-        # Regenerate the slides generator and save it
-        generator = slide_generator(slides_furl)
-        dumped_generator = jsonpickle.encode(generator)
-        dumped_generator_path = get_generator_path(slides_furl)
-        with open(dumped_generator_path, "w") as file:
-            file.write(dumped_generator)
+        if chat["slides_furl"] != slides_furl: # the same deck uploaded again keeps its reference
+            background_tasks.add_task(garbage.collect, blobs=[(chat["slides_furl"], get_slides_owner(chat_id))]) # once committed
+
+        background_tasks.add_task(render_slides, slides_furl) # rasterize all pages after the response is sent
 
         return {"chat_id": chat_id, "slides_fname": slides_fname, "slides_furl": slides_furl,
                 "slides_mode": True, "message": "Slides updated successfully."}
 
+    except ValueError as e: # If the file manager can't handle the file
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        shutil.rmtree(storage_dir)
         raise HTTPException(status_code=500, detail=f"Internal server error occurred: {str(e)}")
 
 
 @router.post("/{chat_id}/create_quiz")
-async def create_quiz(chat_id: int, current_user: dict = Depends(auth.get_current_user)):
-    chat = ChatDB.fetch(chat_id=chat_id)
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found.")
+async def create_quiz(chat_id: int, response: Response, background: bool = Query(False),
+                      chat: dict = Depends(get_owned_chat), current_user: dict = Depends(auth.get_current_user),
+                      db: AsyncSession = Depends(get_db)):
+    """
+    Generate a quiz from the chat history on a background job, see modules/chat/jobs.py.
 
-    course = CourseDB.fetch(course_id=chat["course_id"])
-    if course["user_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Forbidden.")
+    Args:
+        chat_id (int): The ID of the chat.
+        background (bool, optional): Whether to return the queued job right away, to be polled at /jobs/{job_id}.
+                                     Defaults to waiting for the quiz.
 
-    history_url = chat["history_url"] # Get the chat history file path
-    if not os.path.exists(history_url):
+    Returns:
+        The name of the quiz and its questions, or the job if `background` is set or the quiz takes too long.
+    """
+    if not ChatHistory(chat["history_url"]).read(): # Read the chat history from the append-only store
         raise HTTPException(status_code=400, detail="No messages found in the chat history to generate quiz.")
-    with open(history_url, "r") as file:
-        history = jsonpickle.decode(file.read()) # Read the chat history from the file
-
-    chat_model = genai.GenerativeModel(
-        MODEL_VERSION, system_instruction=SYSTEM_PROMPT, 
-        generation_config={"response_mime_type": "application/json"}
-    ).start_chat(history=history)
-
-    response = chat_model.send_message(QUIZZES_PROMPT)
-    response_dict = json.loads(response.text)
-    if not response_dict["success"]:
-        raise HTTPException(status_code=500, detail="Failed to generate quiz.")
-    
-    data = response_dict["data"]
-    if not validate_llm_quiz_response(data):
-        raise HTTPException(status_code=500, detail="An error occurred while generating the quiz.")
-
-    quizzes_base_path = get_quizzes_folder_path(chat_id)
 
-    os.makedirs(quizzes_base_path, exist_ok=True)
-    quiz_file_name = f"{generate_hash("", strategy='timestamp', human_readable=True)}.json"
-    quiz_file_path = os.path.join(quizzes_base_path, quiz_file_name)
-
-    with open(quiz_file_path, 'w') as file:
-        json.dump(data, file, indent=4)
-        
-    return {"filename": splitext(quiz_file_name)[0], "quiz": data}
+    return await _run_generation_job("quiz", chat, current_user, response, background, db)
 
 @router.post("/{chat_id}/create_flashcards")
-async def create_flashcards(chat_id: int, current_user: dict = Depends(auth.get_current_user)):
-    chat = ChatDB.fetch(chat_id=chat_id)
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found.")
+async def create_flashcards(chat_id: int, response: Response, background: bool = Query(False),
+                            chat: dict = Depends(get_owned_chat), current_user: dict = Depends(auth.get_current_user),
+                            db: AsyncSession = Depends(get_db)):
+    """
+    Generate a flashcard set from the chat history on a background job, see modules/chat/jobs.py.
 
-    course = CourseDB.fetch(course_id=chat["course_id"])
-    if course["user_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Forbidden.")
+    Args:
+        chat_id (int): The ID of the chat.
+        background (bool, optional): Whether to return the queued job right away, to be polled at /jobs/{job_id}.
+                                     Defaults to waiting for the flashcards.
 
-    history_url = chat["history_url"] # Get the chat history file path
-    if not os.path.exists(history_url):
+    Returns:
+        The flashcards, or the job if `background` is set or the flashcards take too long.
+    """
+    if not ChatHistory(chat["history_url"]).read(): # Read the chat history from the append-only store
         raise HTTPException(status_code=400, detail="No messages found in the chat history to generate any flashcard.")
-    with open(history_url, "r") as file:
-        history = jsonpickle.decode(file.read()) # Read the chat history from the file
-
-    chat_model = genai.GenerativeModel(
-        MODEL_VERSION, system_instruction=SYSTEM_PROMPT, 
-        generation_config={"response_mime_type": "application/json"}
-    ).start_chat(history=history)
-
-    response = chat_model.send_message(FLASHCARD_PROMPT)
-    response_dict = json.loads(response.text)
-    if not response_dict["success"]:
-        raise HTTPException(status_code=500, detail="Failed to generate flashcards.")
-    
-    data = response_dict["data"]
 
-    flashcards = [item["topic"] for item in data]
-    explanations = [item["explanation"] for item in data]
+    return await _run_generation_job("flashcards", chat, current_user, response, background, db)
 
-    flashcards_base_path = get_flashcards_folder_path(chat_id)
-    os.makedirs(flashcards_base_path, exist_ok=True)
-    flashcards_file_name = f"{generate_hash("", strategy='timestamp', human_readable=True)}.json"
 
-    flashcards_file_path = os.path.join(flashcards_base_path, flashcards_file_name)
+async def _run_generation_job(job_type: str, chat: dict, current_user: dict, response: Response, background: bool,
+                              db: AsyncSession):
+    """
+    Submit a generation job for the chat and, unless `background` is set, wait for its result.
 
-    combined_data = {
-        "flashcards": flashcards,
-        "explanations": explanations
-    }
+    Returns:
+        The result of the job, or the job with status code 202 if it is still queued or running.
+
+    Raises:
+        HTTPException: If the user has too many pending jobs, or the job failed.
+    """
+    try:
+        # waiting requires the job to be committed now, otherwise it is committed with the request
+        job = await jobs.submit(job_type, current_user["user_id"], {"chat_id": chat["chat_id"]},
+                                db=db if background else None)
+    except ValueError as e:
+        raise HTTPException(status_code=429, detail=str(e))
 
-    with open(flashcards_file_path, "w") as file:
-        json.dump(combined_data, file, indent=4)
+    if not background:
+        job = await jobs.wait(job["job_id"], timeout=jobs.JOB_TIMEOUT)
+        if job["job_status"] == "succeeded":
+            return job["job_result"]
+        if job["job_status"] == "failed":
+            raise HTTPException(status_code=500, detail=job["job_error"] or f"Failed to generate {job_type}.")
 
-    return {"combined_data": combined_data}
+    response.status_code = 202
+    return {"job_id": job["job_id"], "job_type": job["job_type"], "job_status": job["job_status"]}
 
-@router.get("/{chat_id}/flashcards")
-async def get_flashcards(chat_id: int, current_user: dict = Depends(auth.get_current_user)):
+
+async def _get_chat_flashcard_set(chat: dict, flashcard_name: str, db: AsyncSession):
     """
-    Get all flashcard JSONs for a specific chat.
+    Fetch a flashcard set of a chat by its name.
 
     Args:
-        chat_id (int): The ID of the chat.
-        current_user (dict): The current authenticated user (used for authentication).
+        chat (dict): The chat, owned by the current user.
+        flashcard_name (str): The name of the flashcard set, optionally with the .json extension.
+        db (AsyncSession): The session of the request.
 
     Returns:
-        list: A list of dictionaries, each containing the file name and flashcard content.
+        dict: The flashcard set.
+
+    Raises:
+        HTTPException: If the flashcard set is not found.
     """
+    if flashcard_name.endswith(".json"): # listed as file names
+        flashcard_name = flashcard_name[:-len(".json")]
 
-    chat = ChatDB.fetch(chat_id=chat_id)
+    flashcard_set = await FlashcardSetDB.fetch_async(chat_id=chat["chat_id"], flashcard_set_name=flashcard_name, db=db)
+    if not flashcard_set:
+        raise HTTPException(status_code=404, detail="Flashcard not found.")
+    return flashcard_set
 
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found.")
-    
-    course = CourseDB.fetch(course_id=chat["course_id"])
+@router.get("/{chat_id}/flashcards")
+async def get_flashcards(chat_id: int, chat: dict = Depends(get_owned_chat), db: AsyncSession = Depends(get_db)):
+    """
+    Get all flashcard JSONs for a specific chat.
 
-    if course["user_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Forbidden.")
+    Args:
+        chat_id (int): The ID of the chat.
+        chat (dict, optional): The chat, owned by the current user. Defaults to Depends(get_owned_chat).
 
-    flashcards_path = get_flashcards_folder_path(chat["chat_id"])
+    Returns:
+        list: A list of dictionaries, each containing the file name and flashcard content.
+    """
 
-    if not os.path.exists(flashcards_path):
-        raise HTTPException(status_code=404, detail="Flashcards folder not found.")
+    flashcard_sets = await FlashcardSetDB.fetch_async(chat_id=chat["chat_id"], all=True, db=db)
 
     flashcards = []
-    for filename in os.listdir(flashcards_path):
-        if filename.endswith(".json"):
-            with open(os.path.join(flashcards_path, filename), "r") as f:
-                flashcard = json.load(f)
-                flashcards.append({
-                    "filename": filename,
-                    "content": flashcard
-                })
+    for flashcard_set in flashcard_sets:
+        with open(flashcard_set["flashcard_set_path"], "r") as f:
+            flashcards.append({
+                "filename": f"{flashcard_set['flashcard_set_name']}.json",
+                "content": json.load(f)
+            })
 
     return flashcards
 
 @router.get("/{chat_id}/flashcards/{flashcard_name}")
-async def get_flashcard(chat_id: int, flashcard_name: str, current_user: dict = Depends(auth.get_current_user)):
+async def get_flashcard(chat_id: int, flashcard_name: str, chat: dict = Depends(get_owned_chat),
+                        db: AsyncSession = Depends(get_db)):
     """
     Get a specific flashcard JSON by its file name.
 
     Args:
         chat_id (int): The ID of the chat.
         flashcard_name (str): The name of the flashcard file (without the .json extension).
-        current_user (dict): The current authenticated user (used for authentication).
+        chat (dict, optional): The chat, owned by the current user. Defaults to Depends(get_owned_chat).
 
     Returns:
         dict: A dictionary containing the file name and flashcard content.
     """
 
-    chat = ChatDB.fetch(chat_id=chat_id)
-
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found.")
-    
-    course = CourseDB.fetch(course_id=chat["course_id"])
-
-    if course["user_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Forbidden.")
-
-    flashcards_path = get_flashcards_folder_path(chat["chat_id"])
-
-    if not os.path.exists(flashcards_path):
-        raise HTTPException(status_code=404, detail="Flashcards folder not found.")
-
-    file_path = os.path.join(flashcards_path, f"{flashcard_name}.json")
+    flashcard_set = await _get_chat_flashcard_set(chat, flashcard_name, db)
 
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Flashcard not found.")
-
-    with open(file_path, "r") as f:
+    with open(flashcard_set["flashcard_set_path"], "r") as f:
         flashcard = json.load(f)
 
     return {
-        "filename": f"{flashcard_name}.json",
+        "filename": f"{flashcard_set['flashcard_set_name']}.json",
         "content": flashcard
     }
 
@@ -646,7 +682,8 @@ async def rename_flashcard(
     chat_id: int,
     flashcard_name: str,
     request: RenameFlashcardRequest,
-    current_user: dict = Depends(auth.get_current_user)
+    chat: dict = Depends(get_owned_chat),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Rename a specific flashcard file.
@@ -655,7 +692,7 @@ async def rename_flashcard(
         chat_id (int): The ID of the chat.
         flashcard_name (str): The current name of the flashcard file (without the .json extension).
         request (RenameFlashcardRequest): The request body containing the new name.
-        current_user (dict): The current authenticated user (used for authentication).
+        chat (dict, optional): The chat, owned by the current user. Defaults to Depends(get_owned_chat).
 
     Returns:
         dict: A message indicating the flashcard was successfully renamed.
@@ -663,109 +700,56 @@ async def rename_flashcard(
 
     new_name = request.new_name
 
-    chat = ChatDB.fetch(chat_id=chat_id)
-
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found.")
-    
-    course = CourseDB.fetch(course_id=chat["course_id"])
-
-    if course["user_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Forbidden.")
-
-    flashcards_path = get_flashcards_folder_path(chat["chat_id"])
-
-    if not os.path.exists(flashcards_path):
-        raise HTTPException(status_code=404, detail="Flashcards folder not found.")
+    flashcard_set = await _get_chat_flashcard_set(chat, flashcard_name, db)
 
-    old_file_path = os.path.join(flashcards_path, f"{flashcard_name}.json")
-    new_file_path = os.path.join(flashcards_path, f"{new_name}.json")
-
-    if not os.path.exists(old_file_path):
-        raise HTTPException(status_code=404, detail="Flashcard not found.")
-
-    if os.path.exists(new_file_path):
+    try:
+        await FlashcardSetDB.update_async(flashcard_set["flashcard_set_id"], flashcard_set_name=new_name, db=db)
+    except ValueError: # unique within the chat
         raise HTTPException(status_code=400, detail="A flashcard with the new name already exists.")
 
-    os.rename(old_file_path, new_file_path)
-
-    return {"message": f"Flashcard '{flashcard_name}.json' has been successfully renamed to '{new_name}.json'."}
+    return {"message": f"Flashcard '{flashcard_set['flashcard_set_name']}.json' has been successfully renamed to '{new_name}.json'."}
 
 @router.delete("/{chat_id}/flashcards")
-async def delete_all_flashcards(chat_id: int, current_user: dict = Depends(auth.get_current_user)):
+async def delete_all_flashcards(chat_id: int, background_tasks: BackgroundTasks,
+                                chat: dict = Depends(get_owned_chat), db: AsyncSession = Depends(get_db)):
     """
-    Delete all flashcard files inside the folder without deleting the folder.
+    Delete all flashcard sets of a chat. Their files are removed in the background once the deletion is committed.
 
     Args:
         chat_id (int): The ID of the chat.
-        current_user (dict): The current authenticated user (used for authentication).
+        background_tasks (BackgroundTasks): The background tasks to hand the files to the garbage collector on.
+        chat (dict, optional): The chat, owned by the current user. Defaults to Depends(get_owned_chat).
 
     Returns:
         dict: A message indicating all flashcards were successfully deleted.
     """
 
-    chat = ChatDB.fetch(chat_id=chat_id)
-
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found.")
-    
-    course = CourseDB.fetch(course_id=chat["course_id"])
-
-    if course["user_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Forbidden.")
-
-    flashcards_path = get_flashcards_folder_path(chat["chat_id"])
-
-    if not os.path.exists(flashcards_path):
-        raise HTTPException(status_code=404, detail="Flashcards folder not found.")
-
-    if not os.listdir(flashcards_path):
+    flashcard_sets = await FlashcardSetDB.delete_async(chat_id=chat["chat_id"], db=db)
+    if not flashcard_sets:
         return {"message": "No flashcards to delete; the folder is already empty."}
 
-    for filename in os.listdir(flashcards_path):
-        name, ext = os.path.splitext(filename)
-        file_path = os.path.join(flashcards_path, f"{name}.json")
-        os.remove(file_path)
-        print(file_path)
-        
-        
-
+    background_tasks.add_task(garbage.collect, paths=[flashcard_set["flashcard_set_path"] for flashcard_set in flashcard_sets])
     return {"message": "All flashcards have been successfully deleted."}
 
 @router.delete("/{chat_id}/flashcards/{flashcard_name}")
-async def delete_flashcard(chat_id: int, flashcard_name: str, current_user: dict = Depends(auth.get_current_user)):
+async def delete_flashcard(chat_id: int, flashcard_name: str, background_tasks: BackgroundTasks,
+                           chat: dict = Depends(get_owned_chat), db: AsyncSession = Depends(get_db)):
     """
-    Delete a specific flashcard by its file name.
+    Delete a specific flashcard set by its name. Its file is removed in the background once the deletion is committed.
 
     Args:
         chat_id (int): The ID of the chat.
         flashcard_name (str): The name of the flashcard file (without the .json extension).
-        current_user (dict): The current authenticated user (used for authentication).
+        background_tasks (BackgroundTasks): The background tasks to hand the file to the garbage collector on.
+        chat (dict, optional): The chat, owned by the current user. Defaults to Depends(get_owned_chat).
 
     Returns:
         dict: A message indicating the flashcard was successfully deleted.
     """
 
-    chat = ChatDB.fetch(chat_id=chat_id)
-
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found.")
-    
-    course = CourseDB.fetch(course_id=chat["course_id"])
-    
-    if course["user_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Forbidden.")
-
-    flashcards_path = get_flashcards_folder_path(chat["chat_id"])
-
-    if not os.path.exists(flashcards_path):
-        raise HTTPException(status_code=404, detail="Flashcards folder not found.")
-
-    file_path = os.path.join(flashcards_path, f"{flashcard_name}.json")
-
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Flashcard not found.")
+    flashcard_set = await _get_chat_flashcard_set(chat, flashcard_name, db)
 
-    os.remove(file_path)
+    await FlashcardSetDB.delete_async(flashcard_set_id=flashcard_set["flashcard_set_id"], db=db)
+    background_tasks.add_task(garbage.collect, paths=[flashcard_set["flashcard_set_path"]])
 
-    return {"message": f"Flashcard '{flashcard_name}.json' has been successfully deleted."}
\ No newline at end of file
+    return {"message": f"Flashcard '{flashcard_set['flashcard_set_name']}.json' has been successfully deleted."}
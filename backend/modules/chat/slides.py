@@ -0,0 +1,198 @@
+"""
+Slide deck rendering.
+
+When slides are uploaded, `render_slides` is started as a background job. It
+converts PPTX decks to PDF and rasterizes its pages in parallel on the shared
+CPU process pool, at most SLIDES_RENDER_WORKERS pages of a deck at a time, so a
+large deck leaves pool workers free for the other requests. Progress and the
+rendered page paths are recorded in a per-deck manifest next to the slides file,
+so serving any slide is a manifest lookup instead of rendering inside the
+request. Identical decks share a blob, so a deck already being rendered by
+another request or worker is not rendered again, unless its manifest was not
+updated for SLIDES_RENDER_STALE seconds.
+
+Manifest example:
+```
+{"status": "rendering", "page_count": 24, "rendered": 10, "pages": ["..._page_0.png", null, ...]}
+```
+"""
+
+import asyncio
+import json
+import os
+import pymupdf
+import time
+
+from logger import logger
+from middleware import executor
+from middleware.converter import converter
+from tools import generate_hash, splitext
+
+SLIDES_RENDER_WORKERS = int(os.getenv("SLIDES_RENDER_WORKERS", max(executor.CPU_WORKERS // 2, 1))) # pages of a deck at once
+SLIDES_RENDER_STALE = int(os.getenv("SLIDES_RENDER_STALE", "600")) # in seconds, an unfinished render left untouched was abandoned
+
+
+def get_manifest_path(slides_path: str):
+    return splitext(slides_path)[0] + "_manifest.json"
+
+
+def get_page_path(slides_path: str, page: int):
+    return splitext(slides_path)[0] + f"_page_{page}.png"
+
+
+def get_pdf_path(slides_path: str):
+    name, extension = splitext(slides_path)
+    return f"{name}.pdf" if extension == "pptx" else slides_path
+
+
+def convert_pptx_to_pdf(input_path: str, output_path: str):
+    """
+    Convert a PPTX presentation to PDF on the shared conversion pool.
+
+    Args:
+        input_path (str): The path to the presentation file.
+        output_path (str): The path of the PDF file to create.
+    """
+    converter.convert(input_path, output_path)
+
+
+def count_pages(pdf_path: str):
+    with pymupdf.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def render_page(pdf_path: str, page: int, output_path: str):
+    """
+    Rasterize a single PDF page to a PNG file. Runs in a worker process.
+
+    Args:
+        pdf_path (str): The path to the PDF file.
+        page (int): The zero-based page number.
+        output_path (str): The path of the PNG file to create.
+
+    Returns:
+        str: The path of the PNG file.
+    """
+    with pymupdf.open(pdf_path) as doc:
+        doc[page].get_pixmap().save(output_path, "png")
+    return output_path
+
+
+def read_manifest(slides_path: str):
+    """
+    Read the rendering manifest of a slide deck.
+
+    Args:
+        slides_path (str): The path to the slides file.
+
+    Returns:
+        dict: The manifest, or None if the deck has not been scheduled for rendering.
+    """
+    manifest_path = get_manifest_path(slides_path)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as file:
+        return json.load(file)
+
+
+def _write_manifest(slides_path: str, manifest: dict):
+    manifest_path = get_manifest_path(slides_path)
+    temporary_path = f"{manifest_path}.{generate_hash('', strategy='uuid')}.tmp" # one per writer, a deck may be shared
+    with open(temporary_path, "w") as file:
+        json.dump(manifest, file)
+    os.replace(temporary_path, manifest_path) # readers never see a partially written manifest
+
+
+def _is_abandoned(slides_path: str):
+    try:
+        return time.time() - os.path.getmtime(get_manifest_path(slides_path)) > SLIDES_RENDER_STALE
+    except FileNotFoundError:
+        return True
+
+
+async def render_slides(slides_path: str):
+    """
+    Background job rasterizing every page of a slide deck, SLIDES_RENDER_WORKERS pages at a time.
+
+    Args:
+        slides_path (str): The path to the slides file (PPTX or PDF).
+    """
+    manifest = read_manifest(slides_path)
+    if manifest and manifest["status"] == "done": # a stored deck shared with an earlier upload
+        return
+    if manifest and manifest["status"] in ["converting", "rendering"] and not _is_abandoned(slides_path):
+        return # being rendered for an identical upload, e.g. by another worker
+
+    manifest = {"status": "converting", "page_count": None, "rendered": 0, "pages": []}
+    _write_manifest(slides_path, manifest)
+
+    try:
+        pdf_path = get_pdf_path(slides_path)
+        if pdf_path != slides_path:
+            await asyncio.to_thread(convert_pptx_to_pdf, slides_path, pdf_path)
+
+        page_count = await asyncio.to_thread(count_pages, pdf_path)
+        manifest.update(status="rendering", page_count=page_count, pages=[None] * page_count)
+        _write_manifest(slides_path, manifest)
+
+        semaphore = asyncio.Semaphore(SLIDES_RENDER_WORKERS) # submitted as slots free up, not all at once
+        async def render(page: int):
+            async with semaphore:
+                manifest["pages"][page] = await executor.run(render_page, pdf_path, page, get_page_path(slides_path, page))
+            manifest["rendered"] += 1
+            _write_manifest(slides_path, manifest)
+
+        await asyncio.gather(*(render(page) for page in range(page_count)))
+        manifest["status"] = "done"
+
+    except Exception as e:
+        logger.error(f"Rendering slides {slides_path} failed: {str(e)}")
+        manifest.update(status="failed", error=str(e))
+
+    _write_manifest(slides_path, manifest)
+
+
+def get_slide(slides_path: str, page: int):
+    """
+    Get the rendered image of a slide, rendering it on demand if the background job
+    has not reached it yet (or was never started, e.g. for decks uploaded before pre-rendering).
+
+    Args:
+        slides_path (str): The path to the slides file.
+        page (int): The zero-based page number.
+
+    Returns:
+        str: The path of the PNG file, or None if the deck has no such page.
+    """
+    manifest = read_manifest(slides_path)
+    if manifest and manifest["status"] in ["rendering", "done"]:
+        if page >= manifest["page_count"]:
+            return None
+        if manifest["pages"][page]:
+            return manifest["pages"][page]
+
+    if page >= get_page_count(slides_path):
+        return None
+
+    # rasterize in the shared process pool, this function runs in a thread of a request
+    return executor.submit(render_page, get_pdf_path(slides_path), page, get_page_path(slides_path, page)).result()
+
+
+def get_page_count(slides_path: str):
+    """
+    Get the number of pages of a slide deck, from its manifest if the background job has counted them.
+
+    Args:
+        slides_path (str): The path to the slides file.
+
+    Returns:
+        int: The number of pages.
+    """
+    manifest = read_manifest(slides_path)
+    if manifest and manifest["page_count"] is not None:
+        return manifest["page_count"]
+
+    pdf_path = get_pdf_path(slides_path)
+    if not os.path.exists(pdf_path):
+        convert_pptx_to_pdf(slides_path, pdf_path)
+    return count_pages(pdf_path)
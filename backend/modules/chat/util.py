@@ -1,56 +1,9 @@
-import platform
-import subprocess
-import pymupdf
 import os
-from PIL import Image
 
 from tools import generate_hash, splitext
 from middleware import FILES_DIR
-
-def slide_generator(path: str):
-    """
-    Generator to yield slides one by one.
-
-    Args:
-        path (str): The path to the presentation file.
-
-    Yields:
-        PIL.Image.Image: The image of each slide.
-    """
-
-    def convert_pptx_to_pdf(input_path, output_path):
-        system = platform.system()
-        if system == "Windows":
-            import comtypes.client
-            powerpoint = comtypes.client.CreateObject("Powerpoint.Application")
-            powerpoint.Visible = 1
-            deck = powerpoint.Presentations.Open(input_path)
-            deck.SaveAs(output_path, 32)
-            deck.Close()
-            powerpoint.Quit()
-        elif system == "Linux" or system == "Darwin":
-            subprocess.run(["soffice", "--headless", "--convert-to", "pdf", "--outdir", os.path.dirname(input_path), input_path])
-        else:
-            raise Exception(f"Unsupported operating system: {system}")
-
-    name, extension = splitext(path)
-    if extension == "pptx":
-        convert_pptx_to_pdf(path, f"{name}.pdf")
-        path = f"{name}.pdf"
-
-    doc = pymupdf.open(path)
-    base_dirname = os.path.dirname(path)
-
-    for page in doc:
-        pix = page.get_pixmap()
-        unique_filename = f"{generate_hash(name, strategy="uuid")}.png"
-        img_path = os.path.join(base_dirname, unique_filename)
-        pix.save(img_path, "png")
-        with Image.open(img_path) as img:
-            yield img_path, img
-
-    doc.close()
-
+from middleware.blobstore import is_blob_path
+from modules.chat.history import get_history_paths
 
 def prepare_chat_file_names(user_id: int, course_id: int, chat_id: int):
     # generate unique file name for chat history
@@ -61,18 +14,23 @@ def prepare_chat_file_names(user_id: int, course_id: int, chat_id: int):
     return f"{file_name}.txt", f"{file_name}_metadata.json"
 
 
+# jsonpickle dumped slide generators of older versions, only needed to clean them up
 def get_generator_path(slides_path: str):
     return splitext(slides_path)[0] + "_generator.txt"
 
 
-def get_chat_metadata_path(history_path: str):
-    return splitext(history_path)[0] + "_metadata.json"
- 
-
 def get_chat_folder_path(chat_id: int):
     return os.path.join(FILES_DIR, f"chat_{chat_id}") # construct the storage directory
 
 
+def get_attachments_owner(chat_id: int):
+    return f"chat_{chat_id}" # blob store owner of the files attached to the chat's messages
+
+
+def get_slides_owner(chat_id: int):
+    return f"chat_{chat_id}_slides" # blob store owner of the chat's slides
+
+
 def get_quizzes_folder_path(chat_id: int):
     return os.path.join(get_chat_folder_path(chat_id), "quiz") # construct the storage directory
 
@@ -81,6 +39,25 @@ def get_flashcards_folder_path(chat_id: int):
     return os.path.join(get_chat_folder_path(chat_id), "flashcards") # construct the storage directory
 
 
+def get_chat_files(chat: dict):
+    """
+    Get the files and the blob store owners of a chat, to be collected once the chat is deleted.
+
+    Args:
+        chat (dict): The chat.
+
+    Returns:
+        tuple: The paths of the chat's files and folders, and its blob store owners.
+    """
+    paths = [get_chat_folder_path(chat["chat_id"])] # quizzes, flashcards and files of older versions
+    if chat["history_url"]:
+        paths += get_history_paths(chat["history_url"])
+    if chat["slides_furl"] and not is_blob_path(chat["slides_furl"]): # stored by an older version
+        paths += [chat["slides_furl"], get_generator_path(chat["slides_furl"])]
+
+    return paths, [get_slides_owner(chat["chat_id"]), get_attachments_owner(chat["chat_id"])]
+
+
 def validate_llm_quiz_response(data):
     if not isinstance(data, list):
         return False
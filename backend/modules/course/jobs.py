@@ -0,0 +1,49 @@
+"""
+Job handlers generating the study plan of a course from its syllabus and indexing
+its materials, see middleware/jobs.py.
+"""
+
+from middleware import jobs
+from middleware.filemanager import FileFactory
+from database.dbmanager import CourseDB
+from modules.course.util import create_study_plan
+from modules.course.materials import update_course_index
+
+
+@jobs.handler("study_plan")
+async def generate_study_plan(job: dict):
+    """
+    Generate the study plan of a course and record it on the course.
+
+    Args:
+        job (dict): The job, with the payload {"course_id": int, "syllabus_path": str, "use_cache": bool}.
+
+    Returns:
+        dict: The path of the study plan, None if the course was deleted or its syllabus replaced meanwhile.
+    """
+    course_id, syllabus_path = job["job_payload"]["course_id"], job["job_payload"]["syllabus_path"]
+
+    course = await CourseDB.fetch_async(course_id=course_id)
+    if not course or course["course_syllabus_url"] != syllabus_path: # superseded, nothing to do
+        return {"course_study_plan_url": None}
+
+    # send the syllabus to LLM for weekly study plan generation
+    content = await FileFactory()(path=syllabus_path).content_async()
+    success, study_plan_path = await create_study_plan(content, course_id, use_cache=job["job_payload"].get("use_cache", True))
+    await CourseDB.update_async(course_id=course_id, course_study_plan_url=study_plan_path)
+
+    return {"course_study_plan_url": study_plan_path}
+
+
+@jobs.handler("course_index", system=True)
+async def index_course_materials(job: dict):
+    """
+    Rebuild the retrieval index of a course's materials, see modules/course/materials.py.
+
+    Args:
+        job (dict): The job, with the payload {"course_id": int}.
+
+    Returns:
+        dict: The number of indexed chunks, None if the index was up to date or the course was deleted meanwhile.
+    """
+    return {"chunk_count": await update_course_index(job["job_payload"]["course_id"])}
@@ -0,0 +1,143 @@
+"""
+Retrieval over the materials of a course: its syllabus and the slides of its chats.
+
+Each course has a BM25 index of the extracted text of its materials (see
+middleware/retrieval.py) in its folder, rebuilt by a background job whenever
+its materials change. Messages sent in the course's chats are grounded on the
+RETRIEVAL_TOP_K chunks of the materials most relevant to them, instead of
+sending whole documents to the LLM.
+"""
+
+import asyncio
+import hashlib
+import os
+import weakref
+
+from logger import logger
+from middleware import jobs, retrieval
+from middleware.filemanager import FileFactory, PDFFile, PresentationFile
+from database.dbmanager import ChatDB, CourseDB, JobDB
+from modules.course.util import get_course_index_path
+
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5")) # chunks per message, 0 disables the grounding
+
+_build_locks = weakref.WeakValueDictionary() # course ID -> lock of the index build in progress in this process
+
+
+async def get_course_materials(course_id: int):
+    """
+    Get the materials of a course.
+
+    Args:
+        course_id (int): The ID of the course.
+
+    Returns:
+        list: The (label, path) pairs of the materials, None if the course doesn't exist.
+    """
+    course = await CourseDB.fetch_async(course_id=course_id)
+    if not course:
+        return None
+
+    materials = [("Syllabus", course["course_syllabus_url"])] if course["course_syllabus_url"] else []
+    for chat in await ChatDB.fetch_async(course_id=course_id, all=True):
+        if chat["slides_furl"]:
+            materials.append((chat["slides_fname"] or chat["chat_title"], chat["slides_furl"]))
+    return materials
+
+
+def get_fingerprint(materials: list):
+    """
+    Identify a set of materials by their labels, paths, sizes and modification times.
+    """
+    digest = hashlib.sha256()
+    for label, path in sorted(materials):
+        stat = os.stat(path) if os.path.exists(path) else None
+        digest.update(f"{label}\0{path}\0{stat.st_size if stat else -1}\0{stat.st_mtime_ns if stat else -1}\n".encode())
+    return digest.hexdigest()
+
+
+async def update_course_index(course_id: int):
+    """
+    Rebuild the retrieval index of a course if its materials changed since it was built.
+
+    Args:
+        course_id (int): The ID of the course.
+
+    Returns:
+        int: The number of indexed chunks, None if the index was up to date or the course doesn't exist.
+    """
+    lock = _build_locks.setdefault(course_id, asyncio.Lock())
+    async with lock: # a build waiting for another one finds the index up to date, unless the materials changed again
+        materials = await get_course_materials(course_id)
+        if materials is None:
+            return None
+
+        index_path = get_course_index_path(course_id)
+        fingerprint = get_fingerprint(materials)
+        if retrieval.read_fingerprint(index_path) == fingerprint:
+            return None
+
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        return await asyncio.to_thread(retrieval.build_index, index_path, _iter_parts(materials), fingerprint)
+
+
+async def schedule_course_index(course_id: int, user_id: int, db=None):
+    """
+    Queue the rebuild of the retrieval index of a course, e.g. after its materials changed, unless a
+    rebuild is queued already. Within a unit of work, the job runs once it is committed. The job is a
+    system job, so it doesn't count against the owner's job limits.
+
+    Args:
+        course_id (int): The ID of the course.
+        user_id (int): The ID of the course's owner.
+        db (AsyncSession, optional): The session of the request's unit of work. Defaults to committing right away.
+    """
+    payload = {"course_id": course_id}
+    if await JobDB.fetch_async(job_type="course_index", job_status="queued", job_payload=payload, db=db):
+        return # it reads the materials once it runs, the running one may have read them before the change
+
+    await jobs.submit("course_index", user_id, payload, db=db)
+
+
+async def search_course_materials(course_id: int, user_id: int, query: str):
+    """
+    Find the chunks of a course's materials most relevant to a query. If the course has no index yet,
+    e.g. it was created before the indexes existed or its build failed, a build is requested and nothing
+    is found.
+
+    Args:
+        course_id (int): The ID of the course.
+        user_id (int): The ID of the course's owner.
+        query (str): The query, e.g. the message of a student.
+
+    Returns:
+        list: The texts of up to RETRIEVAL_TOP_K chunks, best first.
+    """
+    if not RETRIEVAL_TOP_K or not query:
+        return []
+
+    index = await asyncio.to_thread(retrieval.RetrievalIndex.open, get_course_index_path(course_id))
+    if index is None:
+        await schedule_course_index(course_id, user_id)
+        return []
+
+    return await asyncio.to_thread(index.search, query, RETRIEVAL_TOP_K) # page faults of the memory-mapped index
+
+
+def _iter_parts(materials: list):
+    """
+    Yield the text of the materials as (label, text) pairs, page by page or slide by slide where available.
+    """
+    for label, path in materials:
+        if not os.path.exists(path):
+            continue
+        try:
+            file = FileFactory()(path=path)
+            if isinstance(file, PDFFile):
+                yield from ((f"{label}, page {number}", page) for number, page in enumerate(file.pages(), start=1))
+            elif isinstance(file, PresentationFile):
+                yield from ((f"{label}, slide {number}", slide) for number, slide in enumerate(file.slides(), start=1))
+            else:
+                yield label, file.content()
+        except ValueError as e: # no text to extract, e.g. an image
+            logger.warning(f"Skipping {path} in the course index: {str(e)}")
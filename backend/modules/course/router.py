@@ -1,27 +1,31 @@
 from typing import Optional
-from fastapi import APIRouter, Depends, Form, HTTPException, File, UploadFile
-import google.generativeai as genai
-import os
-import shutil
+from fastapi import APIRouter, BackgroundTasks, Depends, Form, HTTPException, File, Query, UploadFile
 
 from middleware import authentication as auth
+from middleware import garbage, jobs
 from middleware.filemanager import FileFactory
-from database.dbmanager import CourseDB, ChatDB
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.connection import get_db, on_commit
+from database.dbmanager import CourseDB, ChatDB, QuizDB
 from modules.course.schemas import CourseCreationRequest, CourseUpdateRequest
 from modules.chat.util import *
+from modules.chat.prefetch import discard_prefetch
 from modules.course.util import *
+from modules.course.materials import schedule_course_index
 from tools import validate_file_extension
 
 router = APIRouter(prefix="/course", tags=["Course"])
 
 @router.post("/generate_flashcards")
-def generate_flashcards(course_flashcard_file_content: str = Form(...), course_id: str = Form(...)):
-    # Your logic to generate flashcards
-    success, data = create_flashcards(course_flashcard_file_content, course_id)
+async def generate_flashcards(course_flashcard_file_content: str = Form(...), course_id: str = Form(...),
+                              use_cache: bool = Query(True)):
+    # Your logic to generate flashcards, the same content gets the cached flashcards unless use_cache is false
+    success, data = await create_flashcards(course_flashcard_file_content, course_id, use_cache=use_cache)
     return {"success": success, "data": data}
 
 @router.get("/{course_id}")
-async def get_course(course_id: int, current_user: dict = Depends(auth.get_current_user)):
+async def get_course(course_id: int, current_user: dict = Depends(auth.get_current_user),
+                     db: AsyncSession = Depends(get_db)):
     """
     Get course details by course ID.
 
@@ -32,7 +36,7 @@ async def get_course(course_id: int, current_user: dict = Depends(auth.get_curre
     Returns:
         dict: A dictionary containing the course details.
     """
-    course = CourseDB.fetch(course_id=course_id)
+    course = await CourseDB.fetch_async(course_id=course_id, db=db)
 
     if not course:
         raise HTTPException(status_code=404, detail="Course not found.")
@@ -46,7 +50,8 @@ async def get_course(course_id: int, current_user: dict = Depends(auth.get_curre
 
 
 @router.get("/{course_id}/chats")
-async def get_chats(course_id: int, current_user: dict = Depends(auth.get_current_user)):
+async def get_chats(course_id: int, current_user: dict = Depends(auth.get_current_user),
+                    db: AsyncSession = Depends(get_db)):
     """
     Get all chats for a course.
 
@@ -58,7 +63,7 @@ async def get_chats(course_id: int, current_user: dict = Depends(auth.get_curren
         list: A list of chat messages.
     """
 
-    course = CourseDB.fetch(course_id=course_id)
+    course = await CourseDB.fetch_async(course_id=course_id, db=db)
 
     if not course:
         raise HTTPException(status_code=404, detail="Course not found.")
@@ -68,46 +73,46 @@ async def get_chats(course_id: int, current_user: dict = Depends(auth.get_curren
     if course["user_id"] != current_user["user_id"]:
         raise HTTPException(status_code=403, detail="Forbidden.")
 
-    chats = ChatDB.fetch(course_id=course_id, all=True)
+    chats = await ChatDB.fetch_async(course_id=course_id, all=True, db=db)
     return [{"chat_id": chat["chat_id"],
                        "chat_title": chat["chat_title"],
                        "created_at": chat["created_at"]} for chat in chats]  # return chat titles along with chat IDs
 
 
 @router.get("/{course_id}/quizzes")
-async def get_quizzes(course_id: int, current_user: dict = Depends(auth.get_current_user)):
+async def get_quizzes(course_id: int, current_user: dict = Depends(auth.get_current_user),
+                      db: AsyncSession = Depends(get_db)):
     """
-    Get all quizzes for a course.
+    Get all quizzes for a course, grouped by the chat they were generated from.
 
     Args:
         course_id (int): The ID of the course.
         current_user (User): The current authenticated user (used for authentication).
 
     Returns:
-        list: A list of quizzes.
+        list: A list of chats with the names of their quizzes.
     """
 
-    course = CourseDB.fetch(course_id=course_id)
+    course = await CourseDB.fetch_async(course_id=course_id, db=db)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found.")
     
     if course["user_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Forbidden. You are not authorized to rename this quiz.")
+        raise HTTPException(status_code=403, detail="Forbidden. You are not authorized to view these quizzes.")
 
-    chats = ChatDB.fetch(course_id=course_id, all=True)
-    quizzes = []
-    for chat in chats:
-        quizzes_path = get_quizzes_folder_path(chat["chat_id"])
-        if os.path.exists(quizzes_path):
-            filenames = [splitext(filename)[0] for filename in os.listdir(quizzes_path)]
-            quizzes.append({"chat_id": chat["chat_id"], "chat_title": chat["chat_title"], "quizzes": filenames})
-    return quizzes
+    chats = await ChatDB.fetch_async(course_id=course_id, all=True, db=db)
+    quizzes = await QuizDB.fetch_async(course_id=course_id, all=True, db=db)
+
+    quiz_names = {}
+    for quiz in quizzes:
+        quiz_names.setdefault(quiz["chat_id"], []).append(quiz["quiz_name"])
+    return [{"chat_id": chat["chat_id"], "chat_title": chat["chat_title"], "quizzes": quiz_names[chat["chat_id"]]}
+            for chat in chats if chat["chat_id"] in quiz_names]
 
 
-# Quizzes don't have entries in DB and don't have IDs, which makes this function inefficient
 @router.put("/{course_id}/quizzes/{quiz_name}")
 async def rename_quiz(course_id: int, quiz_name: str, new_quiz_name: str,
-                      current_user: dict = Depends(auth.get_current_user)):
+                      current_user: dict = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
     """
     Rename a quiz.
 
@@ -118,42 +123,28 @@ async def rename_quiz(course_id: int, quiz_name: str, new_quiz_name: str,
         current_user (User): The current authenticated user (used for authentication).
 
     Returns:
-        dict: A dictionary containing the new quiz name.
+        str: The new name of the quiz.
 
     Raises:
         HTTPException: If there is an error renaming the quiz.
     """
 
-    course = CourseDB.fetch(course_id=course_id)
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found.")
-    
-    if course["user_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Forbidden. You are not authorized to rename this quiz.")
+    quiz = await _get_course_quiz(course_id, quiz_name, current_user, db)
 
-    quiz_name = quiz_name.strip()
-    chats = ChatDB.fetch(course_id=course_id, all=True)
+    new_quiz_name = new_quiz_name.strip()
+    if not new_quiz_name:
+        raise HTTPException(status_code=400, detail="The new quiz name cannot be empty.")
 
-    old, new = None, None
-    for chat in chats:
-        quizzes_path = get_quizzes_folder_path(chat["chat_id"])
-        if os.path.exists(quizzes_path):
-            filenames = [splitext(filename)[0] for filename in os.listdir(quizzes_path)]
-            if new_quiz_name in filenames:
-                raise HTTPException(status_code=400, detail=f'Quiz with name "{new_quiz_name}" already exists.')
-            if quiz_name in filenames:
-                old = os.path.join(quizzes_path, f"{quiz_name}.json")
-                new = os.path.join(quizzes_path, f"{new_quiz_name}.json")
-    
-    if old and new:
-        os.rename(old, new)
-        return new
-    
-    raise HTTPException(status_code=404, detail=f'Quiz with name "{quiz_name}" not found.')
+    try:
+        quiz = await QuizDB.update_async(quiz["quiz_id"], quiz_name=new_quiz_name, db=db) # unique within the course
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return quiz["quiz_name"]
 
 
 @router.get("/{course_id}/quizzes/{quiz_name}")
-async def get_quiz(course_id: int, quiz_name: str, current_user: dict = Depends(auth.get_current_user)):
+async def get_quiz(course_id: int, quiz_name: str, current_user: dict = Depends(auth.get_current_user),
+                   db: AsyncSession = Depends(get_db)):
     """
     Get a quiz.
 
@@ -169,35 +160,22 @@ async def get_quiz(course_id: int, quiz_name: str, current_user: dict = Depends(
         HTTPException: If there is an error getting the quiz.
     """
 
-    course = CourseDB.fetch(course_id=course_id)
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found.")
-
-    if course["user_id"] != current_user["user_id"]:
-        raise HTTPException(status_code=403, detail="Forbidden. You are not authorized to rename this quiz.")
+    quiz = await _get_course_quiz(course_id, quiz_name, current_user, db)
 
-    quiz_name = quiz_name.strip()
-    print(quiz_name)
-    chats = ChatDB.fetch(course_id=course_id, all=True)
-    for chat in chats:
-        quizzes_path = get_quizzes_folder_path(chat["chat_id"])
-        if os.path.exists(quizzes_path):
-            filenames = [splitext(filename)[0] for filename in os.listdir(quizzes_path)]
-            print(filenames)
-            if quiz_name in filenames:
-                with open(os.path.join(quizzes_path, f"{quiz_name}.json"), "r") as f:
-                    return json.load(f)
+    with open(quiz["quiz_path"], "r") as f:
+        return json.load(f)
 
-    raise HTTPException(status_code=404, detail="Quiz not found.")
 
 @router.delete("/{course_id}/quizzes/{quiz_name}")
-async def delete_quiz(course_id: int, quiz_name: str, current_user: dict = Depends(auth.get_current_user)):
+async def delete_quiz(course_id: int, quiz_name: str, background_tasks: BackgroundTasks,
+                      current_user: dict = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
     """
-    Delete a quiz.
+    Delete a quiz. Its file is removed in the background once the deletion is committed.
 
     Args:
         course_id (int): The ID of the course.
         quiz_name (str): The name of the quiz.
+        background_tasks (BackgroundTasks): The background tasks to hand the file to the garbage collector on.
         current_user (User): The current authenticated user (used for authentication).
 
     Returns:
@@ -207,34 +185,54 @@ async def delete_quiz(course_id: int, quiz_name: str, current_user: dict = Depen
         HTTPException: If there is an error deleting the quiz.
     """
 
-    course = CourseDB.fetch(course_id=course_id)
+    quiz = await _get_course_quiz(course_id, quiz_name, current_user, db)
+
+    await QuizDB.delete_async(quiz_id=quiz["quiz_id"], db=db)
+    background_tasks.add_task(garbage.collect, paths=[quiz["quiz_path"]])
+    return {"message": "Quiz deleted successfully."}
+
+
+async def _get_course_quiz(course_id: int, quiz_name: str, current_user: dict, db: AsyncSession):
+    """
+    Fetch a quiz of a course by its name and check that the current user owns the course.
+
+    Args:
+        course_id (int): The ID of the course.
+        quiz_name (str): The name of the quiz.
+        current_user (dict): The current user.
+        db (AsyncSession): The session of the request.
+
+    Returns:
+        dict: The quiz.
+
+    Raises:
+        HTTPException: If the course or the quiz is not found, or the user is not authorized to access the course.
+    """
+    course = await CourseDB.fetch_async(course_id=course_id, db=db)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found.")
 
-    quiz_name = quiz_name.strip()
-    chats = ChatDB.fetch(course_id=course_id, all=True)
-    for chat in chats:
-        quizzes_path = get_quizzes_folder_path(chat["chat_id"])
-        if os.path.exists(quizzes_path):
-            filenames = [splitext(filename)[0] for filename in os.listdir(quizzes_path)]
-            if quiz_name in filenames:
-                os.remove(os.path.join(quizzes_path, f"{quiz_name}.json"))
-                return {"message": "Quiz deleted successfully."}
+    if course["user_id"] != current_user["user_id"]:
+        raise HTTPException(status_code=403, detail="Forbidden. You are not authorized to access this quiz.")
 
-    raise HTTPException(status_code=404, detail="Quiz not found.")
+    quiz = await QuizDB.fetch_async(course_id=course_id, quiz_name=quiz_name.strip(), db=db)
+    if not quiz:
+        raise HTTPException(status_code=404, detail=f'Quiz with name "{quiz_name}" not found.')
+    return quiz
 
 
 @router.post("/create")
 async def create_course(course_name: str = Form(...), course_code: str = Form(...),
                         course_description: Optional[str] = Form(None),
                         course_syllabus_file: UploadFile = File(None),
-                        course_icon_file: UploadFile = File(None),
-                        current_user: dict = Depends(auth.get_current_user)):
+                        course_icon_file: UploadFile = File(None), use_cache: bool = Query(True),
+                        current_user: dict = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
     """
     Create a new course.
 
     Args:
         course (CourseCreationRequest): The course details.
+        use_cache (bool, optional): Whether the study plan of an identical syllabus may be reused. Defaults to True.
         current_user (dict, optional): The current user. Defaults to Depends(auth.get_current_user).
 
     Returns:
@@ -247,7 +245,7 @@ async def create_course(course_name: str = Form(...), course_code: str = Form(..
     # pydantic input validation
     _ = CourseCreationRequest(course_name=course_name, course_code=course_code, course_description=course_description)
 
-    course_icon_path, syllabus_path, study_plan_path = None, None, None
+    course_icon_path, syllabus_path = None, None
     course = None
     try:
         valid_image_formats, valid_syllabus_formats = ["png", "jpg", "jpeg"], ["pdf", "docx"]
@@ -256,43 +254,47 @@ async def create_course(course_name: str = Form(...), course_code: str = Form(..
         if course_syllabus_file and not validate_file_extension(course_syllabus_file.filename, valid_syllabus_formats):
             raise ValueError(f"Invalid syllabus format. Avaiable formats: {', '.join(valid_syllabus_formats)}")
 
-        course = CourseDB.create(course_name=course_name, course_description=course_description,
-                                 course_code=course_code, user_id=current_user["user_id"])
+        course = await CourseDB.create_async(course_name=course_name, course_description=course_description,
+                                 course_code=course_code, user_id=current_user["user_id"], db=db)
         if course_icon_file:
             course_icon_path = get_course_icon_path(course["course_id"])
-            course_icon_file = FileFactory()(file=course_icon_file).save(course_icon_path, size=(256, 256))
+            await FileFactory()(file=course_icon_file).save_async(course_icon_path, size=(256, 256)) # resized off the event loop
             course["course_icon_url"] = course_icon_path  # update response dict. with the image URL
 
         if course_syllabus_file:
-            syllabus_path = get_course_syllabus_path(course["course_id"])
             course_syllabus_file = FileFactory()(file=course_syllabus_file)
-            course_syllabus_file.save(syllabus_path)
+            await course_syllabus_file.store_async(get_course_owner(course["course_id"])) # shared with identical syllabi
+            syllabus_path = course_syllabus_file.path
             course["course_syllabus_url"] = syllabus_path  # update response dict. with the syllabus URL
 
-            # send the syllabus to LLM for weekly study plan generation
-            success, study_plan_path = create_study_plan(course_syllabus_file.content(), course["course_id"])
-            course["course_study_plan_url"] = study_plan_path  # update response dict. with the study plan URL
+        await CourseDB.update_async(course_id=course["course_id"], course_icon_url=course_icon_path, course_syllabus_url=syllabus_path,
+                        db=db)
 
-        CourseDB.update(course_id=course["course_id"], course_icon_url=course_icon_path, course_syllabus_url=syllabus_path,
-                        course_study_plan_url=study_plan_path)
+        if syllabus_path:
+            # the study plan is generated from the syllabus on a job once the course is committed, see modules/course/jobs.py
+            job = await jobs.submit("study_plan", current_user["user_id"],
+                                    {"course_id": course["course_id"], "syllabus_path": syllabus_path,
+                                     "use_cache": use_cache}, db=db)
+            course["study_plan_job_id"] = job["job_id"]  # poll /jobs/{job_id} for the study plan URL
+            await schedule_course_index(course["course_id"], current_user["user_id"], db=db) # grounds the chats of the course
         return course
     except Exception as e:
-        # Rollback changes
+        # Rollback changes, the course is rolled back with the request
         if course_icon_path: FileFactory()(path=course_icon_path).delete()
-        if syllabus_path: FileFactory()(path=syllabus_path).delete()
-        if study_plan_path: FileFactory()(path=study_plan_path).delete()
-        if course: CourseDB.delete(course_id=course["course_id"])
+        if syllabus_path: await garbage.collect(blobs=[(syllabus_path, get_course_owner(course["course_id"]))])
 
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.delete("/{course_id}")
-async def delete_course(course_id: int, current_user: dict = Depends(auth.get_current_user)):
+async def delete_course(course_id: int, background_tasks: BackgroundTasks,
+                        current_user: dict = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
     """
-    Delete a course.
+    Delete a course and its chats. Their files are removed in the background once the deletion is committed.
 
     Args:
         course_id (int): The ID of the course to delete.
+        background_tasks (BackgroundTasks): The background tasks to hand the files to the garbage collector on.
         current_user (dict, optional): The current user. Defaults to Depends(auth.get_current_user).
 
     Returns:
@@ -301,52 +303,29 @@ async def delete_course(course_id: int, current_user: dict = Depends(auth.get_cu
     Raises:
         HTTPException: If there is an error deleting the course.
     """
-    course = CourseDB.fetch(course_id=course_id)
+    course = await CourseDB.fetch_async(course_id=course_id, db=db)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found.")
 
     if course["user_id"] != current_user["user_id"]:
         raise HTTPException(status_code=403, detail="Forbidden. You are not authorized to delete this course.")
 
-    course_syllabus_url = course["course_syllabus_url"]
-    if course_syllabus_url: 
-        FileFactory()(path=course_syllabus_url).delete()
-    
-    course_icon_url = course["course_icon_url"]
-    if course_icon_url: 
-        FileFactory()(path=course_icon_url).delete()
-        
-    course_study_plan_url = course["course_study_plan_url"]
-    if course_study_plan_url: 
-        FileFactory()(path=course_study_plan_url).delete()
-
-    chats = ChatDB.delete(course_id=course_id, all=True)  # delete all chats associated with the course
-    CourseDB.delete(course_id=course_id)  # delete the course
-    
+    chats = await ChatDB.delete_async(course_id=course_id, all=True, db=db)  # delete all chats associated with the course
+    await CourseDB.delete_async(course_id=course_id, db=db)  # delete the course
+
+    # the course and chat folders (icon, study plan, quizzes, flashcards), chat histories and blob references
+    paths, owners = get_course_files(course)
     for chat in chats:
-        history_url, slides_furl = chat["history_url"], chat["slides_furl"]
-        metadata_url = get_chat_metadata_path(history_url) if history_url else None
-        generator_url = get_generator_path(slides_furl) if slides_furl else None
-        items_folder = get_chat_folder_path(chat["chat_id"])
-
-        if os.path.exists(history_url):
-            os.remove(history_url)
-        if items_folder and os.path.exists(items_folder):
-            shutil.rmtree(items_folder)
-        if slides_furl and os.path.exists(slides_furl):
-            os.remove(slides_furl)
-        if metadata_url and os.path.exists(metadata_url):
-            os.remove(metadata_url)
-        if generator_url and os.path.exists(generator_url):
-            os.remove(generator_url)
-
-        # TODO: delete quiz and flashcards too
+        discard_prefetch(chat["chat_id"])
+        chat_paths, chat_owners = get_chat_files(chat)
+        paths, owners = paths + chat_paths, owners + chat_owners
+    background_tasks.add_task(garbage.collect, paths=paths, owners=owners) # runs only if the request succeeds
 
     return {"message": "Course deleted successfully."}
 
 
 @router.put("/{course_id}")
-async def update_course(course_id: int, course_name: Optional[str] = Form(None),
+async def update_course(course_id: int, background_tasks: BackgroundTasks, course_name: Optional[str] = Form(None),
                         course_code: Optional[str] = Form(None),
                         course_description: Optional[str] = Form(None),
                         update_description: bool = Form(False),  # flag variable indicating whether to update the
@@ -356,12 +335,14 @@ async def update_course(course_id: int, course_name: Optional[str] = Form(None),
                         course_update_syllabus: bool = Form(False),  # flag variable indicating whether to update the syllabus
                         course_icon_file: UploadFile = File(None),
                         update_icon: bool = Form(False),  # flag variable indicating whether to update the image
-                        current_user: dict = Depends(auth.get_current_user)):
+                        use_cache: bool = Query(True),  # whether the study plan of an identical syllabus may be reused
+                        current_user: dict = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
     """
     Update a course with the given course_id.
 
     Parameters:
     - course_id (int): The ID of the course to update.
+    - background_tasks (BackgroundTasks): The background tasks to hand the replaced files to the garbage collector on.
     - course_name (Optional[str]): The updated name of the course (default: None).
     - course_code (Optional[str]): The updated code of the course (default: None).
     - course_description (Optional[str]): The updated course_description of the course (default: None).
@@ -384,49 +365,63 @@ async def update_course(course_id: int, course_name: Optional[str] = Form(None),
     # pydantic input validation
     _ = CourseUpdateRequest(course_name=course_name, course_code=course_code, course_description=course_description)
 
-    course = CourseDB.fetch(course_id=course_id)
+    course = await CourseDB.fetch_async(course_id=course_id, db=db)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found.")
     if course["user_id"] != current_user["user_id"]:
         raise HTTPException(status_code=403, detail="Forbidden.")
 
-    new_icon_path, new_syllabus_path, new_study_plan_path = None, None, None
-    if update_icon and course_icon_file is None:
-        FileFactory()(path=course["course_icon_url"]).delete()  # delete old image
-    elif update_icon and course_icon_file:
-        if not validate_file_extension(course_icon_file.filename, ["png", "jpg", "jpeg"]):
-            raise HTTPException(status_code=400, detail="Invalid image format. Please upload a PNG, JPG, or JPEG file.")
-        FileFactory()(path=course["course_icon_url"]).delete()  # delete old image
-
-        new_icon_path = get_course_icon_path(course_id)
-        new_course_icon_file = FileFactory()(file=course_icon_file)
-        new_course_icon_file.save(new_icon_path, size=(256, 256))
-
-    if course_update_syllabus and course_syllabus_file is None:
-        FileFactory()(path=course["course_syllabus_url"]).delete()  # delete old syllabus
-        FileFactory()(path=course["course_study_plan_url"]).delete()  # delete old study plan
-    elif course_update_syllabus and course_syllabus_file:
-        if not validate_file_extension(course_syllabus_file.filename, ["pdf", "docx"]):
-            raise HTTPException(status_code=400, detail="Invalid syllabus format. Please upload a PDF or a DOCX file.")
-        FileFactory()(path=course["course_syllabus_url"]).delete()  # delete old syllabus
-        FileFactory()(path=course["course_study_plan_url"]).delete()  # delete old study plan
-
-        new_syllabus_path = get_course_syllabus_path(course_id)
-        course_syllabus_file = FileFactory()(course_syllabus_file)
-        course_syllabus_file.save(new_syllabus_path)
-
-        # send the new syllabus to LLM for weekly study plan generation
-        success, new_study_plan_path = create_study_plan(course_syllabus_file.content(), course_id)
-
+    new_icon_path, new_syllabus_path = None, None
+    stale_paths, stale_blobs = [], []  # removed once the update is committed
+    old_syllabus_path = course["course_syllabus_url"]
     try:
-        course = CourseDB.update(course_id=course_id, course_name=course_name, course_code=course_code,
+        if update_icon and course_icon_file:
+            if not validate_file_extension(course_icon_file.filename, ["png", "jpg", "jpeg"]):
+                raise HTTPException(status_code=400, detail="Invalid image format. Please upload a PNG, JPG, or JPEG file.")
+
+            new_icon_path = get_course_icon_path(course_id)  # a new file, the old one is kept until the commit
+            new_course_icon_file = FileFactory()(file=course_icon_file)
+            await new_course_icon_file.save_async(new_icon_path, size=(256, 256))  # resized off the event loop
+        if update_icon and course["course_icon_url"]:
+            old_icon_path = course["course_icon_url"]
+            on_commit(db.sync_session, lambda: FileFactory()(path=old_icon_path).delete())  # delete old image
+
+        if course_update_syllabus and course_syllabus_file is None:
+            stale_blobs.append((old_syllabus_path, get_course_owner(course_id)))  # delete old syllabus
+            stale_paths.append(course["course_study_plan_url"])  # delete old study plan
+        elif course_update_syllabus and course_syllabus_file:
+            if not validate_file_extension(course_syllabus_file.filename, ["pdf", "docx"]):
+                raise HTTPException(status_code=400, detail="Invalid syllabus format. Please upload a PDF or a DOCX file.")
+
+            course_syllabus_file = FileFactory()(file=course_syllabus_file)
+            await course_syllabus_file.store_async(get_course_owner(course_id))  # shared with identical syllabi
+            new_syllabus_path = course_syllabus_file.path
+            if new_syllabus_path != old_syllabus_path:  # the same syllabus uploaded again keeps its reference
+                stale_blobs.append((old_syllabus_path, get_course_owner(course_id)))  # delete old syllabus
+            # the old study plan is overwritten by the job generating the new one
+
+        course = await CourseDB.update_async(course_id=course_id, course_name=course_name, course_code=course_code,
                                  course_description=(
                                      "" if course_description is None and update_description else course_description),
                                  course_icon_url=("" if course_icon_file is None and update_icon else new_icon_path),
                                  course_syllabus_url=("" if course_syllabus_file is None and course_update_syllabus else new_syllabus_path),
-                                 course_study_plan_url=(
-                                     "" if course_syllabus_file is None and course_update_syllabus else new_study_plan_path)
+                                 course_study_plan_url=("" if course_update_syllabus else None), # regenerated below
+                                 db=db
                                  )
+
+        if new_syllabus_path:
+            # the study plan of the new syllabus is generated on a job once the update is committed
+            job = await jobs.submit("study_plan", current_user["user_id"],
+                                    {"course_id": course_id, "syllabus_path": new_syllabus_path,
+                                     "use_cache": use_cache}, db=db)
+            course["study_plan_job_id"] = job["job_id"]  # poll /jobs/{job_id} for the study plan URL
+        if course_update_syllabus:
+            await schedule_course_index(course_id, current_user["user_id"], db=db) # the syllabus is part of the index
+
+        background_tasks.add_task(garbage.collect, paths=stale_paths, blobs=stale_blobs) # runs only if the request succeeds
         return course
     except ValueError as e:
+        if new_icon_path: FileFactory()(path=new_icon_path).delete()  # the course keeps the old image
+        if new_syllabus_path and new_syllabus_path != old_syllabus_path:  # the course keeps the old syllabus
+            await garbage.collect(blobs=[(new_syllabus_path, get_course_owner(course_id))])
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
@@ -1,38 +1,51 @@
-import google.generativeai as genai
 import json
+import os
 
-from middleware import FILES_DIR
+from middleware import FILES_DIR, llm, blobstore
+from tools import generate_hash
 from . import WEEKLY_STUDY_PLAN_PROMPT, FLASHCARD_PROMPT
-from modules.chat import MODEL_VERSION, SYSTEM_PROMPT
+
+def get_course_folder_path(course_id):
+    return f"{FILES_DIR}/course_{course_id}" # the icon, the study plan and the retrieval index
 
 def get_course_icon_path(course_id):
-    return f"{FILES_DIR}/course_{course_id}/course_img.png"
+    return f"{get_course_folder_path(course_id)}/course_img_{generate_hash('', strategy='uuid')}.png" # unique, a replaced icon is deleted after the commit
 
-def get_course_syllabus_path(course_id):
-    return f"{FILES_DIR}/course_{course_id}/syllabus.pdf"
+def get_course_owner(course_id):
+    return f"course_{course_id}" # blob store owner of the course's syllabus
 
-def get_study_plan_path(course_id):
-    return f"{FILES_DIR}/course_{course_id}/study_plan.md"
+def get_course_index_path(course_id):
+    return f"{get_course_folder_path(course_id)}/index" # retrieval index of the course's materials
 
-def create_study_plan(course_syllabus_file_content, course_id):
-    model = genai.GenerativeModel(MODEL_VERSION, system_instruction=SYSTEM_PROMPT, 
-                                  generation_config={"response_mime_type": "application/json"})
-    response = model.generate_content([WEEKLY_STUDY_PLAN_PROMPT, course_syllabus_file_content]).text
+def get_study_plan_path(course_id):
+    return f"{get_course_folder_path(course_id)}/study_plan.md"
+
+def get_course_files(course):
+    # files and blob store owners of a course, to be collected once the course is deleted
+    paths = [get_course_folder_path(course["course_id"])]
+    if course["course_syllabus_url"] and not blobstore.is_blob_path(course["course_syllabus_url"]): # stored by an older version
+        paths.append(course["course_syllabus_url"])
+    return paths, [get_course_owner(course["course_id"])]
+
+async def create_study_plan(course_syllabus_file_content, course_id, use_cache=True):
+    # identical syllabi, e.g. of the sections of a course, share a cached study plan
+    response = await llm.generate_content([WEEKLY_STUDY_PLAN_PROMPT, course_syllabus_file_content], json_response=True,
+                                          use_cache=use_cache)
     
     response_dict = json.loads(response)
     study_plan_path = get_study_plan_path(course_id)
 
     success, data = response_dict["success"], response_dict["data"]
 
+    os.makedirs(get_course_folder_path(course_id), exist_ok=True) # no icon was uploaded
     with open(study_plan_path, 'w') as file:
         file.write(data)
         
     return success, study_plan_path
 
-def create_flashcards(course_flashcard_file_content, course_id):
-    model = genai.GenerativeModel(MODEL_VERSION, system_instruction=SYSTEM_PROMPT,
-                                  generation_config={"response_mime_type": "application/json"})
-    response = model.generate_content([FLASHCARD_PROMPT, course_flashcard_file_content]).text
+async def create_flashcards(course_flashcard_file_content, course_id, use_cache=True):
+    response = await llm.generate_content([FLASHCARD_PROMPT, course_flashcard_file_content], json_response=True,
+                                          use_cache=use_cache)
 
     response_dict = json.loads(response)
     success, data = response_dict["success"], response_dict["data"]
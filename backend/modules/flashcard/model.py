@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, String, func, UniqueConstraint
+
+from database.connection import db_connection
+
+Base = db_connection.Base
+
+class FlashcardSet(Base):
+    """
+    Represents a set of flashcards generated from a chat, stored as a JSON file in the chat's flashcards folder.
+    """
+
+    __tablename__ = 'flashcard_sets'
+
+    flashcard_set_id = Column(Integer, primary_key=True, index=True)
+    chat_id = Column(Integer, ForeignKey('chats.chat_id'), nullable=False, index=True) # flashcards are listed per chat
+    course_id = Column(Integer, ForeignKey('courses.course_id'), nullable=False, index=True)
+    flashcard_set_name = Column(String(255), nullable=False) # e.g. 2024-07-01 12.30.00, renamed by the student
+    flashcard_set_path = Column(String(255), nullable=False) # e.g. ./files/chat_12/flashcards/<3b4c...e1>.json
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Flashcard sets are looked up by name within a chat
+    __table_args__ = (UniqueConstraint('chat_id', 'flashcard_set_name', name='flashcard_set_chat_name_unique'),)
+
+    def to_dict(self):
+        """
+        Converts the FlashcardSet object to a dictionary.
+
+        Returns:
+            dict: A dictionary representation of the FlashcardSet object.
+        """
+
+        return {
+            "flashcard_set_id": self.flashcard_set_id,
+            "chat_id": self.chat_id,
+            "course_id": self.course_id,
+            "flashcard_set_name": self.flashcard_set_name,
+            "flashcard_set_path": self.flashcard_set_path,
+            "created_at": self.created_at
+        }
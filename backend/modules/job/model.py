@@ -0,0 +1,54 @@
+import json
+
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, String, Text, func, Index
+
+from database.connection import db_connection
+
+Base = db_connection.Base
+
+class Job(Base):
+    """
+    Represents a background job, e.g. the generation of a quiz, run by the job workers.
+    """
+
+    __tablename__ = 'jobs'
+
+    job_id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.user_id'), nullable=False)
+    job_type = Column(String(32), nullable=False) # e.g. quiz, flashcards, study_plan
+    job_status = Column(String(16), nullable=False, default="queued") # queued, running, succeeded or failed
+    job_payload = Column(Text, nullable=False) # JSON arguments of the job
+    job_result = Column(Text, nullable=True) # JSON result of a succeeded job
+    job_error = Column(String(255), nullable=True) # reason of a failed job
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True) # of the last attempt
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Workers take the oldest queued jobs and count the running ones per user
+    __table_args__ = (
+        Index("ix_jobs_status_created_at", "job_status", "created_at"),
+        Index("ix_jobs_user_id_status", "user_id", "job_status"),
+    )
+
+    def to_dict(self):
+        """
+        Converts the Job object to a dictionary, with the payload and the result decoded.
+
+        Returns:
+            dict: A dictionary representation of the Job object.
+        """
+
+        return {
+            "job_id": self.job_id,
+            "user_id": self.user_id,
+            "job_type": self.job_type,
+            "job_status": self.job_status,
+            "job_payload": json.loads(self.job_payload),
+            "job_result": json.loads(self.job_result) if self.job_result is not None else None,
+            "job_error": self.job_error,
+            "attempts": self.attempts,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
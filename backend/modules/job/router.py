@@ -0,0 +1,82 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+
+from middleware import authentication as auth
+from middleware.jobs import FINISHED_STATUSES
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.connection import get_db
+from database.dbmanager import JobDB
+
+router = APIRouter(prefix="/jobs", tags=["Job"])
+
+
+@router.get("")
+async def get_jobs(job_status: Optional[str] = Query(None), limit: int = Query(50, ge=1, le=200),
+                   current_user: dict = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
+    """
+    Get the latest jobs of the current user, newest first. Finished jobs are kept for JOB_RETENTION seconds.
+
+    Args:
+        job_status (str, optional): Only the jobs with this status, e.g. running. Defaults to all jobs.
+        limit (int, optional): The maximum number of jobs. Defaults to 50.
+        current_user (dict): The current authenticated user.
+
+    Returns:
+        list: The jobs, without their results.
+    """
+    jobs = await JobDB.fetch_async(user_id=current_user["user_id"], job_status=job_status, all=True, limit=limit, db=db)
+    return [_without_result(job) for job in jobs]
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: int, current_user: dict = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
+    """
+    Get the status of a job, e.g. to poll it until it is finished.
+
+    Args:
+        job_id (int): The ID of the job.
+        current_user (dict): The current authenticated user.
+
+    Returns:
+        dict: The job, without its result.
+    """
+    return _without_result(await _get_owned_job(job_id, current_user, db))
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: int, response: Response, current_user: dict = Depends(auth.get_current_user),
+                         db: AsyncSession = Depends(get_db)):
+    """
+    Get the result of a job, e.g. the generated quiz.
+
+    Args:
+        job_id (int): The ID of the job.
+        current_user (dict): The current authenticated user.
+
+    Returns:
+        The result of the job, or the job with status code 202 if it is still queued or running.
+
+    Raises:
+        HTTPException: If the job is not found, not owned by the user or failed.
+    """
+    job = await _get_owned_job(job_id, current_user, db)
+    if job["job_status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["job_error"] or "The job failed.")
+    if job["job_status"] not in FINISHED_STATUSES:
+        response.status_code = 202
+        return _without_result(job)
+
+    return job["job_result"]
+
+
+async def _get_owned_job(job_id: int, current_user: dict, db: AsyncSession):
+    job = await JobDB.fetch_async(job_id=job_id, db=db)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job["user_id"] != current_user["user_id"]:
+        raise HTTPException(status_code=403, detail="Forbidden.")
+    return job
+
+
+def _without_result(job: dict):
+    return {key: value for key, value in job.items() if key != "job_result"}
@@ -4,6 +4,7 @@ from sqlalchemy import (
     String,
     Integer,
     DateTime,
+    Index,
 )
 from datetime import datetime
 from database.connection import db_connection
@@ -26,6 +27,12 @@ class Notification(Base):
     notification_sender_id = Column(Integer)
     notification_receiver_id = Column(Integer)
 
+    # A user's notifications (optionally only the new ones) are fetched on every page load
+    __table_args__ = (
+        Index("ix_notifications_receiver_is_new_date", "notification_receiver_id", "notification_is_new",
+              "notification_date"),
+    )
+
     def to_dict(self):
         return {
             "notification_id": self.notification_id,
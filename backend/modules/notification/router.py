@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, Form, HTTPException
 
 from middleware import authentication as auth
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.connection import get_db
 from database.dbmanager import NotificationDB
 from modules.notification.schemas import (
     NotificationCreationRequest,
@@ -12,7 +14,8 @@ router = APIRouter(prefix="/notification", tags=["Notification"])
 
 @router.get("/{notification_id}")
 async def get_notification(
-    notification_id: int, current_user: dict = Depends(auth.get_current_user)
+    notification_id: int, current_user: dict = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Get notification details by notification ID.
@@ -25,7 +28,7 @@ async def get_notification(
         dict: A dictionary containing the notification details.
     """
 
-    notification = NotificationDB.fetch(notification_id=notification_id)
+    notification = await NotificationDB.fetch_async(notification_id=notification_id, db=db)
 
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found.")
@@ -42,7 +45,8 @@ async def get_notification(
 
 
 @router.get("/all/{notification_receiver_id}")
-async def get_all_notifications(notification_receiver_id: int, current_user: dict = Depends(auth.get_current_user)):
+async def get_all_notifications(notification_receiver_id: int, current_user: dict = Depends(auth.get_current_user),
+                                db: AsyncSession = Depends(get_db)):
     """
     Get all notifications.
 
@@ -56,7 +60,7 @@ async def get_all_notifications(notification_receiver_id: int, current_user: dic
     if int(notification_receiver_id) != int(current_user["user_id"]):
         raise HTTPException(status_code=403, detail="Forbidden to view notifications of other users.")  
 
-    notifications = NotificationDB.fetch(notification_receiver_id=notification_receiver_id, all=True)
+    notifications = await NotificationDB.fetch_async(notification_receiver_id=notification_receiver_id, all=True, db=db)
     return notifications
     
 
@@ -68,6 +72,7 @@ async def create_notification(
     notification_is_new: bool = Form(...),
     notification_receiver_id: int = Form(...),
     current_user: dict = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Create a new notification.
@@ -94,28 +99,25 @@ async def create_notification(
         notification_receiver_id=notification_receiver_id,
     )
 
-    notification = None
     try:
-
-        notification = NotificationDB.create(
+        notification = await NotificationDB.create_async(
             notification_title=notification_title,
             notification_content=notification_content,
             notification_is_new=notification_is_new,
             notification_sender_id=notification_sender_id,
             notification_receiver_id=notification_receiver_id,
+            db=db,
         )
 
         return notification
-    except Exception as e:
-        if notification:
-            NotificationDB.delete(notification_id=notification["notification_id"])
-
+    except Exception as e: # the notification is rolled back with the request
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.delete("/{notification_id}")
 async def delete_notification(
-    notification_id: int, current_user: dict = Depends(auth.get_current_user)
+    notification_id: int, current_user: dict = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Delete a notification.
@@ -131,7 +133,7 @@ async def delete_notification(
         HTTPException: If there is an error deleting the notification.
     """
 
-    notification = NotificationDB.fetch(notification_id=notification_id)
+    notification = await NotificationDB.fetch_async(notification_id=notification_id, db=db)
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found.")
 
@@ -141,7 +143,7 @@ async def delete_notification(
             detail="Forbidden. You are not authorized to delete this notification.",
         )
 
-    NotificationDB.delete(notification_id=notification_id)
+    await NotificationDB.delete_async(notification_id=notification_id, db=db)
 
     return {"message": "Notification deleted successfully."}
 
@@ -154,6 +156,7 @@ async def update_notification(
     notification_is_new: bool = Form(None),
     notification_receiver_id: str = Form(None),
     current_user: dict = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Update a notification with the given notification_id.
@@ -183,19 +186,20 @@ async def update_notification(
         notification_receiver_id=notification_receiver_id,
     )
 
-    notification = NotificationDB.fetch(notification_id=notification_id)
+    notification = await NotificationDB.fetch_async(notification_id=notification_id, db=db)
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found.")
     if notification["notification_sender_id"] != current_user["user_id"]:
         raise HTTPException(status_code=403, detail="Forbidden.")
 
     try:
-        notification = NotificationDB.update(
+        notification = await NotificationDB.update_async(
             notification_id=notification_id,
             notification_title=notification_title,
             notification_content=notification_content,
             notification_is_new=notification_is_new,
             notification_receiver_id=notification_receiver_id,
+            db=db,
         )
         return notification
     except ValueError as e:
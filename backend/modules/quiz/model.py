@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, String, func, UniqueConstraint
+
+from database.connection import db_connection
+
+Base = db_connection.Base
+
+class Quiz(Base):
+    """
+    Represents a quiz generated from a chat, stored as a JSON file in the chat's quiz folder.
+    """
+
+    __tablename__ = 'quizzes'
+
+    quiz_id = Column(Integer, primary_key=True, index=True)
+    chat_id = Column(Integer, ForeignKey('chats.chat_id'), nullable=False, index=True)
+    course_id = Column(Integer, ForeignKey('courses.course_id'), nullable=False, index=True) # quizzes are listed per course
+    quiz_name = Column(String(255), nullable=False) # e.g. 2024-07-01 12.30.00, renamed by the student
+    quiz_path = Column(String(255), nullable=False) # e.g. ./files/chat_12/quiz/<3b4c...e1>.json
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Quizzes are looked up by name within a course
+    __table_args__ = (UniqueConstraint('course_id', 'quiz_name', name='quiz_course_name_unique'),)
+
+    def to_dict(self):
+        """
+        Converts the Quiz object to a dictionary.
+
+        Returns:
+            dict: A dictionary representation of the Quiz object.
+        """
+
+        return {
+            "quiz_id": self.quiz_id,
+            "chat_id": self.chat_id,
+            "course_id": self.course_id,
+            "quiz_name": self.quiz_name,
+            "quiz_path": self.quiz_path,
+            "created_at": self.created_at
+        }
@@ -2,6 +2,8 @@ import modules.user.schemas as schemas
 
 from fastapi import Depends, HTTPException, APIRouter
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.connection import get_db
 from database.dbmanager import UserDB, CourseDB
 from middleware import authentication as auth
 from logger import logger
@@ -9,7 +11,7 @@ from logger import logger
 router = APIRouter(prefix="/users", tags=["User"])
 
 @router.post("/login", response_model=auth.Token, include_in_schema=False)
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """
     Endpoint for user login.
 
@@ -20,11 +22,11 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
     - Token: Token object containing the JWT access token.
 
     """
-    return auth.login_for_access_token(form_data)
+    return await auth.login_for_access_token(form_data)
 
 
 @router.post("/create", response_model=schemas.UserResponse)
-def create_user(user: schemas.UserCreationRequest):
+async def create_user(user: schemas.UserCreationRequest, db: AsyncSession = Depends(get_db)):
     """
     Create a new user.
 
@@ -39,7 +41,9 @@ def create_user(user: schemas.UserCreationRequest):
     """
     
     try:
-        user_dict = UserDB.create(**user.model_dump()) # create the user given the user data
+        hashed_password = await auth.hash_password_async(user.password) # off the event loop
+        user_dict = await UserDB.create_async(name=user.name, nickname=user.nickname, email=user.email,
+                                              hashed_password=hashed_password, db=db) # create the user given the user data
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
@@ -47,7 +51,8 @@ def create_user(user: schemas.UserCreationRequest):
 
 
 @router.get("/", response_model=schemas.UserResponse)
-def get_user(nickname: str = None, id: int = None, current_user: dict = Depends(auth.get_current_user)):
+async def get_user(nickname: str = None, id: int = None, current_user: dict = Depends(auth.get_current_user),
+                   db: AsyncSession = Depends(get_db)):
     """
     Retrieve a user by their nickname.
 
@@ -65,7 +70,7 @@ def get_user(nickname: str = None, id: int = None, current_user: dict = Depends(
     if not nickname and not id:
         raise HTTPException(status_code=400, detail="Nickname or ID must be provided")
     
-    user = UserDB.fetch(nickname=nickname, user_id=id)
+    user = await UserDB.fetch_async(nickname=nickname, user_id=id, db=db)
 
     if not user: # if the user is not found
         raise HTTPException(status_code=404, detail="User(s) not found")
@@ -74,7 +79,7 @@ def get_user(nickname: str = None, id: int = None, current_user: dict = Depends(
 
 
 @router.get("/me")
-def get_current_user(current_user: dict = Depends(auth.get_current_user)):
+async def get_current_user(current_user: dict = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
     """
     Get the current authenticated user.
 
@@ -91,13 +96,14 @@ def get_current_user(current_user: dict = Depends(auth.get_current_user)):
     
     logger.info(f"User {current_user['nickname']} is fetching their own data.")
     
-    courses = CourseDB.fetch(user_id=current_user["user_id"], all=True)
+    courses = await CourseDB.fetch_async(user_id=current_user["user_id"], all=True, db=db)
     current_user["courses"] = courses # add the user's courses to response
     current_user.pop("hashed_password") # remove the hashed password from the response
     return current_user
 
 @router.put("/update", response_model=schemas.UserResponse)
-def update_user(user: schemas.UserUpdateRequest, current_user: dict = Depends(auth.get_current_user)):
+async def update_user(user: schemas.UserUpdateRequest, current_user: dict = Depends(auth.get_current_user),
+                      db: AsyncSession = Depends(get_db)):
     """
     Update a user's information.
 
@@ -116,6 +122,11 @@ def update_user(user: schemas.UserUpdateRequest, current_user: dict = Depends(au
         logger.error("User not found")
         raise HTTPException(status_code=404, detail="User not found")
     
-    user_dict = UserDB.update(current_user["user_id"], **user.model_dump())
+    update_data = user.model_dump()
+    password = update_data.pop("password", None)
+    if password:
+        update_data["hashed_password"] = await auth.hash_password_async(password) # off the event loop
+
+    user_dict = await UserDB.update_async(current_user["user_id"], **update_data, db=db)
     
     return schemas.UserResponse(**user_dict)    
\ No newline at end of file
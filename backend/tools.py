@@ -29,6 +29,15 @@ def generate_hash(filename: str, strategy="sha256", **kwargs):
         raise ValueError("Invalid strategy provided. Please use 'sha256', 'uuid' or 'timestamp'.")
 
 
+# Function to generate the SHA-256 hash of a file's content, reading it in chunks
+def hash_file(path: str, chunk_size: int = 1024 * 1024):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
 # re/create DB tables, chat histories, and files directories
 def init(restart: bool = False, debug_mode: bool = False):
     if restart:
@@ -46,13 +55,17 @@ def init(restart: bool = False, debug_mode: bool = False):
     # Set the debug mode of the logger, if provided it reinitializes the logger with the new debug mode
     set_debug_mode(debug_mode)
         
-    logger.info("Creating tables...")
+    logger.info("Migrating tables...")
     
-    db_connection.create_tables()
+    db_connection.migrate() # create a new database or run the pending migrations
 
     if not os.path.exists(CHATS_DIR):
         os.makedirs(CHATS_DIR)
 
+    # convert jsonpickle chat histories written by older versions into the append-only format
+    from modules.chat.history import migrate_legacy_histories
+    migrate_legacy_histories(CHATS_DIR)
+
     if not os.path.exists(FILES_DIR):
         os.makedirs(FILES_DIR)
     
@@ -0,0 +1,35 @@
+"""
+Run the job workers in their own process, so that the generation throughput is tuned
+independently of the web workers, see middleware/jobs.py. The web server then runs
+with JOB_WORKERS=0.
+
+Usage:
+```
+python worker.py [number of worker tasks, defaults to 4]
+```
+"""
+
+import asyncio
+import sys
+
+import modules.chat.jobs, modules.course.jobs # register the job handlers
+from middleware import jobs
+from tools import init
+from logger import logger
+
+
+async def main(workers: int):
+    jobs.start(workers)
+    logger.info(f"Job worker started with {workers} tasks")
+    try:
+        await asyncio.Event().wait() # until interrupted
+    finally:
+        await jobs.stop()
+
+
+if __name__ == "__main__":
+    init(restart=False, debug_mode=False)
+    try:
+        asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 4))
+    except KeyboardInterrupt:
+        pass
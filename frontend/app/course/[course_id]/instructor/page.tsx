@@ -126,6 +126,7 @@ export default function InstructorPage() {
     setIsFetching(true);
     backendAPI
       .get(`/chat/${chat_id}/next_slide`, {
+        params: { prefetch: true },
         headers: {
           Accept: "application/json",
           Authorization: `Bearer ${token}`,